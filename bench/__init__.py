@@ -0,0 +1,14 @@
+"""
+The benchmarks seed data and wipe it with testing_schema.reset_everything(), so they must never touch the bot's real
+database. Importing this package, which every `python -m bench.<name>` does first, points them at "ChillaBench" unless
+CHILLA_MONGO_DATABASE_NAME names another database starting with that, and refuses to run otherwise.
+"""
+import os
+import sys
+
+BENCH_DATABASE_PREFIX = "ChillaBench"
+
+os.environ.setdefault("CHILLA_MONGO_DATABASE_NAME", BENCH_DATABASE_PREFIX)
+if not os.environ["CHILLA_MONGO_DATABASE_NAME"].startswith(BENCH_DATABASE_PREFIX):
+    sys.exit(f"Refusing to run a benchmark against {os.environ['CHILLA_MONGO_DATABASE_NAME']!r}: it would wipe it. "
+             f"Set CHILLA_MONGO_DATABASE_NAME to a name starting with {BENCH_DATABASE_PREFIX!r}.")
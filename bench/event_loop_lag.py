@@ -0,0 +1,83 @@
+"""
+Measures how far the event loop falls behind while interaction handlers hit Mongo, comparing schema calls made inline on
+the loop (how the cogs used to call them) with the same calls handed to mongo.run.
+
+Needs a standing MongoDB instance, same as the tests. Data is written to a separate "ChillaBench" database; see
+bench/__init__.py. Run with `pipenv run python -m bench.event_loop_lag`.
+"""
+import asyncio
+import statistics
+import time
+
+from includes import mongo
+from models.queue_models import Queue
+from includes.queue_manager import manager as queue_manager
+from includes.user_generators import generate_users
+from schemas import member_schema, testing_schema
+from services import queue_service
+
+NUM_HANDLERS = 200
+PROBE_INTERVAL = 0.005
+
+
+def handler_work(user):
+    """Roughly what an /add from a known player costs: ban check, profile check, queue membership and counts."""
+    member_schema.is_banned(user)
+    member_schema.check_profile(user)
+    queue_manager.contains(user.id, Queue.QUICKPLAY.value)
+    queue_service.get_all_queue_counts()
+    member_schema.get_player_stats(user.id)
+
+
+async def inline_handler(user):
+    handler_work(user)
+    await asyncio.sleep(0)
+
+
+async def executor_handler(user):
+    await mongo.run(handler_work, user)
+
+
+async def probe(lags, stop: asyncio.Event):
+    while not stop.is_set():
+        expected = time.perf_counter() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def measure(handler, users):
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(PROBE_INTERVAL * 2)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[handler(user) for user in users])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe_task
+    return elapsed, lags
+
+
+def report(name, elapsed, lags):
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p95 = lags_ms[int(len(lags_ms) * 0.95) - 1] if len(lags_ms) > 1 else lags_ms[0]
+    print(f"{name:<10} handlers={NUM_HANDLERS} total={elapsed * 1000:8.1f}ms probes={len(lags):5d} "
+          f"lag p50={statistics.median(lags_ms):7.2f}ms p95={p95:7.2f}ms max={lags_ms[-1]:7.2f}ms")
+
+
+async def main():
+    testing_schema.reset_everything()
+    users = generate_users(NUM_HANDLERS)
+    for user in users:
+        member_schema.check_profile(user)
+
+    report("inline", *await measure(inline_handler, users))
+    report("executor", *await measure(executor_handler, users))
+
+    testing_schema.reset_everything()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
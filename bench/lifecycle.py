@@ -0,0 +1,171 @@
+"""
+Load test for the queue -> game -> finish lifecycle. Seeds a history of profiles, ranks and finished games with bulk
+inserts, then drives the same service calls the cogs make and reports p50/p95/p99 latency and Mongo op counts per call.
+
+Needs a standing MongoDB instance, same as the tests. Data is written to a separate "ChillaBench" database; see
+bench/__init__.py. Run with `pipenv run python -m bench.lifecycle`; see --help for the seed sizes.
+"""
+import argparse
+import random
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from includes import indexes, mongo
+from includes.mongo_stats import attribute, profiler
+from models.game import GameStatus
+from models.profile import Outcome
+from models.queue_models import Queue
+from includes.queue_manager import manager as queue_manager
+from includes.user_generators import generate_user
+from schemas import testing_schema
+from schemas.member_schema import OUTCOME_COUNTERS
+from services import analytics_service, game_service, map_service, queue_service
+
+BATCH_SIZE = 5000
+MIN_USER_ID = 1_000_000
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    def call(self, name: str, func: Callable, *args, **kwargs):
+        # Op counts come from the bot's own profiler, attributed to the call the same way a slash command is
+        profiler.invoked(name)
+        start = time.perf_counter()
+        with attribute(name):
+            result = func(*args, **kwargs)
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        return result
+
+    def report(self):
+        stats = profiler.snapshot()
+        print(f"{'call':<22} {'calls':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'ops/call':>9}")
+        for name, latencies in self.latencies.items():
+            p50, p95, p99 = (percentile(latencies, p) for p in (50, 95, 99))
+            print(f"{name:<22} {len(latencies):>6} {p50:>7.2f}ms {p95:>7.2f}ms {p99:>7.2f}ms "
+                  f"{stats[name]['opsPerInvocation'] or 0:>9.1f}")
+
+
+def percentile(values: List[float], p: int) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * p // 100) - 1)]
+
+
+def insert_in_batches(collection: str, documents: List[dict]):
+    for i in range(0, len(documents), BATCH_SIZE):
+        mongo.db[collection].insert_many(documents[i:i + BATCH_SIZE], ordered=False)
+
+
+def seed(num_players: int, num_months: int, games_per_month: int, rng: random.Random) -> List[int]:
+    """
+    Bulk inserts profiles, ranks and num_months of finished games for num_players players.
+    :return: The seeded user IDs
+    """
+    user_ids = list(range(MIN_USER_ID, MIN_USER_ID + num_players))
+    stats = {user_id: {"gamesPlayed": 0, "wins": 0, "losses": 0, "ties": 0} for user_id in user_ids}
+
+    games, player_data = [], []
+    now = datetime.now()
+    for i in range(num_months * games_per_month):
+        ended = now - timedelta(days=30 * (i // games_per_month), minutes=rng.randint(0, 30 * 24 * 60))
+        game_id = str(uuid.uuid4())
+        games.append({
+            "gameId": game_id,
+            "queue": Queue.QUICKPLAY.value,
+            "status": GameStatus.FINISHED.value,
+            "maps": map_service.get_maps(num_maps=1),
+            "started": ended - timedelta(minutes=20),
+            "ended": ended,
+            "reshuffles": 1
+        })
+        players = rng.sample(user_ids, 10)
+        tie = rng.random() < 0.05
+        for j, user_id in enumerate(players):
+            outcome = Outcome.TIE if tie else Outcome.WIN if j < 5 else Outcome.LOSS
+            player_data.append({"userId": user_id, "gameId": game_id, "outcome": outcome.value})
+            stats[user_id]["gamesPlayed"] += 1
+            stats[user_id][OUTCOME_COUNTERS[outcome]] += 1
+
+    insert_in_batches("Profiles", [{
+        "userId": user_id,
+        "username": f"Player {user_id}",
+        "position": "Offence",
+        "lastPlayed": "Never",
+        "hideRank": True,
+        "region": "Not Set",
+        "delayTarget": datetime.min,
+        "statsTracked": True,
+        **stats[user_id]
+    } for user_id in user_ids])
+    insert_in_batches("Ranks", [{
+        "userId": user_id,
+        "username": f"Player {user_id}",
+        "rank": rng.gauss(25, 4),
+        "confidence": rng.uniform(2, 8.333)
+    } for user_id in user_ids])
+    insert_in_batches("GameData", games)
+    insert_in_batches("PlayerData", player_data)
+
+    indexes.ensure_indexes()
+    analytics_service.rebuild_leaderboard_rollups()
+    return user_ids
+
+
+def drive(user_ids: List[int], num_games: int, shuffles_per_game: int, rng: random.Random, recorder: Recorder):
+    now = datetime.now()
+    for i in range(num_games):
+        users = [generate_user(user_id, f"Player {user_id}") for user_id in rng.sample(user_ids, 10)]
+        for user in users:
+            add_result = recorder.call("queue_service.add", queue_service.add, user, Queue.QUICKPLAY, skip_delay=True)
+
+        game = recorder.call("game_service.start_game", game_service.start_game, users[-1], Queue.QUICKPLAY,
+                             add_result.lobby)
+        # What the persist_queues loop would write for this lobby's adds and pop
+        recorder.call("queue_manager.flush", queue_manager.flush)
+        for _ in range(shuffles_per_game):
+            recorder.call("game_service.shuffle_teams", game_service.shuffle_teams, game.game_id)
+
+        finisher = generate_user(game.team1_players[0].user_id, game.team1_players[0].name)
+        recorder.call("game_service.finish", game_service.finish, finisher, rng.choice(list(Outcome)))
+        recorder.call("game_service.get_history", game_service.get_history)
+
+        # Every finish invalidates the current periods, so the first read after one is always a miss
+        recorder.call("get_leaderboard month", analytics_service.get_leaderboard, now.year, now.month)
+        recorder.call("get_leaderboard month", analytics_service.get_leaderboard, now.year, now.month)
+        recorder.call("get_leaderboard all", analytics_service.get_leaderboard)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--months", type=int, default=6)
+    parser.add_argument("--games-per-month", type=int, default=300)
+    parser.add_argument("--games", type=int, default=50, help="Games to play through the services after seeding")
+    parser.add_argument("--shuffles", type=int, default=3, help="Shuffles per game")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    testing_schema.reset_everything()
+
+    start = time.perf_counter()
+    user_ids = seed(args.players, args.months, args.games_per_month, rng)
+    print(f"seeded players={args.players} games={args.months * args.games_per_month} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    recorder = Recorder()
+    drive(user_ids, args.games, args.shuffles, rng, recorder)
+    recorder.report()
+    cache = analytics_service.leaderboard_cache
+    print(f"leaderboard cache hits={cache.hits} misses={cache.misses}")
+
+    testing_schema.reset_everything()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Counts Mongo round trips for one /status render: the old per-queue, per-player lookups vs. queue_service.get_status_snapshot.
+
+Needs a standing MongoDB instance. Run with `pipenv run python -m bench.status_ops`.
+"""
+
+from includes import mongo
+from includes.mongo_stats import attribute, profiler
+from includes.queue_manager import manager as queue_manager
+from includes.user_generators import generate_users
+from models.queue_models import Queue
+from schemas import member_schema, queue_schema, testing_schema
+from services import queue_service
+
+QUEUES = [Queue.QUICKPLAY, Queue.NEWBLOODS, Queue.TEST]
+PLAYERS_PER_QUEUE = 9
+
+
+def per_player_status():
+    """How the /status cogs gathered data before the snapshot existed."""
+    for queue in QUEUES:
+        queue_schema.queue_is_ingame(queue.value)
+        for player in mongo.db['Queue'].find({"queue": queue.value}):
+            member_schema.get_profile_by_id(player['userId'])
+        mongo.db['Queue'].count_documents({"queue": queue.value})
+
+
+def main():
+    testing_schema.reset_everything()
+    for i, queue in enumerate(QUEUES):
+        for user in generate_users(PLAYERS_PER_QUEUE, i * PLAYERS_PER_QUEUE):
+            queue_service.add(user, queue)
+    queue_manager.flush()
+
+    for name, func in (("per-player", per_player_status), ("snapshot", queue_service.get_status_snapshot)):
+        profiler.invoked(name)
+        with attribute(name):
+            func()
+        stats = profiler.snapshot()[name]
+        print(f"{name:<11} queued={PLAYERS_PER_QUEUE * len(QUEUES)} ops={stats['ops']} {stats['commands']}")
+
+    testing_schema.reset_everything()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Times ranking every team split of a lobby: the original per-match trueskill.quality() loop vs.
+balance_service.rank_splits. Doesn't touch Mongo.
+
+Run with `pipenv run python -m bench.team_balancing`.
+"""
+import itertools
+import random
+import timeit
+
+from trueskill import Rating, quality
+
+from schemas.ingame_schema import Player
+from services import balance_service
+
+LOBBY_SIZES = [10, 12, 16]
+
+
+def legacy_rank_splits(players):
+    """
+    The original generate_match_combinations + determine_best_match, generalized from teams of 5 to half the lobby.
+    """
+    players_by_id = {player.user_id: player for player in players}
+    ids = set(players_by_id.keys())
+    teams_used = set()
+    matches = []
+    for combo in itertools.combinations(ids, len(players) // 2):
+        team1 = tuple(sorted(combo))
+        team2 = tuple(sorted(ids.difference(set(team1))))
+        if team1 in teams_used or team2 in teams_used:
+            continue
+        teams_used.add(team1)
+        teams_used.add(team2)
+        matches.append((team1, team2))
+    matches = [tuple(tuple(players_by_id[player_id] for player_id in team) for team in match) for match in matches]
+
+    scores = [{'index': i, 'quality': quality([[player.rating for player in match[0]],
+                                                [player.rating for player in match[1]]])}
+              for i, match in enumerate(matches)]
+    return sorted(scores, key=lambda s: s['quality'], reverse=True)
+
+
+def main():
+    rng = random.Random(0)
+    for num_players in LOBBY_SIZES:
+        players = [Player(i, f"Player {i}", Rating(rng.uniform(10, 40), rng.uniform(1, 8.333)))
+                   for i in range(num_players)]
+        # Warm the split mask cache, same as a long-running bot would have
+        balance_service.rank_splits(players)
+
+        legacy_runs = 3 if num_players > 12 else 10
+        legacy = min(timeit.repeat(lambda: legacy_rank_splits(players), number=1, repeat=legacy_runs))
+        vectorized = min(timeit.repeat(lambda: balance_service.rank_splits(players), number=1, repeat=50))
+        num_splits = len(balance_service.get_team1_masks(num_players))
+        print(f"players={num_players:2d} splits={num_splits:5d} legacy={legacy * 1000:9.2f}ms "
+              f"numpy={vectorized * 1000:7.3f}ms speedup={legacy / vectorized:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
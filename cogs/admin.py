@@ -7,10 +7,10 @@ from discord_slash.utils.manage_commands import create_option, create_choice
 from discord_slash.utils.manage_commands import create_permission
 
 import config
-from includes import general, msg
+from includes import general, msg, mongo
 from includes.general import admin_channel
 from schemas import ingame_schema, member_schema
-from services import game_service
+from services import game_service, profile_service
 
 
 class Admin(commands.Cog):
@@ -48,10 +48,10 @@ class Admin(commands.Cog):
         user = ctx.author
         if await general.admin_channel(ctx, user) == False:
             return
-        if member_schema.already_admin(member):
+        if await mongo.run(member_schema.already_admin, member):
             await ctx.send(f"**{member.name}** is already an admin.", hidden=True)
         else:
-            member_schema.add_admin(member)
+            await mongo.run(member_schema.add_admin, member)
 
             try:
                 role = discord.utils.get(member.guild.roles, name="Chilla Admin")
@@ -86,8 +86,8 @@ class Admin(commands.Cog):
     async def _removeadmin(self, ctx: SlashContext, member: discord.Member):
         if await general.admin_channel(ctx, ctx.author) == False:
             return
-        if member_schema.already_admin(member):
-            member_schema.remove_admin(member)
+        if await mongo.run(member_schema.already_admin, member):
+            await mongo.run(member_schema.remove_admin, member)
             try:
                 role = discord.utils.get(member.guild.roles, name="Chilla Admin")
                 await member.remove_roles(role)
@@ -128,11 +128,11 @@ class Admin(commands.Cog):
         if await general.admin_channel(ctx, ctx.author) == False:
             return
         # get warnings
-        warnings = member_schema.get_number_of_warnings(member)
+        warnings = await mongo.run(member_schema.get_number_of_warnings, member)
         if warnings == 2:
             # ban player
-            member_schema.ban_player(ctx.author, member)
-            member_schema.remove_warnings(member)
+            await mongo.run(member_schema.ban_player, ctx.author, member)
+            await mongo.run(member_schema.remove_warnings, member)
             body = f"""
                 You have been **banned**.
 
@@ -156,8 +156,8 @@ class Admin(commands.Cog):
             await ctx.send(embed=embed)
         else:
             # warn player
-            member_schema.warn_player(ctx.author, member)
-            warnings = member_schema.get_number_of_warnings(member)
+            await mongo.run(member_schema.warn_player, ctx.author, member)
+            warnings = await mongo.run(member_schema.get_number_of_warnings, member)
             body = f"""
                 You have been **warned**.
 
@@ -208,10 +208,10 @@ class Admin(commands.Cog):
     async def _banplayer(self, ctx: SlashContext, member: discord.Member, message: str):
         if await general.admin_channel(ctx, ctx.author) == False:
             return
-        if member_schema.is_banned(member):
+        if await mongo.run(member_schema.is_banned, member):
             await ctx.send(f"**{member.name}** is already banned.", hidden=True)
         else:
-            member_schema.ban_player(ctx.author, member)
+            await mongo.run(member_schema.ban_player, ctx.author, member)
             body = f"""
                 You have been **banned**.
 
@@ -258,8 +258,8 @@ class Admin(commands.Cog):
     async def _revokeban(self, ctx: SlashContext, member: discord.Member):
         if await general.admin_channel(ctx, ctx.author) == False:
             return
-        if member_schema.is_banned(member):
-            member_schema.unban_player(member)
+        if await mongo.run(member_schema.is_banned, member):
+            await mongo.run(member_schema.unban_player, member)
             body = f"""
                 Your ban has been **revoked**.
 
@@ -270,7 +270,7 @@ class Admin(commands.Cog):
                 await member.send(embed=embed)
             except Exception as e:
                 print(e)
-            warnings = member_schema.get_number_of_warnings(member)
+            warnings = await mongo.run(member_schema.get_number_of_warnings, member)
 
             body = f"""
                 **{member.name}**'s ban has been **revoked**.
@@ -307,8 +307,8 @@ class Admin(commands.Cog):
     async def _cancel(self, ctx: SlashContext, member: discord.Member):
         if await general.correct_channel(ctx, ctx.author) == False:
             return
-        if ingame_schema.is_ingame(member):
-            ingame_schema.cancel_game(member)
+        if await mongo.run(ingame_schema.is_ingame, member):
+            await mongo.run(ingame_schema.cancel_game, member)
             try:
                 return await msg.cancel_game_message(ctx, ctx.author)
             except Exception as e:
@@ -361,8 +361,8 @@ class Admin(commands.Cog):
         user = ctx.author
         if await general.correct_channel(ctx, user) == False:
             return
-        if ingame_schema.raw_member_inqueue(member):
-            ingame_schema.remove_raw_member_from_queue(member)
+        if await mongo.run(ingame_schema.raw_member_inqueue, member):
+            await mongo.run(ingame_schema.remove_raw_member_from_queue, member)
             await msg.force_remove_from_queue(ctx, user, member)
         else:
             await ctx.send(f"{member} isn't in queue", hidden=True)
@@ -375,8 +375,41 @@ class Admin(commands.Cog):
     async def _history(self, ctx: SlashContext):
         if not await admin_channel(ctx, ctx.author):
             return
-        history = game_service.get_history()
+        history = await mongo.run(game_service.get_history)
         await msg.show_history(ctx, history)
+
+    @cog_ext.cog_slash(
+        name="recountstats",
+        description="Checks everyone's W/L/T against their game results (Admin only)",
+        permissions={
+            config.variables['main_guild_id']: [
+                # Chilla Admin - True
+                create_permission(config.variables['chilla_admin_role'], SlashCommandPermissionType.ROLE, True),
+                # Chilling - False
+                create_permission(config.variables['chillin_role'], SlashCommandPermissionType.ROLE, False)
+            ]
+        },
+        options=[
+            create_option(
+                name="fix",
+                description="Overwrite the W/L/T that don't match",
+                required=False,
+                option_type=5
+            )
+        ],
+        guild_ids=config.variables['guild_ids'],
+    )
+    async def _recountstats(self, ctx: SlashContext, fix: bool = False):
+        if not await admin_channel(ctx, ctx.author):
+            return
+        checked, mismatched = await mongo.run(profile_service.recount_player_stats, fix)
+        body = f"Checked **`{checked}`** profiles; **`{mismatched}`** had W/L/T that didn't match their games."
+        if mismatched and fix:
+            body += " They've been **fixed**."
+        elif mismatched:
+            body += " Run with `fix` to overwrite them."
+        color = msg.success_color if not mismatched or fix else msg.error_color
+        await ctx.send(embed=discord.Embed(title="W/L/T Recount", description=body, color=color))
     
     @cog_ext.cog_slash(
         name="removewarnings",
@@ -418,10 +451,10 @@ class Admin(commands.Cog):
     async def _removewarnings(self, ctx:SlashContext, member:discord.Member, amount:int):
         if not await admin_channel(ctx, ctx.author):
             return
-        warnings = member_schema.get_number_of_warnings(member)
+        warnings = await mongo.run(member_schema.get_number_of_warnings, member)
         if warnings < 1:
             return await ctx.send(f"**{member.name}** has no warnings or is banned.", hidden=True)
-        updated_warnings = member_schema.remove_single_warnings(member, warnings, amount)
+        updated_warnings = await mongo.run(member_schema.remove_single_warnings, member, warnings, amount)
 
         body = f"""
             Your warning(s) has been **removed**.
@@ -483,8 +516,8 @@ class Admin(commands.Cog):
         if not await admin_channel(ctx, ctx.author):
             return
         if category == "banned":
-            banned_list = member_schema.get_all_banned()
-            if banned_list.count() < 1:
+            banned_list = await mongo.run(lambda: list(member_schema.get_all_banned()))
+            if len(banned_list) < 1:
                 embed = discord.Embed(title="Banned", description="No one is **banned**.", color=msg.success_color)
                 await ctx.send(embed=embed)
             else:
@@ -494,8 +527,8 @@ class Admin(commands.Cog):
                 embed = discord.Embed(title="Banned", description=body, color=msg.error_color)
                 await ctx.send(embed=embed)
         else:
-            warning_list = member_schema.get_all_warned()
-            if warning_list.count() < 1:
+            warning_list = await mongo.run(lambda: list(member_schema.get_all_warned()))
+            if len(warning_list) < 1:
                 embed = discord.Embed(title="Warned", description="No one has been **warned**.", color=msg.success_color)
                 await ctx.send(embed=embed)
             else:
@@ -5,7 +5,7 @@ from discord_slash.context import SlashContext
 from discord_slash.utils.manage_commands import create_option, create_choice
 
 import config
-from includes import msg
+from includes import msg, mongo
 from includes.general import correct_channel
 from models.ingame_models import SwapResult, SwapError
 from models.profile import Outcome
@@ -40,7 +40,7 @@ class Ingame(commands.Cog):
         if not await correct_channel(ctx, ctx.author):
             return
 
-        games = game_service.get_games(Queue(queue) if queue else None)
+        games = await mongo.run(game_service.get_games, Queue(queue) if queue else None)
         await msg.games_info(ctx, games)
 
     @cog_ext.cog_slash(
@@ -74,7 +74,7 @@ class Ingame(commands.Cog):
         if not await correct_channel(ctx, ctx.author):
             return
 
-        game = game_service.finish(ctx.author, Outcome(outcome))
+        game = await mongo.run(game_service.finish, ctx.author, Outcome(outcome))
 
         if game is None:
             await msg.not_ingame(ctx)
@@ -100,7 +100,7 @@ class Ingame(commands.Cog):
             return
 
         user = ctx.author
-        swap_result: SwapResult = game_service.swap(user, member)
+        swap_result: SwapResult = await mongo.run(game_service.swap, user, member)
         if swap_result.error == SwapError.USER_NOT_IN_GAME:
             await msg.not_ingame(ctx)
             return
@@ -128,25 +128,19 @@ class Ingame(commands.Cog):
             return
 
         user = ctx.author
-        if ingame_schema.is_ingame(user):
+        if await mongo.run(ingame_schema.is_ingame, user):
             await ctx.send("You're already ingame.", hidden=True)
         else:
-            if ingame_schema.is_ingame(member) == False:
+            if not await mongo.run(ingame_schema.is_ingame, member):
                 await ctx.send(f"**{member.name}** isn't ingame.", hidden=True)
             else:
-                member_schema.check_profile(user)
+                await mongo.run(member_schema.check_profile, user)
                 # sub player
-                if ingame_schema.check_if_comp_game_by_user(member):
+                if await mongo.run(ingame_schema.check_if_comp_game_by_user, member):
                     return await ctx.send("You can't sub players while drafting is going on", hidden=True)
-                ingame_schema.sub_player(user, member)
+                await mongo.run(ingame_schema.sub_player, user, member)
                 embed = discord.Embed(description=f"**{user.name}** has subbed **{member.name}**")
-                for guild in self.bot.guilds:
-                    if guild.name == ctx.guild.name:
-                        await ctx.send(embed=embed)
-                    else:
-                        channel = discord.utils.get(guild.text_channels, name=config.variables['channel'])
-                        if channel is not None:
-                            await channel.send(embed=embed)
+                await msg.send_in_correct_channel(ctx, self.bot, embed=embed)
 
 
 def setup(cog):
@@ -5,7 +5,7 @@ from discord_slash.context import SlashContext
 from discord_slash.utils.manage_commands import create_option
 
 import config
-from includes import msg
+from includes import msg, mongo
 from includes.general import correct_channel
 from models import twitch
 from services import analytics_service
@@ -48,7 +48,7 @@ class Misc(commands.Cog):
             return
 
         await ctx.defer()
-        leaderboard = analytics_service.get_leaderboard(year, month)
+        leaderboard = await mongo.run(analytics_service.get_leaderboard, year, month)
         if leaderboard is None:
             await msg.invalid_date(ctx)
             return
@@ -9,7 +9,7 @@ from discord_slash.context import SlashContext
 from discord_slash.utils.manage_commands import create_option, create_choice
 
 import config
-from includes import general, msg
+from includes import general, msg, mongo
 from schemas import member_schema, general_schema
 
 
@@ -39,9 +39,9 @@ class Profile(commands.Cog):
         if await general.correct_channel(ctx, user) == False:
             return
         if member is None:
-            member_schema.check_profile(user)
-            profile = member_schema.get_profile(user)
-            profile_stats = member_schema.get_player_stats(user.id)
+            await mongo.run(member_schema.check_profile, user)
+            profile = await mongo.run(member_schema.get_profile, user)
+            profile_stats = await mongo.run(member_schema.get_player_stats, user.id, profile)
             region_emojis = {
                 "NA":":flag_us: ",
                 "EU":":flag_eu: ",
@@ -51,7 +51,7 @@ class Profile(commands.Cog):
             embed = discord.Embed()
             embed.set_author(icon_url=user.avatar_url, name=user.name)
             embed.set_thumbnail(url=user.avatar_url)
-            if member_schema.already_admin(user):
+            if await mongo.run(member_schema.already_admin, user):
                 embed.add_field(name="Role", value="**`Chilla Admin`**")
             else:
                 embed.add_field(name="Role", value="**`Gamer`**")
@@ -70,9 +70,9 @@ class Profile(commands.Cog):
             else:
                 embed.add_field(name="W/L/T*", value=f"**`Hidden`**")
         else:
-            member_schema.check_profile(member)
-            profile = member_schema.get_profile(member)
-            profile_stats = member_schema.get_player_stats(member.id)
+            await mongo.run(member_schema.check_profile, member)
+            profile = await mongo.run(member_schema.get_profile, member)
+            profile_stats = await mongo.run(member_schema.get_player_stats, member.id, profile)
             region_emojis = {
                 "NA":":flag_us: ",
                 "EU":":flag_eu: ",
@@ -82,7 +82,7 @@ class Profile(commands.Cog):
             embed = discord.Embed()
             embed.set_author(icon_url=member.avatar_url, name=member.name)
             embed.set_thumbnail(url=member.avatar_url)
-            if member_schema.already_admin(member):
+            if await mongo.run(member_schema.already_admin, member):
                 embed.add_field(name="Role", value="**`Chilla Admin`**")
             else:
                 embed.add_field(name="Role", value="**`Gamer`**")
@@ -113,10 +113,10 @@ class Profile(commands.Cog):
     async def _setup(self, ctx:SlashContext):
         if await general.correct_channel(ctx, ctx.author) == False:
             return
-        if general_schema.check_setup_exists(ctx.author):
+        if await mongo.run(general_schema.check_setup_exists, ctx.author):
             return await ctx.send("Setup already in progress. Check your DM's", hidden=True)
         unique_id = str(uuid.uuid4())
-        general_schema.add_profile_setup(ctx.author, str(unique_id), 1)
+        await mongo.run(general_schema.add_profile_setup, ctx.author, str(unique_id), 1)
         await msg.profile_setup(ctx.author, unique_id)
         embed = discord.Embed(description="Setup has been sent. **Check your DM's**", color=msg.success_color)
         await ctx.send(embed=embed)
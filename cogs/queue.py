@@ -5,9 +5,9 @@ from discord_slash.utils.manage_commands import create_option
 
 import config
 from cogs.shared.add import add
-from includes import msg, general
+from includes import msg, general, mongo
 from models.queue_models import Queue as QueueEnum
-from schemas import member_schema, queue_schema
+from services import queue_service
 
 
 class Queue(commands.Cog):
@@ -69,12 +69,14 @@ class Queue(commands.Cog):
         user = ctx.author
         if not await general.correct_channel(ctx, user):
             return
-        queue_schema.remove_from_queue(user, queue)
+        # The queues are held in memory, so none of this needs the Mongo executor
+        queue_service.remove(user, queue)
 
         if queue != "all":
-            await msg.removed_from_single_queue(ctx, self.bot, queue, queue_schema.get_queue_count(QueueEnum(queue)))
+            queue_count = queue_service.get_queue_count(QueueEnum(queue))
+            await msg.removed_from_single_queue(ctx, self.bot, queue, queue_count)
         else:
-            await msg.removed_from_all_queues(ctx, self.bot, queue_schema.get_all_queue_counts())
+            await msg.removed_from_all_queues(ctx, self.bot, queue_service.get_all_queue_counts())
 
     @cog_ext.cog_slash(
         name="status",
@@ -85,19 +87,7 @@ class Queue(commands.Cog):
         user = ctx.author
         if not await general.correct_channel(ctx, user):
             return
-        queues = [QueueEnum.QUICKPLAY.value, QueueEnum.NEWBLOODS.value, QueueEnum.TEST.value]
-        embed = discord.Embed(color=msg.success_color)
-        for q in queues:
-            is_live = queue_schema.queue_is_ingame(q)
-            players = []
-            for player in queue_schema.get_queue_players(q):
-                games_played = member_schema.get_profile_by_id(player['userId'])['gamesPlayed']
-                players.append(f"{config.variables['rank']} **`{games_played}`** **`{player['username'][:14]}`**")
-            embed.add_field(
-                name=f"{config.variables['live'] if is_live else ''}**{q.upper()}** **`[{queue_schema.get_queue_count(QueueEnum(q))}/10]`**",
-                value="**`OPEN`**" if len(players) < 1 else '\n'.join(players))
-
-        await ctx.send(embed=embed)
+        await msg.queue_status(ctx, await mongo.run(queue_service.get_status_snapshot))
 
 
 def setup(cog):
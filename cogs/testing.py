@@ -4,7 +4,7 @@ from discord_slash.context import SlashContext
 from discord_slash.utils.manage_commands import create_option, create_choice
 
 import config
-from includes import msg
+from includes import msg, mongo
 from schemas import testing_schema, ingame_schema
 from services import game_service
 
@@ -81,7 +81,7 @@ class Testing(commands.Cog):
     )
     async def _addplayers(self, ctx: SlashContext, queue: str, amount: str):
         amount = int(amount)
-        testing_schema.add_test_players(queue, amount)
+        await mongo.run(testing_schema.add_test_players, queue, amount)
         await msg.success(ctx, f"Added **{amount}** players to **`{queue}`**")
 
     @cog_ext.cog_slash(
@@ -90,10 +90,10 @@ class Testing(commands.Cog):
         guild_ids=config.variables['guild_ids']
     )
     async def _draft(self, ctx: SlashContext):
-        game_id = ingame_schema.get_game_id_from_user(ctx.author)
-        game, draft_state = game_service.get_game_and_draft_state(game_id)
+        game_id = await mongo.run(ingame_schema.get_game_id_from_user, ctx.author)
+        game, draft_state = await mongo.run(game_service.get_game_and_draft_state, game_id)
         messages = await msg.draft_info(self.bot, game, draft_state)
-        game_service.update_draft_state_messages(game.game_id, messages)
+        await mongo.run(game_service.update_draft_state_messages, game.game_id, messages)
         await ctx.send("DMs sent", hidden=True)
 
     @cog_ext.cog_slash(
@@ -102,7 +102,7 @@ class Testing(commands.Cog):
         guild_ids=config.variables['guild_ids']
     )
     async def _reset(self, ctx: SlashContext):
-        testing_schema.reset_everything()
+        await mongo.run(testing_schema.reset_everything)
         await msg.success(ctx, "Everything has been **reset**!")
 
     @cog_ext.cog_slash(
@@ -119,7 +119,7 @@ class Testing(commands.Cog):
         guild_ids=config.variables['guild_ids']
     )
     async def _force_captain(self, ctx: SlashContext):
-        testing_schema.force_captain(ctx.author.id)
+        await mongo.run(testing_schema.force_captain, ctx.author.id)
         await msg.success(ctx, "I'm the captain now")
 
 
@@ -6,9 +6,9 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-def getenv_int(key) -> int:
+def getenv_int(key, default: int = None) -> int:
     value = getenv(key)
-    return None if value is None else int(value)
+    return default if value is None else int(value)
 
 
 def getenv_list_int(key) -> List[int]:
@@ -22,6 +22,11 @@ variables = {
     "environment": getenv("CHILLA_ENVIRONMENT", "DEV"),
     "mongo_connection_string": getenv("CHILLA_MONGO_CONNECTION_STRING"),
     "mongo_database_name": getenv("CHILLA_MONGO_DATABASE_NAME", "Chilla"),
+    "mongo_workers": getenv_int("CHILLA_MONGO_WORKERS", 1),
+    # Mongo commands slower than this are logged along with the slash command/loop that issued them
+    "mongo_slow_ms": getenv_int("CHILLA_MONGO_SLOW_MS", 100),
+    # rollup, aggregation or history; see analytics_service.LEADERBOARD_BACKENDS
+    "leaderboard_backend": getenv("CHILLA_LEADERBOARD_BACKEND", "rollup"),
     "token": getenv("CHILLA_DISCORD_TOKEN"),
     "version": "3.5.0",
     "main_guild": getenv("CHILLA_DISCORD_MAIN_GUILD"),
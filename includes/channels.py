@@ -0,0 +1,41 @@
+from typing import Dict, Optional
+
+import discord
+
+import config
+
+
+class ChannelRegistry:
+    """
+    The queue channel (matched by name) in each guild the bot is in, so broadcasts don't scan every guild's channel list
+    on every message. Guilds are resolved the first time they're looked up and re-resolved whenever their channels
+    change; see the guild listeners in main.py.
+
+    Only touched from the event loop, so there's no locking.
+    """
+
+    def __init__(self, channel_name: str):
+        self.channel_name = channel_name
+        self._channels: Dict[int, Optional[discord.TextChannel]] = {}
+
+    def get(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+        """
+        :return: The guild's queue channel, or None if it doesn't have one
+        """
+        if guild.id not in self._channels:
+            self.refresh_guild(guild)
+        return self._channels[guild.id]
+
+    def refresh_guild(self, guild: discord.Guild):
+        self._channels[guild.id] = discord.utils.get(guild.text_channels, name=self.channel_name)
+
+    def remove_guild(self, guild: discord.Guild):
+        self._channels.pop(guild.id, None)
+
+    def rebuild(self, guilds):
+        self._channels = {}
+        for guild in guilds:
+            self.refresh_guild(guild)
+
+
+registry = ChannelRegistry(config.variables['channel'])
@@ -0,0 +1,36 @@
+"""
+Concurrent fan-out for messages that go to several places at once: the queue channel in every guild, or a DM to each
+player in a game. Awaiting each send in turn means ten DMs take ten round trips back to back.
+"""
+import asyncio
+from typing import Awaitable, Iterable, List
+
+from includes import logger, metrics
+
+MAX_CONCURRENT_SENDS = 5
+
+
+async def fan_out(kind: str, sends: Iterable[Awaitable], limit: int = MAX_CONCURRENT_SENDS) -> List:
+    """
+    Awaits the sends concurrently, at most limit at a time. A send that raises is logged and its exception returned in
+    its place, so one closed DM or missing permission doesn't stop the others.
+
+    discord.py already queues requests that share a rate limit bucket (e.g. two messages to the same channel) and retries
+    after 429s, so the limit is only there to keep a large fan-out from bursting into the global rate limit.
+    :param kind: What's being sent, for the fan-out duration metric and error logs
+    :return: Each send's result or exception, in order
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def bounded(send: Awaitable):
+        async with semaphore:
+            return await send
+
+    with metrics.fanout_duration.time(kind=kind):
+        results = await asyncio.gather(*(bounded(send) for send in sends), return_exceptions=True)
+
+    for result in results:
+        if isinstance(result, Exception):
+            metrics.fanout_failures.inc(kind=kind)
+            logger.log(f"Fan-out {kind} send failed: {type(result).__name__}: {result}")
+    return results
@@ -3,12 +3,13 @@ from typing import Dict
 from discord_slash.context import SlashContext
 
 import config
+from includes import mongo
 from schemas import member_schema
 
 
 async def correct_channel(ctx: SlashContext, user):
     channel = ctx.channel.name
-    if member_schema.is_banned(user):
+    if await mongo.run(member_schema.is_banned, user):
         await ctx.send("You are currently banned.", hidden=True)
         return False
     if channel != config.variables['channel']:
@@ -18,7 +19,7 @@ async def correct_channel(ctx: SlashContext, user):
 
 async def admin_channel(ctx: SlashContext, user):
     channel = ctx.channel.name
-    if member_schema.is_banned(user):
+    if await mongo.run(member_schema.is_banned, user):
         await ctx.send("You are currently banned.", hidden=True)
         return False
     if channel != config.variables['admin_channel']:
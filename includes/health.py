@@ -0,0 +1,140 @@
+"""
+Liveness and readiness probes for the HTTP server. Probes run on the server's thread, never on the bot's event loop, so a
+stalled loop shows up as a failed probe instead of a probe that never answers.
+
+Results are cached for a few seconds so an orchestrator probing every second doesn't turn into a Mongo ping every second.
+Liveness only checks the event loop: a Mongo outage makes the bot unready, but restarting it wouldn't help.
+"""
+import asyncio
+import concurrent.futures
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+import config
+from includes import metrics
+
+CACHE_SECONDS = 5
+MONGO_TIMEOUT_MS = 2000
+EVENT_LOOP_TIMEOUT_SECONDS = 2
+
+_probe_client: Optional[MongoClient] = None
+
+
+def ping_mongo():
+    """
+    Pings Mongo on a client of its own: the main client waits up to 30 seconds for a server, which is far longer than a
+    probe should take to fail.
+    """
+    global _probe_client
+    if _probe_client is None:
+        _probe_client = MongoClient(host=config.variables["mongo_connection_string"],
+                                    serverSelectionTimeoutMS=MONGO_TIMEOUT_MS, connectTimeoutMS=MONGO_TIMEOUT_MS)
+    _probe_client.admin.command("ping")
+
+
+def timed(probe: Callable[[], None]) -> dict:
+    start = time.perf_counter()
+    try:
+        probe()
+    except (PyMongoError, concurrent.futures.TimeoutError, RuntimeError) as e:
+        return {"ok": False, "error": str(e) or type(e).__name__}
+    return {"ok": True, "latencyMs": round((time.perf_counter() - start) * 1000, 2)}
+
+
+class HealthChecker:
+    """
+    :param bot: The discord Client
+    :param loops: Background task loops by name; readiness requires every one of them to be running
+
+    The bot has to report gateway connects and disconnects (see main.py): discord.py's is_ready() stays true once the
+    first READY arrives, even while the gateway is down and reconnecting.
+    """
+
+    def __init__(self, bot, loops: Dict[str, object], mongo_ping: Callable[[], None] = ping_mongo,
+                 cache_seconds: float = CACHE_SECONDS):
+        self.bot = bot
+        self.loops = loops
+        self.mongo_ping = mongo_ping
+        self.cache_seconds = cache_seconds
+        self._checked_at = -math.inf
+        self._result: Optional[dict] = None
+        self._lock = threading.Lock()
+        self._event_loop_checked_at = -math.inf
+        self._event_loop_result: Optional[dict] = None
+        # Separate from _lock so a liveness probe never waits behind a slow Mongo ping
+        self._event_loop_lock = threading.Lock()
+        self._connected = False
+
+    def gateway_connected(self):
+        self._connected = True
+        # Don't keep serving a result from before the change
+        self._checked_at = -math.inf
+
+    def gateway_disconnected(self):
+        self._connected = False
+        self._checked_at = -math.inf
+
+    def check(self) -> dict:
+        # Concurrent probes wait for the one already running rather than each pinging Mongo
+        with self._lock:
+            if time.monotonic() - self._checked_at >= self.cache_seconds:
+                self._result = self._run_checks()
+                self._checked_at = time.monotonic()
+            return self._result
+
+    def check_event_loop(self) -> dict:
+        with self._event_loop_lock:
+            if time.monotonic() - self._event_loop_checked_at >= self.cache_seconds:
+                self._event_loop_result = {**timed(self._ping_event_loop), "checkedAt": datetime.now().isoformat()}
+                self._event_loop_checked_at = time.monotonic()
+            return self._event_loop_result
+
+    def liveness(self) -> Tuple[bool, dict]:
+        result = self.check_event_loop()
+        event_loop = {key: value for key, value in result.items() if key != "checkedAt"}
+        return result["ok"], {"eventLoop": event_loop, "checkedAt": result["checkedAt"]}
+
+    def readiness(self) -> Tuple[bool, dict]:
+        result = self.check()
+        ready = result["mongo"]["ok"] and result["gateway"]["ok"] and result["eventLoop"]["ok"] \
+            and all(loop["running"] for loop in result["loops"].values())
+        return ready, result
+
+    def _run_checks(self) -> dict:
+        return {
+            "mongo": timed(self.mongo_ping),
+            "gateway": self._gateway(),
+            "eventLoop": timed(self._ping_event_loop),
+            "loops": {name: self._loop(name, loop) for name, loop in self.loops.items()},
+            "checkedAt": datetime.now().isoformat()
+        }
+
+    def _gateway(self) -> dict:
+        latency = self.bot.latency
+        return {
+            "ok": self._connected and self.bot.is_ready() and not self.bot.is_closed(),
+            "connected": self._connected,
+            "ready": self.bot.is_ready(),
+            "closed": self.bot.is_closed(),
+            "latencyMs": None if math.isnan(latency) or math.isinf(latency) else round(latency * 1000, 2)
+        }
+
+    def _ping_event_loop(self):
+        loop = self.bot.loop
+        if not loop.is_running():
+            raise RuntimeError("Event loop isn't running")
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result(timeout=EVENT_LOOP_TIMEOUT_SECONDS)
+
+    @staticmethod
+    def _loop(name: str, loop) -> dict:
+        last_success = metrics.task_last_success.get(task=name)
+        return {
+            "running": loop.is_running(),
+            "lastSuccess": None if last_success is None else datetime.fromtimestamp(last_success).isoformat()
+        }
@@ -0,0 +1,81 @@
+"""
+The indexes the schemas' queries rely on, applied at startup. create_indexes is a no-op for indexes that already exist with
+the same spec, so this is safe to run on every boot.
+"""
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from includes import logger, mongo
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "Queue": [
+        IndexModel([("userId", ASCENDING), ("queue", ASCENDING)], unique=True, name="userId_queue"),
+        IndexModel([("queue", ASCENDING), ("added", ASCENDING)], name="queue_added"),
+        IndexModel([("position", ASCENDING)], name="position"),
+        IndexModel([("username", ASCENDING)], name="username"),
+    ],
+    "Ingame": [
+        IndexModel([("userId", ASCENDING)], name="userId"),
+        # Not unique: swap_players moves each player onto the other's document one write at a time
+        IndexModel([("gameId", ASCENDING), ("userId", ASCENDING)], name="gameId_userId"),
+        IndexModel([("gameId", ASCENDING), ("team", ASCENDING)], name="gameId_team"),
+    ],
+    "GameData": [
+        IndexModel([("gameId", ASCENDING)], unique=True, name="gameId"),
+        IndexModel([("status", ASCENDING), ("ended", ASCENDING)], name="status_ended"),
+        IndexModel([("queue", ASCENDING), ("status", ASCENDING)], name="queue_status"),
+        IndexModel([("ended", DESCENDING)], name="ended"),
+        IndexModel([("started", ASCENDING)], name="started"),
+    ],
+    "PlayerData": [
+        IndexModel([("gameId", ASCENDING), ("userId", ASCENDING)], name="gameId_userId"),
+        IndexModel([("userId", ASCENDING), ("outcome", ASCENDING)], name="userId_outcome"),
+    ],
+    "Profiles": [
+        IndexModel([("userId", ASCENDING)], unique=True, name="userId"),
+        IndexModel([("gamesPlayed", DESCENDING)], name="gamesPlayed"),
+    ],
+    "Ranks": [
+        IndexModel([("userId", ASCENDING)], unique=True, name="userId"),
+    ],
+    "RatingHistory": [
+        IndexModel([("userId", ASCENDING), ("rated", ASCENDING)], name="userId_rated"),
+        IndexModel([("gameId", ASCENDING)], name="gameId"),
+    ],
+    "DraftState": [
+        IndexModel([("gameId", ASCENDING)], unique=True, name="gameId"),
+    ],
+    "Messages": [
+        IndexModel([("uniqueueId", ASCENDING)], name="uniqueueId"),
+        IndexModel([("userId", ASCENDING)], name="userId"),
+    ],
+    "Admins": [
+        IndexModel([("userId", ASCENDING)], name="userId"),
+    ],
+    "Banned": [
+        IndexModel([("userId", ASCENDING)], name="userId"),
+    ],
+    "Warnings": [
+        IndexModel([("userId", ASCENDING)], name="userId"),
+    ],
+}
+
+
+def ensure_indexes() -> List[str]:
+    """
+    Creates any missing indexes. An index that can't be built (e.g. a unique index over existing duplicates, or a
+    same-named index with a different spec) is logged and skipped rather than stopping the bot from starting.
+    :return: Names of the indexes that couldn't be built, as "Collection.name"
+    """
+    failed = []
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            name = index.document['name']
+            try:
+                mongo.db[collection].create_indexes([index])
+            except OperationFailure as e:
+                logger.log(f"Couldn't create index {collection}.{name}: {e}")
+                failed.append(f"{collection}.{name}")
+    return failed
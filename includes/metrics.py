@@ -0,0 +1,185 @@
+"""
+In-process metrics, served in the Prometheus text format at /metrics. Everything here is updated as the bot runs
+(or, for Mongo-backed gauges, by the refresh_metrics loop in main.py), so a scrape only reads memory.
+
+Updates come from the event loop, the Mongo executor and the HTTP server thread, so each metric holds a lock.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LabelValues = Tuple[str, ...]
+
+
+def escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _format_labels(self, values: LabelValues, extra: Dict[str, str] = None) -> str:
+        pairs = list(zip(self.labels, values)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{label}="{escape(value)}"' for label, value in pairs) + "}"
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}",
+                          *self.samples()])
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in sorted(values.items())]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels))
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{self._format_labels(key)} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: a count for each bucket (non-cumulative, plus +Inf) and the sum of observed values
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            counts = {key: list(value) for key, value in self._counts.items()}
+            sums = dict(self._sums)
+
+        samples = []
+        for key in sorted(counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts[key]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                samples.append(f"{self.name}_bucket{self._format_labels(key, {'le': le})} {cumulative}")
+            samples.append(f"{self.name}_sum{self._format_labels(key)} {sums[key]}")
+            samples.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"{metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+queue_players = registry.register(Gauge(
+    "chilla_queue_players", "Players waiting in each queue", ["queue"]))
+games = registry.register(Gauge(
+    "chilla_games", "Games that haven't finished yet, by status", ["status"]))
+command_duration = registry.register(Histogram(
+    "chilla_command_duration_seconds", "Time to handle a slash command", ["command"]))
+event_loop_lag = registry.register(Histogram(
+    "chilla_event_loop_lag_seconds", "How late the event loop woke up a sleeping task",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)))
+mongo_command_duration = registry.register(Histogram(
+    "chilla_mongo_command_duration_seconds", "Mongo command round trip time", ["command"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)))
+discord_request_duration = registry.register(Histogram(
+    "chilla_discord_request_duration_seconds", "Discord REST request time, including rate limit waits",
+    ["method", "route"]))
+fanout_duration = registry.register(Histogram(
+    "chilla_fanout_duration_seconds", "Time to deliver a broadcast or batch of DMs to every recipient", ["kind"]))
+fanout_failures = registry.register(Counter(
+    "chilla_fanout_failures_total", "Individual sends that failed during a fan-out", ["kind"]))
+user_cache_requests = registry.register(Counter(
+    "chilla_user_cache_requests_total", "User and DM channel lookups by where they were answered from",
+    ["kind", "result"]))
+task_duration = registry.register(Histogram(
+    "chilla_task_duration_seconds", "Time spent in one run of a background loop", ["task"]))
+task_last_success = registry.register(Gauge(
+    "chilla_task_last_success_timestamp_seconds", "Unix time a background loop last finished a run", ["task"]))
+
+
+@contextmanager
+def task_run(task: str):
+    """
+    Times one run of a background loop, and records when it last got through a run without raising.
+    """
+    with task_duration.time(task=task):
+        yield
+    task_last_success.set(time.time(), task=task)
@@ -1,6 +1,61 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 
 import config
+from includes.mongo_stats import profiler
 
-client = MongoClient(host=config.variables["mongo_connection_string"])
+client = MongoClient(host=config.variables["mongo_connection_string"], event_listeners=[profiler])
 db = client[config.variables["mongo_database_name"]]
+
+# pymongo blocks, so anything running on the event loop hands its data calls to this pool instead of calling the
+# schemas/services directly. With the default single worker, calls still run one at a time in the order they were issued,
+# same as when they ran inline, so check-then-write sequences inside a single service call stay consistent.
+executor = ThreadPoolExecutor(max_workers=config.variables["mongo_workers"], thread_name_prefix="mongo")
+
+_supports_transactions = None
+
+
+async def run(func, *args, **kwargs):
+    """
+    Runs a blocking schema/service call on the Mongo executor and awaits its result without stalling the event loop.
+    Cursors are lazy and would still hit Mongo on the loop when iterated, so materialize them inside func (e.g. list()).
+    Runs in a copy of the caller's context, so the commands are attributed to the caller; see includes/mongo_stats.py.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def supports_transactions() -> bool:
+    """
+    Transactions need a replica set or sharded cluster; a standalone server (e.g. a local dev instance) rejects them.
+    """
+    global _supports_transactions
+    if _supports_transactions is None:
+        try:
+            hello = client.admin.command("hello")
+            _supports_transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except PyMongoError:
+            _supports_transactions = False
+    return _supports_transactions
+
+
+@contextmanager
+def transaction():
+    """
+    Yields a session with a transaction open, committed when the block exits cleanly and aborted if it raises. Yields None
+    where transactions aren't supported, so pass the result as session= and the writes just run on their own.
+    """
+    if not supports_transactions():
+        yield None
+        return
+
+    with client.start_session() as session:
+        with session.start_transaction():
+            yield session
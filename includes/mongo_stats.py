@@ -0,0 +1,143 @@
+"""
+Per-command Mongo profiling. Every command pymongo sends is attributed to whatever the bot was doing at the time - a
+slash command, a button press or a background loop - so we can see how many round trips each of them costs.
+
+The attribution lives in a context variable. Set it with attribute() at the top of the work; mongo.run copies the
+context onto the executor thread, and pymongo calls the listener on the thread that issued the command, so the schemas
+and services don't need to know about any of this.
+
+The profiler can also count collection method calls reported through called(), keyed by (collection, method). Nothing
+in the bot reports them; they're for test harnesses running where there's no command listener (see test/mongo_ops.py).
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict
+
+from pymongo import monitoring
+
+import config
+from includes import custom_ids, logger, metrics
+
+UNATTRIBUTED = "other"
+
+current_command: ContextVar[str] = ContextVar("current_command", default=UNATTRIBUTED)
+
+_custom_id_names = {value: name for name, value in vars(custom_ids).items() if not name.startswith("_")}
+
+
+@contextmanager
+def attribute(name: str):
+    """
+    Attributes the Mongo commands issued inside the block (including ones handed to mongo.run) to name.
+    """
+    token = current_command.set(name)
+    try:
+        yield
+    finally:
+        current_command.reset(token)
+
+
+def slash_command_name(interaction: dict) -> str:
+    return f"/{interaction['data']['name']}"
+
+
+def component_name(interaction: dict) -> str:
+    # Setup prompts and the like use one-off IDs; bucket those together so the stats don't grow without bound
+    custom_id = interaction['data'].get('custom_id')
+    return f"component:{_custom_id_names.get(custom_id, UNATTRIBUTED)}"
+
+
+class CommandStats:
+    def __init__(self):
+        self.invocations = 0
+        self.ops = 0
+        self.failed = 0
+        self.docs = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.commands: Dict[str, int] = defaultdict(int)
+        self.calls: Counter = Counter()
+
+    def to_dict(self) -> dict:
+        return {
+            "invocations": self.invocations,
+            "ops": self.ops,
+            "opsPerInvocation": round(self.ops / self.invocations, 2) if self.invocations else None,
+            "failed": self.failed,
+            "docs": self.docs,
+            "totalMs": round(self.total_ms, 2),
+            "maxMs": round(self.max_ms, 2),
+            "commands": dict(self.commands)
+        }
+
+
+class MongoCommandProfiler(monitoring.CommandListener):
+    """
+    Aggregates op counts, durations and returned document counts per attribution, and logs any single command slower
+    than slow_ms.
+    """
+
+    def __init__(self, slow_ms: float):
+        self.slow_ms = slow_ms
+        self._stats: Dict[str, CommandStats] = defaultdict(CommandStats)
+        self._lock = threading.Lock()
+
+    def invoked(self, name: str):
+        with self._lock:
+            self._stats[name].invocations += 1
+
+    def called(self, collection: str, method: str):
+        with self._lock:
+            self._stats[current_command.get()].calls[(collection, method)] += 1
+
+    def calls(self, name: str) -> Counter:
+        """
+        :return: The collection methods called for name so far, keyed by (collection, method)
+        """
+        with self._lock:
+            return Counter(self._stats[name].calls) if name in self._stats else Counter()
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, returned_docs(event.reply), failed=False)
+
+    def failed(self, event):
+        self._record(event, 0, failed=True)
+
+    def _record(self, event, docs: int, failed: bool):
+        name = current_command.get()
+        ms = event.duration_micros / 1000
+        with self._lock:
+            stats = self._stats[name]
+            stats.ops += 1
+            stats.failed += failed
+            stats.docs += docs
+            stats.total_ms += ms
+            stats.max_ms = max(stats.max_ms, ms)
+            stats.commands[event.command_name] += 1
+        metrics.mongo_command_duration.observe(ms / 1000, command=event.command_name)
+        if ms >= self.slow_ms:
+            logger.log(f"Slow Mongo command: {event.command_name} took {ms:.1f}ms for {name}")
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: stats.to_dict() for name, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def returned_docs(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if cursor is not None:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    # findAndModify
+    return 1 if reply.get("value") is not None else 0
+
+
+profiler = MongoCommandProfiler(slow_ms=config.variables["mongo_slow_ms"])
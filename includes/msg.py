@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime
 from typing import Dict, List, Tuple
 
@@ -8,11 +9,11 @@ from discord_slash.model import ButtonStyle
 from discord_slash.utils.manage_components import create_button, create_actionrow, create_select_option, create_select
 
 import config
-from includes import custom_ids, logger, emojis
+from includes import channels, custom_ids, fanout, logger, emojis, mongo, users
 from models.draft_state import DraftState
 from models.game import Game, GameStatus, FinishedGame
 from models.leaderboards import Leaderboard
-from models.queue_models import Queue
+from models.queue_models import Queue, QueueStatus
 from schemas import member_schema
 from services import game_service, map_service
 
@@ -87,14 +88,34 @@ async def removed_from_all_queues(ctx, bot, queue_counts: Dict[str, int]):
     await send_in_correct_channel(ctx, bot, content, embed)
 
 
+async def queue_status(ctx, statuses: List[QueueStatus]):
+    embed = discord.Embed(color=success_color)
+    for status in statuses:
+        players = [f"{config.variables['rank']} **`{player.games_played}`** **`{player.username[:14]}`**"
+                   for player in status.players]
+        embed.add_field(
+            name=f"{config.variables['live'] if status.is_ingame else ''}**{status.queue.value.upper()}** **`[{status.count}/10]`**",
+            value="**`OPEN`**" if len(players) < 1 else '\n'.join(players))
+
+    await ctx.send(embed=embed)
+
+
 async def send_in_correct_channel(ctx, bot, content: str = None, embed: Embed = None, components=None):
+    sends = []
     for guild in bot.guilds:
         if ctx.guild is None or ctx.guild.name != guild.name:
-            channel = discord.utils.get(guild.text_channels, name=config.variables['channel'])
+            channel = channels.registry.get(guild)
             if channel is not None:
-                await channel.send(content=content, embed=embed, components=components)
-        else:
+                sends.append(channel.send(content=content, embed=embed, components=components))
+    broadcast = asyncio.ensure_future(fanout.fan_out("broadcast", sends))
+
+    # The reply to the interaction acknowledges it, so it's awaited itself rather than fanned out: if it fails, the
+    # command has to hear about it instead of it only being logged
+    try:
+        if ctx.guild is not None and any(guild.name == ctx.guild.name for guild in bot.guilds):
             await ctx.send(content=content, embed=embed, components=components)
+    finally:
+        await broadcast
 
 
 async def game_started_dm(bot, user_id):
@@ -102,15 +123,20 @@ async def game_started_dm(bot, user_id):
     embed = discord.Embed(description=body, color=success_color)
 
     try:
-        player = await bot.fetch_user(user_id)
-        await player.send(embed=embed)
+        channel = await users.cache.get_dm_channel(bot, user_id)
+        await channel.send(embed=embed)
     except:
         return
 
 
+async def game_started_dms(bot, user_ids):
+    await fanout.fan_out("game_started_dm", [game_started_dm(bot, user_id) for user_id in user_ids])
+
+
 async def game_started(ctx, bot, game: Game):
-    suggested_server = game_service.pick_suggested_server(game.get_all_players())
-    game_service.update_game_server(game.game_id, suggested_server)
+    suggested_server = await mongo.run(game_service.pick_suggested_server, game.get_all_players())
+    await mongo.run(game_service.update_game_server, game.game_id, suggested_server)
+    games_played = await mongo.run(get_games_played, game)
     buttons = [
         create_button(
             style=ButtonStyle.green,
@@ -138,18 +164,18 @@ async def game_started(ctx, bot, game: Game):
         **`Maps:`** {', '.join(maps)}
     """
     embed = discord.Embed(title="Game Started", description=body, color=success_color)
-    team1_captain = f"{config.variables['rank_red']} **`{str(member_schema.get_profile_by_id(game.team1_captain.user_id)['gamesPlayed'])}`** **`{game.team1_captain.name[:14]}`**"
-    team2_captain = f"{config.variables['rank_red']} **`{str(member_schema.get_profile_by_id(game.team2_captain.user_id)['gamesPlayed'])}`** **`{game.team2_captain.name[:14]}`**"
+    team1_captain = f"{config.variables['rank_red']} **`{games_played[game.team1_captain.user_id]}`** **`{game.team1_captain.name[:14]}`**"
+    team2_captain = f"{config.variables['rank_red']} **`{games_played[game.team2_captain.user_id]}`** **`{game.team2_captain.name[:14]}`**"
 
     team1_players = []
     team2_players = []
 
     for player in game.team1_others:
         team1_players.append(
-            f"{config.variables['rank']} **`{str(member_schema.get_profile_by_id(player.user_id)['gamesPlayed'])}`** **`{player.name[:14]}`**")
+            f"{config.variables['rank']} **`{games_played[player.user_id]}`** **`{player.name[:14]}`**")
     for player in game.team2_others:
         team2_players.append(
-            f"{config.variables['rank']} **`{str(member_schema.get_profile_by_id(player.user_id)['gamesPlayed'])}`** **`{player.name[:14]}`**")
+            f"{config.variables['rank']} **`{games_played[player.user_id]}`** **`{player.name[:14]}`**")
     embed.add_field(name=f"{team1_captain}", value='\n'.join(team1_players))
     embed.add_field(name=f"{team2_captain}", value='\n'.join(team2_players))
 
@@ -160,6 +186,15 @@ async def game_started(ctx, bot, game: Game):
                                   components=[button_action_row, maps_action_row])
 
 
+def get_games_played(game: Game) -> Dict[int, int]:
+    players = game.get_all_players()
+    if all(player.games_played is not None for player in players):
+        return {player.user_id: player.games_played for player in players}
+
+    profiles = member_schema.get_profiles_by_ids([player.user_id for player in players], fields=["gamesPlayed"])
+    return {player.user_id: profiles[player.user_id]['gamesPlayed'] for player in players}
+
+
 async def display_chosen_map(ctx, game, old_map, _map):
     body = f"""
         A new map has been selected for **`{game['queue']}`**.
@@ -175,7 +210,8 @@ async def display_chosen_map(ctx, game, old_map, _map):
 
 
 async def new_game_started(ctx, bot, game: Game, user):
-    suggested_server = game_service.get_game_server(game.game_id)
+    suggested_server = await mongo.run(game_service.get_game_server, game.game_id)
+    games_played = await mongo.run(get_games_played, game)
     buttons = [
         create_button(
             style=ButtonStyle.green,
@@ -201,18 +237,18 @@ async def new_game_started(ctx, bot, game: Game, user):
         **`Maps:`** {', '.join(maps)}
     """
     embed = discord.Embed(title="Game Started", description=body, color=success_color)
-    team1_captain = f"{config.variables['rank_red']} **`{str(member_schema.get_profile_by_id(game.team1_captain.user_id)['gamesPlayed'])}`** **`{game.team1_captain.name[:14]}`**"
-    team2_captain = f"{config.variables['rank_red']} **`{str(member_schema.get_profile_by_id(game.team2_captain.user_id)['gamesPlayed'])}`** **`{game.team2_captain.name[:14]}`**"
+    team1_captain = f"{config.variables['rank_red']} **`{games_played[game.team1_captain.user_id]}`** **`{game.team1_captain.name[:14]}`**"
+    team2_captain = f"{config.variables['rank_red']} **`{games_played[game.team2_captain.user_id]}`** **`{game.team2_captain.name[:14]}`**"
 
     team1_players = []
     team2_players = []
 
     for player in game.team1_others:
         team1_players.append(
-            f"{config.variables['rank']} **`{str(member_schema.get_profile_by_id(player.user_id)['gamesPlayed'])}`** **`{player.name[:14]}`**")
+            f"{config.variables['rank']} **`{games_played[player.user_id]}`** **`{player.name[:14]}`**")
     for player in game.team2_others:
         team2_players.append(
-            f"{config.variables['rank']} **`{str(member_schema.get_profile_by_id(player.user_id)['gamesPlayed'])}`** **`{player.name[:14]}`**")
+            f"{config.variables['rank']} **`{games_played[player.user_id]}`** **`{player.name[:14]}`**")
     embed.add_field(name=f"{team1_captain}", value='\n'.join(team1_players))
     embed.add_field(name=f"{team2_captain}", value='\n'.join(team2_players))
 
@@ -379,7 +415,7 @@ async def draft_info(bot, game: Game, draft_state: DraftState) -> Dict[int, int]
 
     for captain in game.team1_captain, game.team2_captain:
         try:
-            user = await bot.fetch_user(captain.user_id)
+            channel = await users.cache.get_dm_channel(bot, captain.user_id)
         except Exception as e:
             logger.log(e)
             logger.log("Most likely, the error is due to testing with a non-real Discord user")
@@ -416,8 +452,8 @@ async def draft_info(bot, game: Game, draft_state: DraftState) -> Dict[int, int]
             body = body + "**Waiting on opponent....**"
             components = None
         embed = discord.Embed(description=body, color=success_color)
-        message = await user.send(embed=embed, components=components)
-        messages[user.id] = message.id
+        message = await channel.send(embed=embed, components=components)
+        messages[captain.user_id] = message.id
     return messages
 
 
@@ -0,0 +1,127 @@
+import asyncio
+import heapq
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+
+
+class QueueExpiryScheduler:
+    """
+    Min-heap of queue entries keyed on when they expire (added + timeout), so the autoremove loop can sleep until the next
+    expiry instead of scanning the Queue collection on an interval.
+
+    Updates come from the queue schemas, which run on the Mongo executor, so everything touching the heap holds a lock.
+    Entries that are refreshed or removed are left in the heap and skipped when popped (lazy deletion); _deadlines holds
+    the current deadline for every live entry.
+
+    The heap is only a wake-up hint - removals are still conditional on the Queue document actually being old enough, so a
+    write path that forgets to update the scheduler can cause a wasted query but never an early removal.
+    """
+
+    def __init__(self, timeout: timedelta):
+        self.timeout = timeout
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._deadlines: Dict[Tuple[int, str], datetime] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def schedule(self, user_id: int, queue: str, added: datetime):
+        deadline = added + self.timeout
+        with self._lock:
+            self._deadlines[(user_id, queue)] = deadline
+            heapq.heappush(self._heap, (deadline, user_id, queue))
+            is_next = self._heap[0][0] == deadline
+        if is_next:
+            self._notify()
+
+    def cancel(self, user_id: int, queues: Iterable[str] = None):
+        """
+        :param queues: None to cancel the user's entries in every queue
+        """
+        with self._lock:
+            keys = [key for key in self._deadlines if key[0] == user_id] if queues is None \
+                else [(user_id, queue) for queue in queues]
+            for key in keys:
+                self._deadlines.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
+            self._deadlines = {}
+
+    def rebuild(self, queue_players: Iterable[dict]):
+        """
+        Replaces the schedule with the given Queue documents; used at startup to pick up what's already in Mongo.
+        """
+        with self._lock:
+            self._deadlines = {(player['userId'], player['queue']): player['added'] + self.timeout
+                               for player in queue_players}
+            self._heap = [(deadline, user_id, queue) for (user_id, queue), deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        self._notify()
+
+    def next_deadline(self) -> Optional[datetime]:
+        with self._lock:
+            self._discard_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[Tuple[int, str]]:
+        """
+        :return: (user ID, queue) for every entry whose deadline is at or before now, earliest first
+        """
+        due = []
+        with self._lock:
+            self._discard_stale()
+            while self._heap and self._heap[0][0] <= now:
+                _, user_id, queue = heapq.heappop(self._heap)
+                del self._deadlines[(user_id, queue)]
+                due.append((user_id, queue))
+                self._discard_stale()
+        return due
+
+    def __len__(self):
+        with self._lock:
+            return len(self._deadlines)
+
+    async def wait_for_due(self) -> List[Tuple[int, str]]:
+        """
+        Sleeps until at least one entry expires and returns the expired entries. Schedule changes that move the next
+        deadline wake the sleeper up to recalculate.
+        """
+        self._loop = asyncio.get_running_loop()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+
+        while True:
+            # Clear before checking so a schedule() landing between the check and the wait still wakes us up
+            self._wakeup.clear()
+            now = datetime.now()
+            due = self.pop_due(now)
+            if due:
+                return due
+
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max((deadline - now).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _discard_stale(self):
+        while self._heap:
+            deadline, user_id, queue = self._heap[0]
+            if self._deadlines.get((user_id, queue)) == deadline:
+                return
+            heapq.heappop(self._heap)
+
+    def _notify(self):
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(wakeup.set)
+
+
+scheduler = QueueExpiryScheduler(timedelta(minutes=config.variables['auto_remove']))
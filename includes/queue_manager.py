@@ -0,0 +1,221 @@
+"""
+The queues, held in memory. Every add, refresh, removal, count and pop happens here under one lock instead of in
+several round trips to the Queue collection, which is now just a copy kept for recovering from a restart: changes are
+recorded in a journal and written to Mongo in one bulk write whenever flush() runs (the persist_queues loop in
+main.py), and load() rebuilds the queues from it at startup. A crash can lose up to one flush interval of changes.
+
+Calls come from the Mongo executor, the event loop and the persist loop, so everything touching the state holds _lock.
+Because a player's check-and-add happens under that lock too, the add that fills a queue is the only one to see it at
+MAX_QUEUE_SIZE, however many land at once, and add_and_claim() takes the lobby out in that same step.
+"""
+import datetime
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+from includes import logger
+from includes.queue_expiry import scheduler
+from models.queue_models import Queue, MAX_QUEUE_SIZE
+from schemas import queue_schema
+
+
+class QueueManager:
+    def __init__(self):
+        # Per queue, the players waiting in the order they joined, each as a Queue document without its _id. added is when
+        # they last (re-)added and drives expiry; position numbers entries in the order they first joined, so their
+        # place survives a restart (timestamps only have millisecond precision in Mongo, so they can tie).
+        self._queues: Dict[str, OrderedDict] = {queue.value: OrderedDict() for queue in Queue}
+        self._next_position = 0
+        self._journal: Deque = deque()
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+
+    def add(self, user_id: int, username: str, queue: str) -> int:
+        """
+        Adds the player to the back of the queue, or refreshes their entry if they're already in it.
+        :return: How many players are in the queue after this add
+        """
+        with self._lock:
+            entries = self._queues[queue]
+            if user_id in entries:
+                self._refresh(user_id, queue, datetime.datetime.now())
+            else:
+                self._put({"userId": user_id, "username": username, "queue": queue, "added": datetime.datetime.now(),
+                           "position": self._next_position})
+                self._next_position += 1
+            return len(entries)
+
+    def add_and_claim(self, user_id: int, username: str, queue: str,
+                      lobby_size: int = MAX_QUEUE_SIZE) -> Tuple[int, Optional[List[dict]]]:
+        """
+        Adds the player and, if that fills the queue, atomically takes the first lobby_size players out of it (see pop),
+        so no other add, removal or pop can get in between. Exactly one add claims each lobby.
+        :return: How many players were in the queue after this add, and the claimed lobby if there was one
+        """
+        with self._lock:
+            count = self.add(user_id, username, queue)
+            return count, (self.pop(queue, lobby_size) if count >= lobby_size else None)
+
+    def refresh(self, user_id: int, queue: str, added: datetime.datetime = None) -> bool:
+        """
+        Restarts the player's expiry timer without moving them in the queue.
+        :return: False if they aren't in the queue
+        """
+        with self._lock:
+            if user_id not in self._queues[queue]:
+                return False
+            self._refresh(user_id, queue, added or datetime.datetime.now())
+            return True
+
+    def remove(self, user_id: int, queues: Iterable[str] = None) -> List[dict]:
+        """
+        :param queues: None to remove the player from every queue
+        :return: The entries that were removed
+        """
+        with self._lock:
+            removed = [self._queues[queue].pop(user_id) for queue in (self._queues if queues is None else queues)
+                       if user_id in self._queues[queue]]
+            if removed:
+                self._journal.append(queue_schema.delete_entries([user_id], [entry['queue'] for entry in removed]))
+                scheduler.cancel(user_id, [entry['queue'] for entry in removed])
+            return removed
+
+    def remove_by_username(self, username: str) -> Optional[dict]:
+        """
+        Removes the first queue entry found for the username; used where admins type a name instead of picking a user.
+        """
+        with self._lock:
+            entry = next((entry for entries in self._queues.values() for entry in entries.values()
+                          if entry['username'] == username), None)
+            if entry is None:
+                return None
+            return self.remove(entry['userId'], [entry['queue']])[0]
+
+    def auto_remove(self, user_id: int, queue: str, added_before: datetime.datetime) -> Optional[dict]:
+        """
+        :return: The removed entry, or None if the player isn't in the queue or re-added after added_before
+        """
+        with self._lock:
+            entry = self._queues[queue].get(user_id)
+            if entry is None or entry['added'] > added_before:
+                return None
+            return self.remove(user_id, [queue])[0]
+
+    def pop(self, queue: str, count: int = MAX_QUEUE_SIZE) -> List[dict]:
+        """
+        Takes the first count players out of the queue, and out of every other queue they're in.
+        :return: Their entries in the order they joined
+        """
+        with self._lock:
+            lobby = [dict(entry) for entry in list(self._queues[queue].values())[:count]]
+            for entry in lobby:
+                self.remove(entry['userId'])
+            return lobby
+
+    def restore(self, entries: List[dict]):
+        """
+        Puts popped players back at the front of their queue, in order, e.g. when a game fails to start.
+        """
+        with self._lock:
+            for entry in reversed(entries):
+                if entry['userId'] not in self._queues[entry['queue']]:
+                    self._put(dict(entry))
+                    self._queues[entry['queue']].move_to_end(entry['userId'], last=False)
+
+    def contains(self, user_id: int, queue: str) -> bool:
+        with self._lock:
+            return user_id in self._queues[queue]
+
+    def get(self, user_id: int, queue: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._queues[queue].get(user_id)
+            return None if entry is None else dict(entry)
+
+    def find_by_username(self, username: str) -> Optional[dict]:
+        with self._lock:
+            return next((dict(entry) for entries in self._queues.values() for entry in entries.values()
+                         if entry['username'] == username), None)
+
+    def count(self, queue: str) -> int:
+        with self._lock:
+            return len(self._queues[queue])
+
+    def counts(self, queues: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            return {queue: len(self._queues[queue]) for queue in queues}
+
+    def players(self, queue: str) -> List[dict]:
+        """
+        :return: The queue's entries in the order they joined
+        """
+        with self._lock:
+            return [dict(entry) for entry in self._queues[queue].values()]
+
+    def load(self, queue_players: Iterable[dict]):
+        """
+        Replaces the queues (and the expiry schedule) with the given Queue documents, in the order given, and drops any
+        unflushed changes.
+        """
+        with self._lock:
+            self._queues = {queue.value: OrderedDict() for queue in Queue}
+            self._journal.clear()
+            for player in queue_players:
+                self._queues[player['queue']][player['userId']] = {
+                    "userId": player['userId'],
+                    "username": player['username'],
+                    "queue": player['queue'],
+                    "added": player['added'],
+                    # Entries persisted before position existed sort first, same as they do in Mongo
+                    "position": player.get('position', -1)
+                }
+            self._next_position = max([entry['position'] + 1 for entries in self._queues.values()
+                                       for entry in entries.values()], default=0)
+            scheduler.rebuild([entry for entries in self._queues.values() for entry in entries.values()])
+
+    def clear(self):
+        self.load([])
+
+    def pending(self) -> int:
+        """
+        :return: How many changes haven't been written to Mongo yet
+        """
+        with self._lock:
+            return len(self._journal)
+
+    def flush(self) -> int:
+        """
+        Writes every change recorded so far to Mongo in one ordered bulk write. The writes are idempotent, so if the
+        bulk write fails the whole batch goes back on the journal to be retried by the next flush.
+        :return: How many changes were written
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._journal)
+                self._journal.clear()
+            if not batch:
+                return 0
+
+            try:
+                queue_schema.write_entries(batch)
+            except PyMongoError as e:
+                with self._lock:
+                    self._journal.extendleft(reversed(batch))
+                logger.log(f"Failed to persist {len(batch)} queue changes, will retry: {e}")
+                raise
+            return len(batch)
+
+    def _put(self, entry: dict):
+        self._queues[entry['queue']][entry['userId']] = entry
+        self._journal.append(queue_schema.put_entry(entry))
+        scheduler.schedule(entry['userId'], entry['queue'], entry['added'])
+
+    def _refresh(self, user_id: int, queue: str, added: datetime.datetime):
+        entry = self._queues[queue][user_id]
+        entry['added'] = added
+        self._journal.append(queue_schema.put_entry(entry))
+        scheduler.schedule(user_id, queue, added)
+
+
+manager = QueueManager()
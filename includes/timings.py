@@ -0,0 +1,34 @@
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from includes import logger
+
+
+class StageTimings:
+    """
+    Wall-clock time spent in each stage of a multi-step operation, in the order the stages ran.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage] = (time.perf_counter() - start) * 1000
+
+    @property
+    def total_ms(self) -> float:
+        return sum(self.stages.values())
+
+    def __str__(self):
+        stages = " ".join(f"{stage}={ms:.1f}ms" for stage, ms in self.stages.items())
+        return f"{self.name}: {stages} total={self.total_ms:.1f}ms"
+
+    def log(self):
+        logger.log(str(self))
@@ -1,3 +1,6 @@
+"""
+Fake discord Users for the tests and benchmarks.
+"""
 from typing import List
 
 from discord import User
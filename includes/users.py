@@ -0,0 +1,93 @@
+"""
+Users and DM channels for the DM paths. bot.fetch_user and opening a DM channel are both REST calls, and the same
+handful of players get DMed over and over (game starts, every draft pick), so the results are kept for a while.
+
+Only touched from the event loop, so there's no locking.
+"""
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import discord
+
+from includes import metrics
+
+MAX_ENTRIES = 512
+TTL_SECONDS = 60 * 60
+
+
+class _LRU:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        entry: Optional[Tuple[float, object]] = self._entries.get(key)
+        if entry is None:
+            return None
+        stored, value = entry
+        if time.monotonic() - stored > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class UserCache:
+    """
+    Looks users up in the gateway cache (members of any guild the bot shares with them) before falling back to the API,
+    and keeps what it had to fetch, along with DM channels it opened, for ttl_seconds.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: float = TTL_SECONDS):
+        self._users = _LRU(max_entries, ttl_seconds)
+        self._dm_channels = _LRU(max_entries, ttl_seconds)
+
+    async def get_user(self, bot, user_id: int) -> discord.User:
+        user = bot.get_user(user_id)
+        if user is not None:
+            metrics.user_cache_requests.inc(kind="user", result="gateway")
+            return user
+
+        user = self._users.get(user_id)
+        if user is not None:
+            metrics.user_cache_requests.inc(kind="user", result="hit")
+            return user
+
+        metrics.user_cache_requests.inc(kind="user", result="miss")
+        user = await bot.fetch_user(user_id)
+        self._users.put(user_id, user)
+        return user
+
+    async def get_dm_channel(self, bot, user_id: int) -> discord.DMChannel:
+        channel = self._dm_channels.get(user_id)
+        if channel is not None:
+            metrics.user_cache_requests.inc(kind="dm_channel", result="hit")
+            return channel
+
+        user = await self.get_user(bot, user_id)
+        channel = user.dm_channel
+        if channel is not None:
+            metrics.user_cache_requests.inc(kind="dm_channel", result="gateway")
+        else:
+            metrics.user_cache_requests.inc(kind="dm_channel", result="miss")
+            channel = await user.create_dm()
+        self._dm_channels.put(user_id, channel)
+        return channel
+
+    def clear(self):
+        self._users.clear()
+        self._dm_channels.clear()
+
+
+cache = UserCache()
@@ -1,63 +1,234 @@
+import asyncio
 import datetime
 import threading
+import time
 from glob import glob
 from pathlib import PurePath
 
 import discord
 from discord.ext import commands, tasks
 from discord_slash import SlashCommand
-from simple_http_server import server, request_map
+from pymongo.errors import PyMongoError
+from simple_http_server import Response, server, request_map
 
 import config
-from schemas import queue_schema, general_schema
+from includes import channels, fanout, indexes, metrics, mongo, mongo_stats, users
+from includes.health import HealthChecker
+from includes.queue_expiry import scheduler
+from includes.queue_manager import manager as queue_manager
+from schemas import general_schema, ingame_schema
+from services import analytics_service, queue_service
 
 COGS = [PurePath(path).stem for path in glob("./cogs/*.py")]
 if config.variables['environment'] == "PROD":
     COGS.remove("testing")
 
+LAG_PROBE_INTERVAL = 1
+QUEUE_PERSIST_INTERVAL = 1
+
+# Set once on_ready has done the one-off startup work
+started = False
+
+
+class ProfiledSlashCommand(SlashCommand):
+    """
+    Attributes the Mongo commands each interaction issues to the slash command or button that triggered it. Listeners
+    run as tasks that copy the context they were dispatched from, so the attribution reaches on_component handlers too.
+    """
+
+    async def on_socket_response(self, msg):
+        if msg["t"] != "INTERACTION_CREATE":
+            return await super().on_socket_response(msg)
+
+        interaction = msg["d"]
+        name = mongo_stats.component_name(interaction) if interaction["type"] == 3 \
+            else mongo_stats.slash_command_name(interaction)
+        mongo_stats.profiler.invoked(name)
+        with mongo_stats.attribute(name):
+            if interaction["type"] == 3:
+                # Buttons are handled by on_component listeners, which run as their own tasks and can't be timed here
+                await super().on_socket_response(msg)
+            else:
+                with metrics.command_duration.time(command=name):
+                    await super().on_socket_response(msg)
+
+
+def time_discord_requests(http):
+    """
+    Wraps the bot's REST client so every Discord API call (sends, fetches, edits...) lands in
+    chilla_discord_request_duration_seconds, labelled by the route template rather than the IDs in it.
+    """
+    request = http.request
+
+    async def timed_request(route, **kwargs):
+        with metrics.discord_request_duration.time(method=route.method, route=route.path):
+            return await request(route, **kwargs)
+
+    http.request = timed_request
+
+
 client = commands.Bot(command_prefix="!")
-slash = SlashCommand(client, sync_commands=True)
+slash = ProfiledSlashCommand(client, sync_commands=True)
+time_discord_requests(client.http)
 
 
-@tasks.loop(seconds=5)
+@tasks.loop(seconds=0)
 async def autoremove():
-    result = queue_schema.get_all_queue_players()
-    for player in result:
-        added = player['added']
-        if added < datetime.datetime.now() - datetime.timedelta(minutes=config.variables['auto_remove']):
-            queue_schema.auto_remove_from_queue(player['userId'])
-            for guild in client.guilds:
-                channel = discord.utils.get(guild.text_channels, name=config.variables['channel'])
-                embed = discord.Embed(
-                    description=f"Removed **{player['username']}** from **`{player['queue']}`** after **{config.variables['auto_remove']}** minutes",
-                    color=0xfc0303)
-                if channel is not None:
-                    await channel.send(embed=embed, content=f"<@!{player['userId']}>")
+    # Sleeps until the next queue entry expires rather than polling; see includes/queue_expiry.py
+    due = await scheduler.wait_for_due()
+    with metrics.task_run("autoremove"):
+        for user_id, queue in due:
+            with mongo_stats.attribute("task:autoremove"):
+                player = await mongo.run(queue_service.auto_remove, user_id, queue)
+            if player is None:
+                continue
+            embed = discord.Embed(
+                description=f"Removed **{player['username']}** from **`{player['queue']}`** after **{config.variables['auto_remove']}** minutes",
+                color=0xfc0303)
+            queue_channels = [channels.registry.get(guild) for guild in client.guilds]
+            await fanout.fan_out("autoremove", [channel.send(embed=embed, content=f"<@!{player['userId']}>")
+                                                for channel in queue_channels if channel is not None])
 
 
 @tasks.loop(seconds=5)
 async def autoremove_expired_messages():
-    messages = general_schema.get_all_setup_messages()
-    for message in messages:
-        if message['created'] < datetime.datetime.now() - datetime.timedelta(
-                minutes=config.variables['expire_message']):
-            embed = discord.Embed(description="Profile setup has expired. Use **`/setup`** again to restart")
-            user = await client.fetch_user(message['userId'])
-            await user.send(embed=embed)
-            general_schema.remove_setup(message['uniqueueId'])
+    with metrics.task_run("autoremove_expired_messages"), mongo_stats.attribute("task:autoremove_expired_messages"):
+        messages = await mongo.run(lambda: list(general_schema.get_all_setup_messages()))
+        for message in messages:
+            if message['created'] < datetime.datetime.now() - datetime.timedelta(
+                    minutes=config.variables['expire_message']):
+                embed = discord.Embed(description="Profile setup has expired. Use **`/setup`** again to restart")
+                channel = await users.cache.get_dm_channel(client, message['userId'])
+                await channel.send(embed=embed)
+                await mongo.run(general_schema.remove_setup, message['uniqueueId'])
+
+
+@tasks.loop(seconds=15)
+async def refresh_metrics():
+    # Keeps the Mongo-backed gauges current so that scraping /metrics never has to query anything
+    with metrics.task_run("refresh_metrics"), mongo_stats.attribute("task:refresh_metrics"):
+        queue_counts = queue_service.get_all_queue_counts()
+        game_counts = await mongo.run(ingame_schema.count_unfinished_games)
+        for queue, count in queue_counts.items():
+            metrics.queue_players.set(count, queue=queue)
+        for status, count in game_counts.items():
+            metrics.games.set(count, status=status.name.lower())
+
+
+@tasks.loop(seconds=QUEUE_PERSIST_INTERVAL)
+async def persist_queues():
+    # Write-behind for the in-memory queues; see includes/queue_manager.py
+    with metrics.task_run("persist_queues"), mongo_stats.attribute("task:persist_queues"):
+        if queue_manager.pending():
+            await mongo.run(queue_manager.flush)
+
+
+# A failed flush leaves its changes on the journal; keep the loop going so the next run retries them
+persist_queues.add_exception_type(PyMongoError)
+
+
+@tasks.loop(seconds=0)
+async def measure_event_loop_lag():
+    start = time.perf_counter()
+    await asyncio.sleep(LAG_PROBE_INTERVAL)
+    metrics.event_loop_lag.observe(max(time.perf_counter() - start - LAG_PROBE_INTERVAL, 0))
 
 
 @client.event
 async def on_ready():
+    global started
     print(f"CHILLA ONLINE | VERSION: {config.variables['version']}")
+    channels.registry.rebuild(client.guilds)
     await client.change_presence(activity=discord.Game(name="Midair 2"))
-    autoremove.start()
-    autoremove_expired_messages.start()
+    # on_ready fires again after every gateway reconnect. Reloading the queues then would throw away whatever hasn't
+    # been persisted yet, and the loops are already running, so the startup work only happens once it has succeeded.
+    # The flag is set up front so a reconnect mid-startup doesn't start it twice, and cleared if it fails (e.g. Mongo
+    # unreachable at boot) so the next on_ready tries again.
+    if started:
+        return
+    started = True
+    try:
+        await mongo.run(indexes.ensure_indexes)
+        await mongo.run(analytics_service.ensure_leaderboard_rollups)
+        await mongo.run(queue_service.load_queues)
+        for loop in (autoremove, autoremove_expired_messages, refresh_metrics, persist_queues, measure_event_loop_lag):
+            if not loop.is_running():
+                loop.start()
+    except Exception:
+        started = False
+        raise
+
+
+@client.listen()
+async def on_connect():
+    health.gateway_connected()
+
+
+@client.listen()
+async def on_resumed():
+    health.gateway_connected()
+
+
+@client.listen()
+async def on_disconnect():
+    health.gateway_disconnected()
+
+
+@client.listen()
+async def on_guild_join(guild):
+    channels.registry.refresh_guild(guild)
+
+
+@client.listen()
+async def on_guild_remove(guild):
+    channels.registry.remove_guild(guild)
+
+
+@client.listen()
+async def on_guild_channel_create(channel):
+    channels.registry.refresh_guild(channel.guild)
+
+
+@client.listen()
+async def on_guild_channel_delete(channel):
+    channels.registry.refresh_guild(channel.guild)
+
+
+@client.listen()
+async def on_guild_channel_update(before, after):
+    # Renames can move the queue channel to or away from a channel
+    channels.registry.refresh_guild(after.guild)
+
+
+health = HealthChecker(client, {
+    "autoremove": autoremove,
+    "autoremove_expired_messages": autoremove_expired_messages,
+    "refresh_metrics": refresh_metrics,
+    "persist_queues": persist_queues
+})
 
 
 @request_map("/")
 def healthcheck():
-    return {"status": "All good!"}
+    return {"status": "All good!", "mongo": mongo_stats.profiler.snapshot()}
+
+
+@request_map("/health/live")
+def liveness():
+    alive, result = health.liveness()
+    return Response(status_code=200 if alive else 503, body=result)
+
+
+@request_map("/health/ready")
+def readiness():
+    ready, result = health.readiness()
+    return Response(status_code=200 if ready else 503, body=result)
+
+
+@request_map("/metrics")
+def prometheus_metrics():
+    return Response(headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+                    body=metrics.registry.render())
 
 
 def run_bot():
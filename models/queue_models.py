@@ -1,5 +1,6 @@
 from datetime import datetime
 from enum import Enum
+from typing import List
 
 MAX_QUEUE_SIZE = 10
 
@@ -21,14 +22,16 @@ class AddStatus(Enum):
 
 class UserInGame:
     """
-    A player currently in game. Equality does not account for team assignment.
+    A player currently in game. Equality does not account for team assignment or games played.
     """
 
-    def __init__(self, user_id: int, name: str, is_captain: bool, team: int = None):
+    def __init__(self, user_id: int, name: str, is_captain: bool, team: int = None, games_played: int = None):
         self.is_captain = is_captain
         self.name = name
         self.user_id = user_id
         self.team = team
+        # As of when they joined the game, if known
+        self.games_played = games_played
 
     def __repr__(self):
         return f"UserInGame(user_id={self.user_id}, name={self.name}, is_captain={self.is_captain})"
@@ -43,22 +46,48 @@ class UserInGame:
 
 
 class AddResult:
-    def __init__(self, status: AddStatus, queue_count: int, queue: Queue, delay_seconds=None):
+    def __init__(self, status: AddStatus, queue_count: int, queue: Queue, delay_seconds=None, lobby: List[dict] = None):
         self.queue = queue
         self.status = status
         self.queue_count = queue_count
         self.delay_seconds = delay_seconds
+        # The queue entries this add claimed for a game, if it filled the queue
+        self.lobby = lobby
 
     @classmethod
     def status(cls, status: AddStatus, queue: Queue, delay_seconds=None):
         return cls(status=status, queue_count=None, queue=queue, delay_seconds=delay_seconds)
 
     @classmethod
-    def added(cls, queue_count: int, queue: Queue):
-        return cls(status=None, queue_count=queue_count, queue=queue)
+    def added(cls, queue_count: int, queue: Queue, lobby: List[dict] = None):
+        return cls(status=None, queue_count=queue_count, queue=queue, lobby=lobby)
 
     def should_start(self) -> bool:
-        return self.queue_count == MAX_QUEUE_SIZE
+        return self.lobby is not None
+
+
+class QueuedPlayer:
+    def __init__(self, user_id: int, username: str, games_played: int, added: datetime):
+        self.user_id = user_id
+        self.username = username
+        self.games_played = games_played
+        self.added = added
+
+
+class QueueStatus:
+    """
+    Point-in-time view of a queue for /status: who's waiting (in the order they joined) and whether a game from this
+    queue is in progress.
+    """
+
+    def __init__(self, queue: Queue, players: List[QueuedPlayer], is_ingame: bool):
+        self.queue = queue
+        self.players = players
+        self.is_ingame = is_ingame
+
+    @property
+    def count(self) -> int:
+        return len(self.players)
 
 
 class DelayQueueEntry:
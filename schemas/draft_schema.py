@@ -2,18 +2,21 @@ import datetime
 import random
 from typing import List, Dict
 
+from pymongo import UpdateOne
+
 from includes import mongo
+from includes.queue_manager import manager as queue_manager
 from includes.general import convert_keys_to_int
 from models.draft_state import BalancedPickOrder, DraftState
 from models.game import GameStatus
 from models.queue_models import Queue
+from schemas import ingame_schema
 
 pick_order = BalancedPickOrder()
 
 
 def generate_game(game_id, queue: Queue, maps):
-    players = list(mongo.db['Queue'].find({"queue": queue.value}).limit(10))
-    mongo.db['Queue'].delete_many({"userId": {"$in": [player['userId'] for player in players]}})
+    players = queue_manager.pop(queue.value)
 
     captain_ids = tuple(random.sample([player['userId'] for player in players], k=2))
     # For testing
@@ -31,12 +34,19 @@ def generate_game(game_id, queue: Queue, maps):
     ]
     mongo.db['Ingame'].insert_many(player_data)
 
+    ratings = ingame_schema.get_players_with_ratings([player['userId'] for player in players])
     data = {
         "gameId": game_id,
         "queue": queue.value,
         "maps": maps,
         "status": 1,
-        "started": None
+        "started": None,
+        "players": [
+            ingame_schema.roster_entry(
+                ratings.get(player['userId'], ingame_schema.Player(player['userId'], player['username'])),
+                player['team'], player['isCaptain'])
+            for player in player_data
+        ]
     }
     mongo.db['GameData'].insert_one(data)
 
@@ -65,6 +75,10 @@ def pick_players(game_id, team: int, player_ids: List[int]):
     }
 
     mongo.db['Ingame'].update_many({"gameId": game_id, "userId": {"$in": player_ids}}, data)
+    mongo.db['GameData'].bulk_write([
+        UpdateOne({"gameId": game_id, "players.userId": player_id}, {"$set": {"players.$.team": team}})
+        for player_id in player_ids
+    ], ordered=False)
 
 
 def switch_pick_order(game_id, team: int, num_players_left: int):
@@ -1,24 +1,25 @@
 import datetime
-import itertools
 import random
-from typing import List, Tuple
+from typing import List, Dict, Optional, Tuple
 
 import pymongo
 from discord import User, Member
-from pymongo import ASCENDING
-from trueskill import Rating, quality, rate
+from pymongo import ASCENDING, UpdateOne
+from trueskill import Rating, rate
 
 from includes import custom_ids
 from includes import mongo
+from includes.queue_manager import manager as queue_manager
 from models.game import GameStatus, EmptyGame
 from models.queue_models import Queue
 
 
 class Player:
-    def __init__(self, user_id=0, username="", r=Rating()):
+    def __init__(self, user_id=0, username="", r=Rating(), games_played=None):
         self.rating = r
         self.username = username
         self.user_id = user_id
+        self.games_played = games_played
 
     def __repr__(self):
         return f"Player(user_id={self.user_id}, username={self.username}"
@@ -32,128 +33,135 @@ class Player:
         return hash(self.__repr__())
 
 
-def create_game(queue: Queue, game_id, maps):
+# GameData.players is a snapshot of the game's roster, so rendering a game is a single document read rather than a join
+# of Ingame and Profiles. Each entry is a roster_entry(), plus the player's outcome value once the game has finished.
+# Ingame stays the index of who's in which game; every write that changes the roster updates both.
+def roster_entry(player: Player, team: Optional[int], is_captain: bool) -> dict:
+    return {
+        "userId": player.user_id,
+        "username": player.username,
+        "team": team,
+        "isCaptain": is_captain,
+        "gamesPlayed": player.games_played,
+        "rank": player.rating.mu,
+        "confidence": player.rating.sigma
+    }
+
+
+def build_roster(team1: List[Player], team2: List[Player]) -> List[dict]:
+    """
+    Puts the players on the given teams, picking a random captain for each.
+    """
+    team1_captain = random.choice(team1)
+    team2_captain = random.choice(team2)
+    return [roster_entry(player, team, player.user_id == captain.user_id)
+            for team, players, captain in ((1, team1, team1_captain), (2, team2, team2_captain))
+            for player in players]
+
+
+def get_players_with_ratings(user_ids: List[int], session=None) -> Dict[int, Player]:
+    """
+    :return: Players with their usernames, ratings and games played, by user ID
+    """
+    ranks = mongo.db['Ranks'].find({"userId": {"$in": user_ids}}, session=session)
+    games_played = {profile['userId']: profile.get('gamesPlayed', 0) for profile in
+                    mongo.db['Profiles'].find({"userId": {"$in": user_ids}}, {"userId": 1, "gamesPlayed": 1},
+                                              session=session)}
+    return {rank['userId']: Player(rank['userId'], rank['username'], Rating(rank['rank'], rank['confidence']),
+                                   games_played.get(rank['userId'])) for rank in ranks}
+
+
+def update_roster(game_id, players: List[dict], session=None):
+    mongo.db['GameData'].update_one({"gameId": game_id}, {"$set": {"players": players}}, session=session)
+
+
+def backfill_roster(game_id) -> List[dict]:
+    """
+    Snapshots the roster of a game that was started before GameData carried one.
+    """
+    ingame_players = list(mongo.db['Ingame'].find({"gameId": game_id}))
+    players = get_players_with_ratings([player['userId'] for player in ingame_players])
+    roster = [roster_entry(players.get(player['userId'], Player(player['userId'], player['username'])),
+                           player['team'], player['isCaptain']) for player in ingame_players]
+    update_roster(game_id, roster)
+    return roster
+
+
+def create_game(queue: Queue, game_id, maps, players: List[dict], reshuffles=0, session=None) -> dict:
+    """
+    :param players: The roster, from build_roster()
+    """
     data = {
         "gameId": game_id,
         "queue": queue.value,
         "status": 2,
         "maps": maps,
         "started": datetime.datetime.now(),
-        "reshuffles": 0
+        "reshuffles": reshuffles,
+        "players": players
     }
 
-    mongo.db['GameData'].insert_one(data)
-
-
-def generate_teams(queue: Queue, game_id):
-    players = []
-    for player in mongo.db['Queue'].find({"queue": queue.value}).limit(10):
-        mongo.db['Queue'].delete_many({"userId": player['userId']})
-
-        player_rank = mongo.db['Ranks'].find_one({"userId": player['userId']})
-        players.append(Player(player_rank['userId'], player_rank['username'],
-                              Rating(player_rank['rank'], player_rank['confidence'])))
-    set_teams_for_game(game_id, players)
-
-
-def generate_match_combinations(players: List) -> List[Tuple[Tuple, Tuple]]:
-    players_by_id = {player.user_id: player for player in players}
-    ids = set(players_by_id.keys())
-
-    combos_of_five = itertools.combinations(ids, 5)
-    teams_used = set()
-    matches: List[Tuple[Tuple[int]]] = []
-
-    for combo_of_five in combos_of_five:
-        team1_sorted_tuple = tuple(sorted(combo_of_five))
-        team2_sorted_tuple = tuple(sorted(ids.difference(set(team1_sorted_tuple))))
-
-        if team1_sorted_tuple in teams_used or team2_sorted_tuple in teams_used:
-            continue
-
-        teams_used.add(team1_sorted_tuple)
-        teams_used.add(team2_sorted_tuple)
-
-        matches.append((tuple(team1_sorted_tuple), tuple(team2_sorted_tuple)))
-
-    return [tuple(tuple(players_by_id[player_id] for player_id in team) for team in match) for match in matches]
-
-
-def set_teams_for_game(game_id, players):
-    combinations_of_matches = generate_match_combinations(players)
-    reshuffles = get_game(game_id)["reshuffles"]
-    if reshuffles > len(combinations_of_matches):
-        print("Exceeded max number of reshuffles; resetting to 0")
-        reshuffles = 0
-    best_match = determine_best_match(combinations_of_matches, reshuffles)
-    mongo.db["GameData"].update_one({"gameId": game_id}, {
-        "$set": {
-            "reshuffles": reshuffles + 1
+    mongo.db['GameData'].insert_one(data, session=session)
+    return data
+
+
+def set_teams_for_game(game_id, players: List[dict], session=None) -> List[dict]:
+    """
+    Puts a new game's players in game.
+    :param players: The roster, from build_roster()
+    :return: The Ingame documents that were inserted
+    """
+    player_data = [
+        {
+            "userId": player['userId'],
+            "username": player['username'],
+            "team": player['team'],
+            "isCaptain": player['isCaptain'],
+            "gameId": game_id
         }
-    })
+        for player in players
+    ]
+    mongo.db['Ingame'].insert_many(player_data, session=session)
+    return player_data
+
+
+def reassign_teams(game_id, team1: List[Player], team2: List[Player], players: List[dict]) -> Optional[List[dict]]:
+    """
+    Moves a game's existing players onto the given teams, picking a random captain for each.
+    :param players: The game's current roster
+    :return: The new roster, or None without writing anything if any of the players aren't on the roster (e.g. they
+    were subbed out), in which case the caller should re-read it
+    """
+    roster = {player['userId']: player for player in players}
+    if any(player.user_id not in roster for player in team1 + team2):
+        return None
 
-    team1 = best_match[0]
-    team2 = best_match[1]
     team1_captain = random.choice(team1)
     team2_captain = random.choice(team2)
-    for player in team1:
-        data = {
-            "userId": player.user_id,
-            "username": player.username,
-            "team": 1,
-            "isCaptain": player.user_id == team1_captain.user_id,
-            "gameId": game_id
-        }
-        mongo.db['Ingame'].insert_one(data)
-    for player in team2:
-        data = {
-            "userId": player.user_id,
-            "username": player.username,
-            "team": 2,
-            "isCaptain": player.user_id == team2_captain.user_id,
-            "gameId": game_id
-        }
-        mongo.db['Ingame'].insert_one(data)
-
-
-def determine_best_match(combinations, reshuffles):
-    print(f'Testing Combinations.....reshuffles: {reshuffles}')
-
-    scores = []
-
-    for i, combo in enumerate(combinations):
-        team_1_ratings = []
-        team_2_ratings = []
-
-        for player in combo[0]:
-            team_1_ratings.append(player.rating)
+    reassigned = [{**roster[player.user_id], "team": team, "isCaptain": player.user_id == captain.user_id}
+                  for team, team_players, captain in ((1, team1, team1_captain), (2, team2, team2_captain))
+                  for player in team_players]
+    mongo.db['Ingame'].bulk_write([
+        UpdateOne({"gameId": game_id, "userId": player['userId']},
+                  {"$set": {"team": player['team'], "isCaptain": player['isCaptain']}})
+        for player in reassigned
+    ], ordered=False)
+    update_roster(game_id, reassigned)
+    return reassigned
 
-        for player in combo[1]:
-            team_2_ratings.append(player.rating)
 
-        quality_score = quality([team_1_ratings, team_2_ratings])
-        scores.append({'index': i, 'quality': quality_score})
+def increment_reshuffles(game_id) -> dict:
+    """
+    :return: The game as it was before this shuffle, so its reshuffles is how many times it had been shuffled
+    """
+    return mongo.db['GameData'].find_one_and_update({"gameId": game_id}, {"$inc": {"reshuffles": 1}})
 
-    scores = sorted(scores, key=lambda s: (s['quality']), reverse=True)
 
-    q = scores[reshuffles]['quality']
-    print(f'quality score: {q}')
-
-    return combinations[scores[reshuffles]['index']]
-
-
-def shuffle_teams(game_id):
-    players = []
-    for player in mongo.db['Ingame'].find({"gameId": game_id}):
-        # uid
-        # usrn
-        # rating
-        player_rank = mongo.db['Ranks'].find_one({"userId": player['userId']})
-        p = Player(player['userId'], player['username'], Rating(player_rank['rank'], player_rank['confidence']))
-        players.append(p)
-    mongo.db['Ingame'].delete_many({"gameId": game_id})
-
-    set_teams_for_game(game_id, players)
+def get_ingame_players_with_ratings(game_id) -> List[Player]:
+    ingame_players = list(mongo.db['Ingame'].find({"gameId": game_id}))
+    players = get_players_with_ratings([player['userId'] for player in ingame_players])
+    return [Player(player['userId'], player['username'], players[player['userId']].rating,
+                   players[player['userId']].games_played) for player in ingame_players]
 
 
 def update_game_status(game_id, status):
@@ -180,6 +188,17 @@ def get_all_ingame_players(game_id):
     return mongo.db['Ingame'].find({"gameId": game_id})
 
 
+def get_ingame_players_by_game(game_ids: List[str]) -> Dict[str, List[dict]]:
+    """
+    :return: The Ingame documents for each of the given games, from a single query
+    """
+    players = {game_id: [] for game_id in game_ids}
+    if game_ids:
+        for player in mongo.db['Ingame'].find({"gameId": {"$in": game_ids}}):
+            players[player['gameId']].append(player)
+    return players
+
+
 def is_games(queue):
     if queue is None:
         data = {
@@ -242,6 +261,15 @@ def get_games(queue: Queue):
         return mongo.db['GameData'].find(data)
 
 
+def count_unfinished_games() -> Dict[GameStatus, int]:
+    unfinished = [GameStatus.PENDING, GameStatus.STARTED]
+    counts = mongo.db['GameData'].aggregate([
+        {"$match": {"status": {"$in": [status.value for status in unfinished]}}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ])
+    return {**{status: 0 for status in unfinished}, **{GameStatus(count['_id']): count['count'] for count in counts}}
+
+
 def get_game_id_from_user(user):
     return mongo.db['Ingame'].find_one({"userId": user.id})['gameId']
 
@@ -269,38 +297,91 @@ def new_is_captain(game_id, user):
         return False
 
 
-def update_rankings(winner_ids: List[int], loser_ids: List[int], tie: bool):
-    winning_team_ranks = {}
-    for rank in mongo.db["Ranks"].find({"userId": {"$in": [user_id for user_id in winner_ids]}}):
-        winning_team_ranks[rank["userId"]] = Rating(rank["rank"], rank["confidence"])
-
-    losing_team_ranks = {}
-    for rank in mongo.db["Ranks"].find({"userId": {"$in": [user_id for user_id in loser_ids]}}):
-        losing_team_ranks[rank["userId"]] = Rating(rank["rank"], rank["confidence"])
+def get_game_with_ratings(user_id) -> Optional[Tuple[dict, List[dict], Dict[int, Rating]]]:
+    """
+    Reads the game a user is in, everyone in it and their ratings in a single aggregation.
+    :return: GameData, the Ingame documents and ratings by user ID, or None if the user isn't in game
+    """
+    rows = list(mongo.db['Ingame'].aggregate([
+        {"$match": {"userId": user_id}},
+        {"$limit": 1},
+        {"$lookup": {"from": "GameData", "localField": "gameId", "foreignField": "gameId", "as": "game"}},
+        {"$lookup": {"from": "Ingame", "localField": "gameId", "foreignField": "gameId", "as": "player"}},
+        {"$unwind": "$player"},
+        {"$lookup": {"from": "Ranks", "localField": "player.userId", "foreignField": "userId", "as": "rank"}},
+        {"$project": {
+            "_id": 0,
+            "game": {"$arrayElemAt": ["$game", 0]},
+            "player": 1,
+            "rank": {"$arrayElemAt": ["$rank", 0]}
+        }}
+    ]))
+    if not rows:
+        return None
+
+    players = [row['player'] for row in rows]
+    ratings = {row['player']['userId']: Rating(row['rank']['rank'], row['rank']['confidence'])
+               for row in rows if 'rank' in row}
+    return rows[0]['game'], players, ratings
+
+
+def update_rankings(game_id, winner_ids: List[int], loser_ids: List[int], tie: bool,
+                    ratings: Dict[int, Rating] = None, session=None) -> Dict[int, Rating]:
+    """
+    Rates a game and saves everyone's new rating, recording each change in RatingHistory so ratings can be audited and
+    replayed game by game.
+    :param ratings: Everyone's current ratings by user ID, if the caller already has them
+    :return: The new ratings by user ID
+    """
+    if ratings is None:
+        ratings = {rank["userId"]: Rating(rank["rank"], rank["confidence"])
+                   for rank in mongo.db["Ranks"].find({"userId": {"$in": winner_ids + loser_ids}}, session=session)}
+    winning_team_ranks = {user_id: ratings[user_id] for user_id in winner_ids}
+    losing_team_ranks = {user_id: ratings[user_id] for user_id in loser_ids}
 
     game_outcome = [0, 0] if tie else [0, 1]
 
     new_winning_team_ranks, new_losing_team_ranks = rate([winning_team_ranks, losing_team_ranks], ranks=game_outcome)
     updated_ranks = {**new_winning_team_ranks, **new_losing_team_ranks}
-    for user_id in updated_ranks.keys():
-        true_skill = updated_ranks[user_id]
-        data = {
+    mongo.db['Ranks'].bulk_write([
+        UpdateOne({"userId": user_id}, {
             "$set": {
                 "rank": true_skill.mu,
                 "confidence": true_skill.sigma
             }
+        })
+        for user_id, true_skill in updated_ranks.items()
+    ], ordered=False, session=session)
+
+    rated_at = datetime.datetime.now()
+    mongo.db['RatingHistory'].insert_many([
+        {
+            "userId": user_id,
+            "gameId": game_id,
+            "previousRank": ratings[user_id].mu,
+            "previousConfidence": ratings[user_id].sigma,
+            "rank": true_skill.mu,
+            "confidence": true_skill.sigma,
+            "rated": rated_at
         }
-        mongo.db['Ranks'].update_one({"userId": user_id}, data)
+        for user_id, true_skill in updated_ranks.items()
+    ], ordered=False, session=session)
 
+    return updated_ranks
 
-def finish_game(game_id):
-    mongo.db['Ingame'].delete_many({"gameId": game_id})
-    mongo.db['GameData'].update_one({"gameId": game_id}, {
-        "$set": {
-            "status": GameStatus.FINISHED.value,
-            "ended": datetime.datetime.now()
-        }
-    })
+
+def finish_game(game_id, ended: datetime.datetime = None, players: List[dict] = None, session=None):
+    """
+    :param players: The final roster, with each player's outcome
+    """
+    data = {
+        "status": GameStatus.FINISHED.value,
+        "ended": ended or datetime.datetime.now()
+    }
+    if players is not None:
+        data["players"] = players
+    mongo.db['Ingame'].delete_many({"gameId": game_id}, session=session)
+    mongo.db['GameData'].update_one({"gameId": game_id}, {"$set": data}, session=session)
 
 
 def swap_players(user: User, target: Member, game_id):
@@ -321,10 +402,24 @@ def swap_players(user: User, target: Member, game_id):
         }
     })
 
+    # The roster entries keep their players, who trade places instead
+    mongo.db['GameData'].bulk_write([
+        UpdateOne({"gameId": game_id, "players.userId": player.id},
+                  {"$set": {"players.$.team": other['team'], "players.$.isCaptain": other['isCaptain']}})
+        for player, other in ((user, target_data), (target, user_data))
+    ], ordered=False)
+
 
 def sub_player(user, member):
-    mongo.db['Ingame'].update_one({"userId": member.id}, {"$set": {"userId": user.id, "username": user.name}})
-    mongo.db['Queue'].delete_many({"userId": user.id})
+    ingame = mongo.db['Ingame'].find_one_and_update({"userId": member.id},
+                                                    {"$set": {"userId": user.id, "username": user.name}})
+    queue_manager.remove(user.id)
+
+    sub = get_players_with_ratings([user.id]).get(user.id, Player(user.id))
+    mongo.db['GameData'].update_one({"gameId": ingame['gameId'], "players.userId": member.id}, {
+        "$set": {f"players.$.{field}": value for field, value in roster_entry(sub, None, False).items()
+                 if field not in ("team", "isCaptain")}
+    })
 
 
 def check_if_comp_game_by_user(user):
@@ -340,17 +435,29 @@ def get_game(game_id):
 
 
 def query(start_date: datetime.date, end_date: datetime.date):
+    return mongo.db['GameData'].find(finished_between(start_date, end_date))
+
+
+def query_empty(start_date: datetime.date, end_date: datetime.date) -> List[EmptyGame]:
+    return [EmptyGame(game['gameId'], game['started'], Queue(game['queue']), game.get("ended"),
+                      GameStatus(game["status"]), game.get("maps")) for game in query(start_date, end_date)]
+
+
+def finished_between(start_date: datetime.date, end_date: datetime.date) -> dict:
+    """
+    :return: GameData filter for games that finished on or between the given days, which are open-ended if None
+    """
     start_normalized = datetime.datetime(datetime.MINYEAR, 1, 1) if start_date is None else datetime.datetime(
         start_date.year, start_date.month, start_date.day)
     end_normalized = datetime.datetime(datetime.MAXYEAR, 1, 1) if end_date is None else datetime.datetime(
         end_date.year, end_date.month, end_date.day, 23, 59, 59)
-    return mongo.db['GameData'].find({
+    return {
         "ended": {
             "$gte": start_normalized,
             "$lte": end_normalized
         },
         "status": GameStatus.FINISHED.value
-    })
+    }
 
 
 def update_maps(game_id, maps):
@@ -403,25 +510,37 @@ def delete(game_id):
     mongo.db['Ingame'].delete_many({"gameId": game_id})
 
 
-def override_timestamps(game_id, timestamp: datetime):
-    mongo.db['GameData'].update_one({"gameId": game_id}, {"$set": {"started": timestamp, "ended": timestamp}})
+def override_timestamps(game_id, timestamp: datetime, session=None) -> Optional[dict]:
+    """
+    :return: The game as it was before, or None if there's no such game
+    """
+    return mongo.db['GameData'].find_one_and_update({"gameId": game_id},
+                                                    {"$set": {"started": timestamp, "ended": timestamp}},
+                                                    session=session)
 
 
 def raw_member_inqueue(member):
-    if mongo.db['Queue'].find_one({"username": member}):
+    if queue_manager.find_by_username(member):
         return True
     else:
         return False
 
 
 def remove_raw_member_from_queue(member):
-    mongo.db['Queue'].delete_one({"username": member})
+    queue_manager.remove_by_username(member)
 
 
 def get_recent_games(num_games) -> List[EmptyGame]:
-    data = mongo.db['GameData'].find().sort("ended", pymongo.DESCENDING).limit(num_games)
-    return [EmptyGame(game['gameId'], game['started'], Queue(game['queue']), game.get('ended'),
-                      GameStatus(game['status']), game.get('maps')) for game in data]
+    return [to_empty_game(game) for game in get_recent_game_data(num_games)]
+
+
+def get_recent_game_data(num_games) -> List[dict]:
+    return list(mongo.db['GameData'].find().sort("ended", pymongo.DESCENDING).limit(num_games))
+
+
+def to_empty_game(game_data: dict) -> EmptyGame:
+    return EmptyGame(game_data['gameId'], game_data['started'], Queue(game_data['queue']), game_data.get('ended'),
+                     GameStatus(game_data['status']), game_data.get('maps'))
 
 def update_game_suggested_server(game_id, server):
     mongo.db['GameData'].update_one({"gameId":game_id}, {"$set": {"server":server}})
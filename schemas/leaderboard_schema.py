@@ -0,0 +1,148 @@
+import datetime
+from collections import Counter
+from typing import Dict, List, Iterable
+
+from pymongo import UpdateOne
+
+from includes import mongo
+from models.profile import Outcome
+from schemas.member_schema import OUTCOME_COUNTERS
+
+# LeaderboardRollups holds one document per calendar month ("YYYY-MM") plus one for all time, each with the number of
+# finished games, how often each map was played and every player's games/wins/losses/ties in that period:
+#
+#   {"_id": "2021-09", "totalGames": 2, "maps": {"Elite": 2},
+#    "players": {"123": {"username": "...", "games": 2, "wins": 1, "losses": 1, "ties": 0}}}
+#
+# They're kept up to date as games finish and get flipped, so leaderboards never have to scan the game history.
+ALL_TIME = "all"
+
+
+def month_period(timestamp: datetime.date) -> str:
+    return f"{timestamp.year:04d}-{timestamp.month:02d}"
+
+
+def periods_for_game(ended: datetime.datetime) -> List[str]:
+    return [month_period(ended), ALL_TIME]
+
+
+def record_game(periods: Iterable[str], maps: List[str], user_ids_to_outcome: Dict[int, Outcome],
+                usernames: Dict[int, str], count: int = 1, session=None):
+    """
+    Adds a finished game to the given periods' rollups.
+    :param count: -1 to take the game back out instead
+    """
+    increments = Counter({"totalGames": count})
+    for game_map in maps:
+        increments[f"maps.{game_map}"] += count
+    for user_id, outcome in user_ids_to_outcome.items():
+        increments[f"players.{user_id}.games"] += count
+        increments[f"players.{user_id}.{OUTCOME_COUNTERS[outcome]}"] += count
+
+    update = {"$inc": dict(increments)}
+    if count > 0:
+        update["$set"] = {f"players.{user_id}.username": usernames[user_id] for user_id in user_ids_to_outcome}
+    mongo.db['LeaderboardRollups'].bulk_write([UpdateOne({"_id": period}, update, upsert=True) for period in periods],
+                                              ordered=False, session=session)
+
+
+def record_flip(periods: Iterable[str], winner_ids: List[int], loser_ids: List[int], session=None):
+    """
+    Turns the winners of a game into losers and vice versa in the given periods' rollups.
+    """
+    increments = {
+        **{f"players.{user_id}.wins": -1 for user_id in winner_ids},
+        **{f"players.{user_id}.losses": 1 for user_id in winner_ids},
+        **{f"players.{user_id}.wins": 1 for user_id in loser_ids},
+        **{f"players.{user_id}.losses": -1 for user_id in loser_ids}
+    }
+    mongo.db['LeaderboardRollups'].bulk_write([UpdateOne({"_id": period}, {"$inc": increments}) for period in periods],
+                                              ordered=False, session=session)
+
+
+def get_rollups(periods: List[str]) -> List[dict]:
+    return list(mongo.db['LeaderboardRollups'].find({"_id": {"$in": periods}}))
+
+
+def has_all_time_rollup() -> bool:
+    return mongo.db['LeaderboardRollups'].count_documents({"_id": ALL_TIME}, limit=1) > 0
+
+
+def replace_rollups(rollups: List[dict]):
+    """
+    Swaps in a new set of rollups in one step: they're written to a scratch collection that's then renamed over
+    LeaderboardRollups, so readers see either the old rollups or the new ones, never a partly rebuilt set.
+    """
+    if not rollups:
+        mongo.db['LeaderboardRollups'].drop()
+        return
+    scratch = mongo.db['LeaderboardRollupsRebuild']
+    scratch.drop()
+    scratch.insert_many(rollups)
+    scratch.rename('LeaderboardRollups', dropTarget=True)
+
+
+def aggregate_leaderboard(games_filter: dict, num_top_results: int, min_games_for_winrate: int) -> dict:
+    """
+    Computes a leaderboard over the GameData matching games_filter in a single aggregation.
+    :return: totalGames, uniquePlayers, and the top maps (_id, count) and players (_id, username, games, wins, winrate)
+    sorted best first: popularMaps (top 3), mostGames, mostWins, highestWinrate (among players with at least
+    min_games_for_winrate games) and highestWinrateAnyGames
+    """
+    player_stats = [
+        {"$unwind": "$results"},
+        {"$group": {
+            "_id": "$results.userId",
+            "games": {"$sum": 1},
+            **{counter: {"$sum": {"$cond": [{"$eq": ["$results.outcome", outcome.value]}, 1, 0]}}
+               for outcome, counter in OUTCOME_COUNTERS.items()}
+        }},
+        {"$addFields": {
+            "winrate": {
+                "$cond": [
+                    {"$eq": [{"$add": ["$wins", "$losses"]}, 0]},
+                    None,
+                    {"$divide": ["$wins", {"$add": ["$wins", "$losses"]}]}
+                ]
+            }
+        }}
+    ]
+    top_players = [
+        {"$limit": num_top_results},
+        {"$lookup": {"from": "Profiles", "localField": "_id", "foreignField": "userId", "as": "profile"}},
+        {"$project": {
+            "username": {"$arrayElemAt": ["$profile.username", 0]},
+            "games": 1,
+            "wins": 1,
+            "winrate": 1
+        }}
+    ]
+
+    results = mongo.db['GameData'].aggregate([
+        {"$match": games_filter},
+        {"$lookup": {"from": "PlayerData", "localField": "gameId", "foreignField": "gameId", "as": "results"}},
+        {"$facet": {
+            "totalGames": [{"$count": "count"}],
+            "popularMaps": [
+                {"$unwind": "$maps"},
+                {"$group": {"_id": "$maps", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+                {"$limit": 3}
+            ],
+            "uniquePlayers": player_stats + [{"$count": "count"}],
+            "mostGames": player_stats + [{"$sort": {"games": -1}}] + top_players,
+            "mostWins": player_stats + [{"$sort": {"wins": -1}}] + top_players,
+            "highestWinrate": player_stats + [
+                {"$match": {"winrate": {"$ne": None}, "games": {"$gte": min_games_for_winrate}}},
+                {"$sort": {"winrate": -1}}
+            ] + top_players,
+            "highestWinrateAnyGames": player_stats + [
+                {"$match": {"winrate": {"$ne": None}}},
+                {"$sort": {"winrate": -1}}
+            ] + top_players
+        }}
+    ])
+    result = next(results)
+    result["totalGames"] = result["totalGames"][0]["count"] if result["totalGames"] else 0
+    result["uniquePlayers"] = result["uniquePlayers"][0]["count"] if result["uniquePlayers"] else 0
+    return result
@@ -1,13 +1,22 @@
 from datetime import datetime
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Iterable
 
 from discord import User
-from pymongo import UpdateOne
+from pymongo import UpdateOne, UpdateMany
 from trueskill import Rating
 
 from includes import mongo
 from models.profile import Outcome, PlayerGameResult
 
+# Profiles fields counting each player's results. Profiles created before the counters existed only have them once
+# statsTracked is set (by the /recountstats backfill); until then their stats are counted from PlayerData.
+OUTCOME_COUNTERS = {
+    Outcome.WIN: "wins",
+    Outcome.LOSS: "losses",
+    Outcome.TIE: "ties"
+}
+STATS_PROJECTION = {"userId": 1, "statsTracked": 1, **{counter: 1 for counter in OUTCOME_COUNTERS.values()}}
+
 
 def check_profile(user: User):
     rating = Rating()
@@ -22,7 +31,11 @@ def check_profile(user: User):
             "lastPlayed": "Never",
             "hideRank": True,
             "region": "Not Set",
-            "delayTarget": datetime.min
+            "delayTarget": datetime.min,
+            "wins": 0,
+            "losses": 0,
+            "ties": 0,
+            "statsTracked": True
         }
         mongo.db['Profiles'].insert_one(data)
         data = {
@@ -55,6 +68,17 @@ def get_profile_by_id(user_id):
     return mongo.db['Profiles'].find_one({"userId": user_id})
 
 
+def get_profiles_by_ids(user_ids: Iterable[int], fields: List[str] = None) -> Dict[int, dict]:
+    """
+    Fetches several profiles in one query.
+    :param fields: Only return these fields (plus userId) instead of the whole profile
+    :return: Profiles by user ID; users without a profile are left out
+    """
+    projection = None if fields is None else {"_id": 0, "userId": 1, **{field: 1 for field in fields}}
+    profiles = mongo.db['Profiles'].find({"userId": {"$in": list(set(user_ids))}}, projection)
+    return {profile['userId']: profile for profile in profiles}
+
+
 def query_user_ids_who_have_played_in_games(game_ids) -> List[int]:
     return mongo.db['PlayerData'].distinct("userId", {"gameId": {"$in": game_ids}})
 
@@ -152,51 +176,97 @@ def update_profile_bio(user, bio):
     mongo.db['Profiles'].update_one({"userId": user.id}, {"$set": {"bio": bio}})
 
 
-def finish_game_for_users(game_id, user_ids_to_outcome: Dict[int, Outcome]):
-    mongo.db['Profiles'].update_many(
-        {"userId": {"$in": (list(user_ids_to_outcome.keys()))}},
-        {
-            "$inc": {"gamesPlayed": 1},
-            "$set": {"lastPlayed": datetime.now()}
-        })
+def finish_game_for_users(game_id, user_ids_to_outcome: Dict[int, Outcome], finished_at: datetime = None,
+                          delay_target: datetime = None, session=None):
+    """
+    :param delay_target: If given, when the players can next add to a queue
+    """
+    profile_updates = {"lastPlayed": finished_at or datetime.now()}
+    if delay_target is not None:
+        profile_updates["delayTarget"] = delay_target
+    mongo.db['Profiles'].bulk_write([
+        UpdateMany(
+            {"userId": {"$in": [user_id for user_id, user_outcome in user_ids_to_outcome.items()
+                                if user_outcome == outcome]}},
+            {
+                "$inc": {"gamesPlayed": 1, counter: 1},
+                "$set": profile_updates
+            })
+        for outcome, counter in OUTCOME_COUNTERS.items() if outcome in user_ids_to_outcome.values()
+    ], ordered=False, session=session)
     mongo.db["PlayerData"].insert_many(
-        {
+        [{
             "userId": user_id,
             "gameId": game_id,
             "outcome": outcome.value
-        } for user_id, outcome in user_ids_to_outcome.items())
+        } for user_id, outcome in user_ids_to_outcome.items()], session=session)
 
 
-def set_delay_targets(delay_targets: Dict[int, datetime]):
-    mongo.db['Profiles'].bulk_write(
-        [UpdateOne({"userId": user_id}, {"$set": {"delayTarget": target}}) for user_id, target in delay_targets.items()]
-    )
-
-
-def update_outcome_for_users(game_id, user_ids, outcome: Outcome):
-    mongo.db["PlayerData"].update_many(
-        {
-            "userId": {"$in": user_ids},
-            "gameId": game_id,
-        },
-        {
-            "$set": {
-                "outcome": outcome.value
-            }
-        })
+def flip_outcomes_for_users(game_id, winner_ids: List[int], loser_ids: List[int], session=None):
+    """
+    Turns the winners of a game into losers and vice versa, in both PlayerData and the profile counters.
+    """
+    mongo.db["PlayerData"].bulk_write([
+        UpdateMany({"userId": {"$in": winner_ids}, "gameId": game_id}, {"$set": {"outcome": Outcome.LOSS.value}}),
+        UpdateMany({"userId": {"$in": loser_ids}, "gameId": game_id}, {"$set": {"outcome": Outcome.WIN.value}})
+    ], ordered=False, session=session)
+    mongo.db["Profiles"].bulk_write([
+        UpdateMany({"userId": {"$in": winner_ids}}, {"$inc": {"wins": -1, "losses": 1}}),
+        UpdateMany({"userId": {"$in": loser_ids}}, {"$inc": {"wins": 1, "losses": -1}})
+    ], ordered=False, session=session)
 
 
-def get_player_stats(user_id) -> Tuple[int, int, int]:
+def get_player_stats(user_id, profile=None) -> Tuple[int, int, int]:
     """
-    :param user_id:
+    :param profile: The user's profile, if the caller already has it
     :return: Tuple of wins, losses, and ties
     """
+    if profile is None:
+        profile = mongo.db["Profiles"].find_one({"userId": user_id}, STATS_PROJECTION)
+    if profile is not None and profile.get("statsTracked"):
+        return profile["wins"], profile["losses"], profile["ties"]
+
     wins = mongo.db["PlayerData"].count_documents({"userId": user_id, "outcome": Outcome.WIN.value})
     losses = mongo.db["PlayerData"].count_documents({"userId": user_id, "outcome": Outcome.LOSS.value})
     ties = mongo.db["PlayerData"].count_documents({"userId": user_id, "outcome": Outcome.TIE.value})
     return wins, losses, ties
 
 
+def count_all_player_stats(session=None) -> Dict[int, Tuple[int, int, int]]:
+    """
+    Counts everyone's results from PlayerData in one aggregation.
+    :return: Tuple of wins, losses, and ties by user ID, for users who have played at least one game
+    """
+    results = mongo.db["PlayerData"].aggregate([
+        {"$group": {
+            "_id": "$userId",
+            **{counter: {"$sum": {"$cond": [{"$eq": ["$outcome", outcome.value]}, 1, 0]}}
+               for outcome, counter in OUTCOME_COUNTERS.items()}
+        }}
+    ], session=session)
+    return {result["_id"]: (result["wins"], result["losses"], result["ties"]) for result in results}
+
+
+def get_all_tracked_player_stats(session=None) -> Dict[int, Tuple[int, int, int]]:
+    """
+    :return: Tuple of wins, losses, and ties by user ID from the profile counters, or None for profiles that aren't
+    tracking them yet
+    """
+    profiles = mongo.db["Profiles"].find({}, STATS_PROJECTION, session=session)
+    return {profile["userId"]: (profile["wins"], profile["losses"], profile["ties"])
+            if profile.get("statsTracked") else None for profile in profiles}
+
+
+def set_player_stats(stats: Dict[int, Tuple[int, int, int]], session=None):
+    if not stats:
+        return
+    mongo.db["Profiles"].bulk_write([
+        UpdateOne({"userId": user_id},
+                  {"$set": {"wins": wins, "losses": losses, "ties": ties, "statsTracked": True}})
+        for user_id, (wins, losses, ties) in stats.items()
+    ], ordered=False, session=session)
+
+
 def query_player_game_results(game_ids: List[str]) -> List[PlayerGameResult]:
     results_for_game = mongo.db["PlayerData"].find({"gameId": {"$in": game_ids}})
     return [PlayerGameResult(result["userId"], result["gameId"], Outcome(result["outcome"])) for result
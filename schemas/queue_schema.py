@@ -1,54 +1,37 @@
-import datetime
-from typing import Dict
-
-from includes import mongo
-from models.queue_models import Queue
-
-
-def add_to_queue(user, queue: Queue):
-    queues = [q.name for q in Queue] if queue == "all" else [queue.value]
-    for q in queues:
-        data = {
-            "userId": user.id,
-            "username": user.name,
-            "queue": q,
-            "added": datetime.datetime.now()
-        }
-        mongo.db['Queue'].insert_one(data)
-
-
-def refresh_add(user, queue: Queue):
-    queues = [q.name for q in Queue] if queue == "all" else [queue.value]
-    for q in queues:
-        data = {"$set": {"added": datetime.datetime.now()}}
-        mongo.db['Queue'].update_one({"userId": user.id, "queue": q}, data)
+from typing import List
 
+from pymongo import ASCENDING, DeleteMany, UpdateOne
 
-def remove_from_queue(user, queue):
-    if queue == "all":
-        mongo.db['Queue'].delete_many({"userId": user.id})
-    else:
-        mongo.db['Queue'].delete_one({"userId": user.id, "queue": queue})
+from includes import mongo
 
 
-def get_queue_count(queue: Queue):
-    return mongo.db['Queue'].count_documents({"queue": queue.value})
+# The queues themselves live in includes/queue_manager.py; this collection is its copy for recovering from a restart.
+def put_entry(entry: dict) -> UpdateOne:
+    """
+    :return: A write that inserts or updates a Queue document, to be passed to write_entries
+    """
+    return UpdateOne({"userId": entry['userId'], "queue": entry['queue']},
+                     {"$set": {"username": entry['username'], "added": entry['added'], "position": entry['position']}},
+                     upsert=True)
 
 
-def get_queue_players(queue):
-    return mongo.db['Queue'].find({"queue": queue})
+def delete_entries(user_ids: List[int], queues: List[str]) -> DeleteMany:
+    """
+    :return: A write that deletes the users' Queue documents in the given queues, to be passed to write_entries
+    """
+    return DeleteMany({"userId": {"$in": user_ids}, "queue": {"$in": queues}})
 
 
-def check_if_in_queue(user, queue: Queue):
-    if mongo.db['Queue'].find_one({"userId": user.id, "queue": queue.value}):
-        return True
-    else:
-        return False
+def write_entries(writes: list):
+    mongo.db['Queue'].bulk_write(writes, ordered=True)
 
 
-def get_all_queue_counts() -> Dict[str, int]:
-    queues = ["quickplay", "newbloods", "test"]
-    return {queue: mongo.db['Queue'].count_documents({"queue": queue}) for queue in queues}
+def get_all_queue_players():
+    """
+    :return: Every Queue document, in the order they joined. Players put back after a failed game start keep their
+    original position, so they stay at the front.
+    """
+    return mongo.db['Queue'].find({}).sort("position", ASCENDING)
 
 
 def queue_is_ingame(queue):
@@ -69,6 +52,10 @@ def queue_is_ingame(queue):
         return False
 
 
+def get_ingame_queues(queues: List[str]) -> List[str]:
+    return mongo.db['GameData'].distinct("queue", {"queue": {"$in": queues}, "status": {"$in": [1, 2]}})
+
+
 def comp_queue_is_ingame(queue):
     if mongo.db['GameData'].count_documents({"queue": queue, "status": 2}) > 0:
         return True
@@ -78,15 +65,3 @@ def comp_queue_is_ingame(queue):
 
 def get_ingame_queue_game_data(queue):
     return mongo.db['GameData'].find({"queue": queue, "status": 2})
-
-
-def get_all_queue_players():
-    return mongo.db['Queue'].find({})
-
-
-def auto_remove_from_queue(user_id):
-    mongo.db['Queue'].delete_one({"userId": user_id})
-
-
-def remove_from_other_queues(user, queue: Queue):
-    mongo.db['Queue'].delete_many({"userId": user.id, "queue": {"$ne": queue.value}})
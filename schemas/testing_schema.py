@@ -1,43 +1,41 @@
-import datetime
-
+from pymongo import UpdateOne
 from trueskill import Rating
 
 from includes import mongo
+from includes.queue_manager import manager as queue_manager
 
 
 def add_test_players(queue, amount):
+    """
+    Queues up amount test players, creating their profiles and ranks the first time. Safe to call again: players who
+    already exist keep their profile and rank.
+    """
     rating = Rating()
-    for x in range(amount):
-        data = {
-            "userId": x + 1,
-            "username": f"Player{x + 1}",
-            "gamesPlayed": 0,
-            "position": "Offence",
-            "lastPlayed": "Never",
-            "region": "Not Set"
-        }
-        mongo.db['Profiles'].insert_one(data)
-        data = {
-            "userId": x + 1,
-            "username": f"Player{x + 1}",
-            "rank": rating.mu,
-            "confidence": rating.sigma
-        }
-        mongo.db['Ranks'].insert_one(data)
-        data = {
-            "userId": x + 1,
-            "username": f"Player{x + 1}",
-            "queue": queue,
-            "added": datetime.datetime.now()
-        }
-        mongo.db['Queue'].insert_one(data)
+    user_ids = range(1, amount + 1)
+    mongo.db['Profiles'].bulk_write([UpdateOne({"userId": user_id}, {"$setOnInsert": {
+        "username": f"Player{user_id}",
+        "gamesPlayed": 0,
+        "position": "Offence",
+        "lastPlayed": "Never",
+        "region": "Not Set"
+    }}, upsert=True) for user_id in user_ids], ordered=False)
+    mongo.db['Ranks'].bulk_write([UpdateOne({"userId": user_id}, {"$setOnInsert": {
+        "username": f"Player{user_id}",
+        "rank": rating.mu,
+        "confidence": rating.sigma
+    }}, upsert=True) for user_id in user_ids], ordered=False)
+    for user_id in user_ids:
+        queue_manager.add(user_id, f"Player{user_id}", queue)
 
 
 def reset_everything():
     mongo.db['Queue'].delete_many({})
+    queue_manager.clear()
     mongo.db['Players'].delete_many({})
     mongo.db['Profiles'].delete_many({})
     mongo.db['Ranks'].delete_many({})
+    mongo.db['RatingHistory'].delete_many({})
+    mongo.db['LeaderboardRollups'].delete_many({})
     mongo.db['Banned'].delete_many({})
     mongo.db['GameData'].delete_many({})
     mongo.db['Ingame'].delete_many({})
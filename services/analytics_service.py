@@ -1,14 +1,96 @@
 import calendar
 import datetime
-from typing import List, Tuple
+import threading
+import time
+from collections import Counter
+from typing import List, Tuple, Dict, Optional, Callable
 
+import config
 from models.game import EmptyGame
 from models.leaderboards import Leaderboard, PlayerStatsInLeaderboard
 from models.profile import PlayerGameResult, Outcome
-from schemas import member_schema
-from services import game_service
+from schemas import member_schema, leaderboard_schema, ingame_schema
 
 NUM_TOP_RESULTS = 10
+# How long leaderboards for periods that haven't ended yet are cached. Finishes and flips invalidate them right away;
+# this just bounds how stale they can get from writes that don't go through game_service (e.g. admin data fixes).
+CURRENT_PERIOD_TTL = datetime.timedelta(minutes=5)
+# Players need this many games to make the highest winrate list, unless too few do to fill it
+MIN_GAMES_FOR_WINRATE = 5
+
+
+class LeaderboardCache:
+    """
+    Leaderboards keyed by (backend, year, month), where month is None for a whole year and both are None for all time.
+    Periods that have ended only change when one of their games is flipped, so they're kept until invalidated; periods
+    still in progress also expire after current_period_ttl.
+
+    Each period has a generation that invalidate() bumps. Callers take it with generation() before computing a
+    leaderboard and hand it to put(), which drops the result if the period was invalidated in the meantime, so a
+    computation that read the old results can't be cached after the invalidation meant for it.
+    """
+
+    def __init__(self, current_period_ttl: datetime.timedelta = CURRENT_PERIOD_TTL):
+        self.current_period_ttl = current_period_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[Tuple[str, Optional[int], Optional[int]], Tuple[Leaderboard, Optional[float]]] = {}
+        self._generations: Counter = Counter()
+        self._clears = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, Optional[int], Optional[int]]) -> Optional[Leaderboard]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def generation(self, key: Tuple[str, Optional[int], Optional[int]]) -> Tuple[int, int]:
+        with self._lock:
+            return self._clears, self._generations[key[1:]]
+
+    def put(self, key: Tuple[str, Optional[int], Optional[int]], leaderboard: Leaderboard,
+            generation: Tuple[int, int] = None):
+        """
+        :param generation: The period's generation() from before the leaderboard was computed
+        :return: False if the period has been invalidated since, in which case nothing is cached
+        """
+        expires = None if self._has_ended(leaderboard) else time.monotonic() + self.current_period_ttl.total_seconds()
+        with self._lock:
+            if generation is not None and generation != (self._clears, self._generations[key[1:]]):
+                return False
+            self._entries[key] = (leaderboard, expires)
+            return True
+
+    def invalidate(self, game_ended: datetime.datetime):
+        """
+        Drops every cached leaderboard that a game finishing at game_ended counts towards.
+        """
+        periods = {(None, None), (game_ended.year, None), (game_ended.year, game_ended.month)}
+        with self._lock:
+            for period in periods:
+                self._generations[period] += 1
+            for key in [key for key in self._entries if key[1:] in periods]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._clears += 1
+            self._entries.clear()
+
+    @staticmethod
+    def _has_ended(leaderboard: Leaderboard) -> bool:
+        return leaderboard.end_date is not None and leaderboard.end_date < datetime.date.today()
+
+
+leaderboard_cache = LeaderboardCache()
 
 
 def get_leaderboard(year: int = None, month: int = None) -> Leaderboard:
@@ -29,29 +111,151 @@ def get_leaderboard(year: int = None, month: int = None) -> Leaderboard:
             start_date = datetime.date(year, month, 1)
             end_date = datetime.date(year, month, calendar.monthrange(year, month)[1])
 
-    games: List[EmptyGame] = game_service.query_empty(start_date, end_date)
+    backend = config.variables["leaderboard_backend"]
+    key = (backend, year, month)
+    leaderboard = leaderboard_cache.get(key)
+    if leaderboard is None:
+        generation = leaderboard_cache.generation(key)
+        leaderboard = LEADERBOARD_BACKENDS[backend](start_date, end_date)
+        leaderboard_cache.put(key, leaderboard, generation)
+    return leaderboard
+
+
+def get_leaderboard_from_rollups(start_date: Optional[datetime.date], end_date: Optional[datetime.date]) -> Leaderboard:
+    """
+    Reads the pre-aggregated monthly or all-time rollups; cost doesn't grow with history. Ranges have to be whole months.
+    """
+    if start_date is None:
+        periods = [leaderboard_schema.ALL_TIME]
+    else:
+        periods = [leaderboard_schema.month_period(datetime.date(start_date.year, month, 1))
+                   for month in range(start_date.month, end_date.month + 1)]
+
+    total_games, map_frequencies, player_stats = merge_rollups(leaderboard_schema.get_rollups(periods))
+    return Leaderboard(start_date, end_date, total_games, find_popular_maps(map_frequencies),
+                       find_players_with_most_games(player_stats), find_players_with_most_wins(player_stats),
+                       find_players_with_highest_winrates(player_stats), len(player_stats))
+
+
+def get_leaderboard_from_aggregation(start_date: Optional[datetime.date],
+                                     end_date: Optional[datetime.date]) -> Leaderboard:
+    """
+    Computes the leaderboard from the game history in one aggregation, so only the top results leave Mongo.
+    """
+    result = leaderboard_schema.aggregate_leaderboard(ingame_schema.finished_between(start_date, end_date),
+                                                      NUM_TOP_RESULTS, MIN_GAMES_FOR_WINRATE)
+    highest_winrate = result["highestWinrate"] if len(result["highestWinrate"]) >= NUM_TOP_RESULTS \
+        else result["highestWinrateAnyGames"]
+    return Leaderboard(start_date, end_date, result["totalGames"],
+                       [(m["_id"], m["count"]) for m in result["popularMaps"]],
+                       [(player["username"], player["games"]) for player in result["mostGames"]],
+                       [(player["username"], player["wins"]) for player in result["mostWins"]],
+                       [(player["username"], player["winrate"]) for player in highest_winrate],
+                       result["uniquePlayers"])
+
+
+def get_leaderboard_from_history(start_date: Optional[datetime.date], end_date: Optional[datetime.date]) -> Leaderboard:
+    """
+    Loads every game in range and its results and does the math in Python. The reference the other backends are tested
+    against.
+    """
+    games: List[EmptyGame] = ingame_schema.query_empty(start_date, end_date)
     player_stats = calculate_player_stats(member_schema.query_player_game_results([game.game_id for game in games]))
     return Leaderboard(start_date, end_date, len(games), calculate_popular_maps(games),
                        find_players_with_most_games(player_stats), find_players_with_most_wins(player_stats),
                        find_players_with_highest_winrates(player_stats), len(player_stats))
 
 
+LEADERBOARD_BACKENDS: Dict[str, Callable[[Optional[datetime.date], Optional[datetime.date]], Leaderboard]] = {
+    "rollup": get_leaderboard_from_rollups,
+    "aggregation": get_leaderboard_from_aggregation,
+    "history": get_leaderboard_from_history
+}
+
+
+def merge_rollups(rollups: List[dict]) -> Tuple[int, Dict[str, int], List[PlayerStatsInLeaderboard]]:
+    """
+    Adds up leaderboard rollups, e.g. the months of a year.
+    :return: Tuple of total games, map frequencies and stats for every player with at least one game
+    """
+    total_games = 0
+    map_frequencies = Counter()
+    players = {}
+    for rollup in rollups:
+        total_games += rollup.get("totalGames", 0)
+        map_frequencies.update(rollup.get("maps", {}))
+        for user_id, stats in rollup.get("players", {}).items():
+            totals = players.setdefault(user_id, {"username": stats["username"], "games": 0, "wins": 0, "losses": 0,
+                                                  "ties": 0})
+            for counter in ("games", "wins", "losses", "ties"):
+                totals[counter] += stats.get(counter, 0)
+
+    # Games that were moved or taken back out leave zeroed entries behind
+    player_stats = [PlayerStatsInLeaderboard(int(user_id), totals["username"], totals["games"], totals["wins"],
+                                             totals["losses"], totals["ties"])
+                    for user_id, totals in players.items() if totals["games"] > 0]
+    return total_games, {m: count for m, count in map_frequencies.items() if count > 0}, player_stats
+
+
+def rebuild_leaderboard_rollups():
+    """
+    Recomputes every leaderboard rollup from the game history. Only needed once, for games finished before rollups were
+    kept up to date incrementally.
+    """
+    games = {game.game_id: game for game in ingame_schema.query_empty(None, None)}
+    results = member_schema.query_player_game_results(list(games.keys()))
+    usernames = {profile["userId"]: profile["username"]
+                 for profile in member_schema.query_profiles(list({result.user_id for result in results}))}
+
+    rollups = {}
+    for game in games.values():
+        for period in leaderboard_schema.periods_for_game(game.ended_at):
+            rollup = rollups.setdefault(period, {"_id": period, "totalGames": 0, "maps": {}, "players": {}})
+            rollup["totalGames"] += 1
+            for m in game.maps:
+                rollup["maps"][m] = rollup["maps"].get(m, 0) + 1
+    for result in results:
+        for period in leaderboard_schema.periods_for_game(games[result.game_id].ended_at):
+            players = rollups[period]["players"]
+            stats = players.setdefault(str(result.user_id), {"username": usernames.get(result.user_id, ""), "games": 0,
+                                                             "wins": 0, "losses": 0, "ties": 0})
+            stats["games"] += 1
+            stats[member_schema.OUTCOME_COUNTERS[result.outcome]] += 1
+
+    leaderboard_schema.replace_rollups(list(rollups.values()))
+    leaderboard_cache.clear()
+
+
+def ensure_leaderboard_rollups():
+    """
+    Builds the leaderboard rollups from history if they've never been built.
+    """
+    if not leaderboard_schema.has_all_time_rollup():
+        rebuild_leaderboard_rollups()
+
+
 def calculate_popular_maps(games: List[EmptyGame]) -> List[Tuple[str, int]]:
     map_frequencies = {}
     for game in games:
         for m in game.maps:
             map_frequencies[m] = map_frequencies.get(m, 0) + 1
 
+    return find_popular_maps(map_frequencies)
+
+
+def find_popular_maps(map_frequencies: Dict[str, int]) -> List[Tuple[str, int]]:
     sorted_desc = sorted(map_frequencies.items(), key=lambda pair: pair[1], reverse=True)
     return [(pair[0], pair[1]) for pair in sorted_desc[:3]]
 
 
 def calculate_player_stats(player_game_results: List[PlayerGameResult]) -> List[PlayerStatsInLeaderboard]:
+    profiles = member_schema.get_profiles_by_ids([result.user_id for result in player_game_results],
+                                                 fields=["username"])
     by_user_id = {}
     for result in player_game_results:
         if result.user_id not in by_user_id:
-            profile_raw = member_schema.get_profile_by_id(result.user_id)
-            by_user_id[result.user_id] = PlayerStatsInLeaderboard(result.user_id, profile_raw["username"], 0, 0, 0, 0)
+            username = profiles[result.user_id]["username"]
+            by_user_id[result.user_id] = PlayerStatsInLeaderboard(result.user_id, username, 0, 0, 0, 0)
 
         existing = by_user_id[result.user_id]
         if result.outcome == Outcome.WIN:
@@ -67,7 +271,8 @@ def calculate_player_stats(player_game_results: List[PlayerGameResult]) -> List[
 def find_players_with_highest_winrates(player_stats: List[PlayerStatsInLeaderboard]) -> List[Tuple[str, float]]:
     players_with_winrates = [player for player in player_stats if player.winrate is not None]
     sorted_by_winrate_desc = sorted(players_with_winrates, key=lambda player: player.winrate, reverse=True)
-    sorted_players_with_min_num_games = [player for player in sorted_by_winrate_desc if player.total_games >= 5]
+    sorted_players_with_min_num_games = [player for player in sorted_by_winrate_desc
+                                         if player.total_games >= MIN_GAMES_FOR_WINRATE]
     if len(sorted_players_with_min_num_games) >= NUM_TOP_RESULTS:
         return [(player.username, player.winrate) for player in sorted_players_with_min_num_games][:NUM_TOP_RESULTS]
 
@@ -0,0 +1,120 @@
+import itertools
+import math
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import trueskill
+
+from schemas.ingame_schema import Player
+
+
+class RankedSplits:
+    """
+    Every way to split a lobby into two even teams, ordered from best to worst match quality. The Nth reshuffle is just
+    get(N).
+    """
+
+    def __init__(self, players: List[Player], team1_masks: np.ndarray, qualities: np.ndarray):
+        self.players = players
+        self.team1_masks = team1_masks
+        self.qualities = qualities
+
+    def __len__(self):
+        return len(self.qualities)
+
+    def get(self, index: int) -> Tuple[List[Player], List[Player]]:
+        mask = self.team1_masks[index]
+        team1 = [player for player, on_team1 in zip(self.players, mask) if on_team1]
+        team2 = [player for player, on_team1 in zip(self.players, mask) if not on_team1]
+        return team1, team2
+
+    def quality(self, index: int) -> float:
+        return float(self.qualities[index])
+
+
+class RankedSplitsCache:
+    """
+    Ranked splits for in-progress games, keyed by game ID. Games that are never explicitly invalidated (e.g. cancelled
+    by an admin) age out once more than max_games are cached.
+    """
+
+    def __init__(self, max_games: int = 64):
+        self.max_games = max_games
+        self._splits: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, game_id) -> Optional[RankedSplits]:
+        with self._lock:
+            ranked_splits = self._splits.get(game_id)
+            if ranked_splits is not None:
+                self._splits.move_to_end(game_id)
+            return ranked_splits
+
+    def put(self, game_id, ranked_splits: RankedSplits):
+        with self._lock:
+            self._splits[game_id] = ranked_splits
+            self._splits.move_to_end(game_id)
+            while len(self._splits) > self.max_games:
+                self._splits.popitem(last=False)
+
+    def invalidate(self, game_id):
+        with self._lock:
+            self._splits.pop(game_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._splits.clear()
+
+
+@lru_cache(maxsize=None)
+def get_team1_masks(num_players: int) -> np.ndarray:
+    """
+    :return: (num splits, num_players) boolean matrix of who's on team 1 for every even split. Player 0 is always on
+    team 1 so that mirrored splits (same teams, swapped sides) only show up once.
+    """
+    team_size = num_players // 2
+    combinations = list(itertools.combinations(range(1, num_players), team_size - 1))
+    others_on_team1 = np.array(combinations, dtype=np.intp).reshape(len(combinations), team_size - 1)
+
+    masks = np.zeros((len(others_on_team1), num_players), dtype=bool)
+    masks[:, 0] = True
+    masks[np.arange(len(others_on_team1))[:, None], others_on_team1] = True
+    masks.setflags(write=False)
+    return masks
+
+
+def calculate_qualities(mus: np.ndarray, sigmas: np.ndarray, team1_masks: np.ndarray,
+                        beta: float = None) -> np.ndarray:
+    """
+    trueskill.quality() for every split at once. With two teams and every player weighted 1, TrueSkill's match quality
+    reduces to
+
+        sqrt(n * beta^2 / (n * beta^2 + sum(sigma^2))) * exp(-(team1 mu - team2 mu)^2 / (2 * (n * beta^2 + sum(sigma^2))))
+
+    where the sums run over all n players, so only the mu difference changes from split to split.
+    """
+    beta = trueskill.global_env().beta if beta is None else beta
+    num_players = len(mus)
+    team1_mus = team1_masks @ mus
+    mu_diffs = 2 * team1_mus - mus.sum()
+    variance = num_players * beta ** 2 + np.sum(sigmas ** 2)
+    return math.sqrt(num_players * beta ** 2 / variance) * np.exp(-mu_diffs ** 2 / (2 * variance))
+
+
+def rank_splits(players: Sequence[Player]) -> RankedSplits:
+    if len(players) < 2 or len(players) % 2 != 0:
+        raise ValueError("Need an even number of players to split into two teams")
+
+    # Canonical order, so the same lobby ranks its splits the same way no matter what order the players came in
+    players = sorted(players, key=lambda player: player.user_id)
+    mus = np.array([player.rating.mu for player in players], dtype=float)
+    sigmas = np.array([player.rating.sigma for player in players], dtype=float)
+    masks = get_team1_masks(len(players))
+    qualities = calculate_qualities(mus, sigmas, masks)
+
+    # Stable so that equally balanced splits keep a deterministic order between reshuffles
+    order = np.argsort(-qualities, kind="stable")
+    return RankedSplits(players, masks[order], qualities[order])
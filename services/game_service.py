@@ -4,15 +4,23 @@ from datetime import date, datetime, timedelta
 from typing import List, Tuple, Dict
 
 from discord import User, Member
+from trueskill import Rating
 
+from includes import mongo
 from includes.general import convert_keys_to_str
+from includes.queue_manager import manager as queue_manager
+from includes.timings import StageTimings
 from models.draft_state import DraftState
 from models.game import Game, GameStatus, EmptyGame, FinishedGame
 from models.ingame_models import SwapResult, SwapError, ScrambleError
 from models.profile import Outcome
 from models.queue_models import Queue, UserInGame
-from schemas import ingame_schema, member_schema, queue_schema, draft_schema
-from services import map_service
+from schemas import ingame_schema, member_schema, draft_schema, leaderboard_schema
+from services import analytics_service, map_service, balance_service
+
+# Ratings don't change until a game finishes, so a game's ranked splits are computed once at start and every shuffle
+# after that is an index into them
+ranked_splits_cache = balance_service.RankedSplitsCache()
 
 
 def swap(user: User, target: Member) -> SwapResult:
@@ -32,10 +40,27 @@ def swap(user: User, target: Member) -> SwapResult:
 
 
 def get_games(queue: Queue = None) -> List[Game]:
-    return [game_data_to_game_model(game_data) for game_data in ingame_schema.get_games(queue)]
+    return games_data_to_game_models(list(ingame_schema.get_games(queue)))
 
 
 def game_data_to_game_model(game_data) -> Game:
+    return games_data_to_game_models([game_data])[0]
+
+
+def games_data_to_game_models(games_data: List[dict]) -> List[Game]:
+    """
+    Games carry a snapshot of their roster; the players of any started before that was added are read from Ingame, in
+    one query for all of them.
+    """
+    legacy_players = ingame_schema.get_ingame_players_by_game(
+        [game_data['gameId'] for game_data in games_data if game_data.get('players') is None])
+    return [to_game_model(game_data, legacy_players.get(game_data['gameId'])) for game_data in games_data]
+
+
+def to_game_model(game_data, ingame_players: List[dict] = None) -> Game:
+    """
+    :param ingame_players: The game's Ingame documents, used if it has no roster snapshot
+    """
     game_id = game_data['gameId']
     game_queue = Queue(game_data['queue'])
 
@@ -44,13 +69,17 @@ def game_data_to_game_model(game_data) -> Game:
     team1 = []
     team2 = []
 
-    for player in ingame_schema.get_all_ingame_players(game_id):
+    players = game_data.get('players')
+    if players is None:
+        players = ingame_players
+    for player in players:
+        games_played = player.get("gamesPlayed")
         if player["team"] is None:
-            unassigned.append(UserInGame(player["userId"], player["username"], False))
+            unassigned.append(UserInGame(player["userId"], player["username"], False, games_played=games_played))
         elif player["team"] == 1:
-            team1.append(UserInGame(player["userId"], player["username"], player["isCaptain"], 1))
+            team1.append(UserInGame(player["userId"], player["username"], player["isCaptain"], 1, games_played))
         elif player["team"] == 2:
-            team2.append(UserInGame(player["userId"], player["username"], player["isCaptain"], 2))
+            team2.append(UserInGame(player["userId"], player["username"], player["isCaptain"], 2, games_played))
 
     return Game(game_id, game_data.get('started'), game_queue,
                 sort_players_by_name(team1), sort_players_by_name(team2), game_data.get("maps"),
@@ -62,18 +91,40 @@ def sort_players_by_name(players: List[UserInGame]):
     return sorted(players, key=lambda player: player.name)
 
 
-def start_game(user: User, queue: Queue) -> Game:
-    queue_schema.remove_from_other_queues(user, queue)
+def start_game(user: User, queue: Queue, lobby: List[dict]) -> Game:
+    """
+    Puts a lobby on the best-balanced teams. The lobby has already been taken out of the in-memory queue, so that isn't
+    part of the transaction: the game's writes are (where the deployment supports one), and if anything fails the
+    players are put back at the front of the queue with queue_manager.restore, so a failure can't leave half a lobby.
+    :param lobby: The queue entries claimed by the add that filled the queue; see AddResult.lobby
+    """
     game_id = generate_game_id()
     maps = map_service.get_maps(num_maps=1)
-    ingame_schema.create_game(queue, game_id, maps)
-    ingame_schema.generate_teams(queue, game_id)
-
-    game_data = ingame_schema.get_game(game_id)
 
+    try:
+        with mongo.transaction() as session:
+            players = ingame_schema.get_players_with_ratings([entry['userId'] for entry in lobby], session=session)
+            ranked_splits = balance_service.rank_splits([players[entry['userId']] for entry in lobby])
+            team1, team2 = ranked_splits.get(0)
+            players = ingame_schema.build_roster(team1, team2)
+            game_data = ingame_schema.create_game(queue, game_id, maps, players, reshuffles=1, session=session)
+            ingame_schema.set_teams_for_game(game_id, players, session=session)
+    except Exception:
+        queue_manager.restore(lobby)
+        raise
+
+    ranked_splits_cache.put(game_id, ranked_splits)
     return game_data_to_game_model(game_data)
 
 
+def get_ranked_splits(game_id, refresh=False) -> balance_service.RankedSplits:
+    ranked_splits = None if refresh else ranked_splits_cache.get(game_id)
+    if ranked_splits is None:
+        ranked_splits = balance_service.rank_splits(ingame_schema.get_ingame_players_with_ratings(game_id))
+        ranked_splits_cache.put(game_id, ranked_splits)
+    return ranked_splits
+
+
 def generate_game_id() -> str:
     return str(uuid.uuid4())
 
@@ -90,8 +141,23 @@ def get_game_and_draft_state(game_id) -> Tuple[Game, DraftState]:
 
 
 def shuffle_teams(game_id) -> Game:
-    ingame_schema.shuffle_teams(game_id)
-    return game_data_to_game_model(ingame_schema.get_game(game_id))
+    """
+    Puts the players on the Nth best-balanced split, where N is how many times the game has been shuffled so far.
+    """
+    game_data = ingame_schema.increment_reshuffles(game_id)
+    reshuffles = game_data['reshuffles']
+    players = game_data.get('players') or ingame_schema.backfill_roster(game_id)
+    ranked_splits = get_ranked_splits(game_id)
+    team1, team2 = ranked_splits.get(reshuffles % len(ranked_splits))
+
+    players = ingame_schema.reassign_teams(game_id, team1, team2, players)
+    if players is None:
+        # The roster changed since the splits were ranked, e.g. someone subbed in
+        ranked_splits = get_ranked_splits(game_id, refresh=True)
+        team1, team2 = ranked_splits.get(reshuffles % len(ranked_splits))
+        players = ingame_schema.reassign_teams(game_id, team1, team2, ingame_schema.get_game(game_id)['players'])
+
+    return game_data_to_game_model({**game_data, "reshuffles": reshuffles + 1, "players": players})
 
 
 def get(game_id) -> Game:
@@ -107,9 +173,7 @@ def get_empty(game_id) -> EmptyGame:
 
 
 def query_empty(start_date: date, end_date: date) -> List[EmptyGame]:
-    game_data = ingame_schema.query(start_date, end_date)
-    return [EmptyGame(game['gameId'], game['started'], Queue(game['queue']), game.get("ended"),
-                      GameStatus(game["status"]), game.get("maps")) for game in game_data]
+    return ingame_schema.query_empty(start_date, end_date)
 
 
 def scramble_map(user, map_number) -> Tuple[List[str], ScrambleError]:
@@ -132,66 +196,85 @@ def scramble_map(user, map_number) -> Tuple[List[str], ScrambleError]:
     return maps, None
 
 
-def calculate_delay_targets(user_ids):
+def calculate_delay_target(last_played: datetime) -> datetime:
     low = 15
     # high = 30
     # For every 100 games played, you get a modifier of -x seconds (rewards folks who play more)
     # modifier_base = -3
     # games_played_divisor = 100
-
-    profiles = member_schema.query_profiles(user_ids)
-    delay_targets = {}
-
-    for profile in profiles:
-        if profile['lastPlayed'] == 'Never':
-            continue
-        last_played = profile['lastPlayed']
-        # games_played = profile['gamesPlayed']
-        # modifier = int(modifier_base * games_played / games_played_divisor)
-        # delay = random.randint(low, high) - modifier
-        # delay = low if delay < low else delay
-        delay = low
-        delay_targets[profile['userId']] = last_played + timedelta(0, delay)
-
-    return delay_targets
+    # games_played = profile['gamesPlayed']
+    # modifier = int(modifier_base * games_played / games_played_divisor)
+    # delay = random.randint(low, high) - modifier
+    # delay = low if delay < low else delay
+    delay = low
+    return last_played + timedelta(0, delay)
 
 
 def finish(user, outcome: Outcome) -> EmptyGame:
     """
+    Reads the game, its players and their ratings in one query, then writes the results in one transaction.
     :return: None if user is not in game
     """
-    if not ingame_schema.is_ingame(user):
-        return None
-
-    game_id = ingame_schema.get_game_id_from_user(user)
+    timings = StageTimings("finish")
 
-    game = get(game_id)
+    with timings.stage("read"):
+        game_with_ratings = ingame_schema.get_game_with_ratings(user.id)
+    if game_with_ratings is None:
+        return None
+    game_data, players, ratings = game_with_ratings
+    game_id = game_data['gameId']
 
-    players_on_team, players_on_other_team = (game.team1_players, game.team2_players) if game.is_on_team1(user.id) \
-        else (game.team2_players, game.team1_players)
-
-    if outcome == Outcome.WIN:
-        winner_ids = [player.user_id for player in players_on_team]
-        loser_ids = [player.user_id for player in players_on_other_team]
-        user_ids_to_outcome = {**{user_id: Outcome.WIN for user_id in winner_ids},
-                               **{user_id: Outcome.LOSS for user_id in loser_ids}}
-    elif outcome == Outcome.LOSS:
-        winner_ids = [player.user_id for player in players_on_other_team]
-        loser_ids = [player.user_id for player in players_on_team]
-        user_ids_to_outcome = {**{user_id: Outcome.WIN for user_id in winner_ids},
-                               **{user_id: Outcome.LOSS for user_id in loser_ids}}
-    else:
-        winner_ids = [player.user_id for player in players_on_team]
-        loser_ids = [player.user_id for player in players_on_other_team]
-        user_ids_to_outcome = {user_id: Outcome.TIE for user_id in winner_ids + loser_ids}
-
-    ingame_schema.finish_game(game_id)
-    member_schema.finish_game_for_users(game_id, user_ids_to_outcome)
-    delay_targets = calculate_delay_targets(list(user_ids_to_outcome.keys()))
-    member_schema.set_delay_targets(delay_targets)
-    ingame_schema.update_rankings(winner_ids, loser_ids, outcome == Outcome.TIE)
-
-    return get_empty(game_id)
+    with timings.stage("outcomes"):
+        team = next(player['team'] for player in players if player['userId'] == user.id)
+        players_on_team = [player['userId'] for player in players if player['team'] == team]
+        players_on_other_team = [player['userId'] for player in players
+                                 if player['team'] is not None and player['team'] != team]
+
+        if outcome == Outcome.WIN:
+            winner_ids = players_on_team
+            loser_ids = players_on_other_team
+            user_ids_to_outcome = {**{user_id: Outcome.WIN for user_id in winner_ids},
+                                   **{user_id: Outcome.LOSS for user_id in loser_ids}}
+        elif outcome == Outcome.LOSS:
+            winner_ids = players_on_other_team
+            loser_ids = players_on_team
+            user_ids_to_outcome = {**{user_id: Outcome.WIN for user_id in winner_ids},
+                                   **{user_id: Outcome.LOSS for user_id in loser_ids}}
+        else:
+            winner_ids = players_on_team
+            loser_ids = players_on_other_team
+            user_ids_to_outcome = {user_id: Outcome.TIE for user_id in winner_ids + loser_ids}
+        finished_at = datetime.now()
+        # Mongo stores milliseconds; truncate so the returned game matches what gets read back later
+        finished_at = finished_at.replace(microsecond=finished_at.microsecond // 1000 * 1000)
+
+        roster = game_data.get('players') or [
+            ingame_schema.roster_entry(
+                ingame_schema.Player(player['userId'], player['username'], ratings.get(player['userId'], Rating())),
+                player['team'], player['isCaptain'])
+            for player in players
+        ]
+        roster = [{**player, "outcome": user_ids_to_outcome[player['userId']].value
+                   if player['userId'] in user_ids_to_outcome else None} for player in roster]
+
+    with timings.stage("write"):
+        with mongo.transaction() as session:
+            ingame_schema.finish_game(game_id, finished_at, roster, session=session)
+            member_schema.finish_game_for_users(game_id, user_ids_to_outcome, finished_at,
+                                                calculate_delay_target(finished_at), session=session)
+            ingame_schema.update_rankings(game_id, winner_ids, loser_ids, outcome == Outcome.TIE, ratings,
+                                          session=session)
+            leaderboard_schema.record_game(leaderboard_schema.periods_for_game(finished_at), game_data.get("maps", []),
+                                           user_ids_to_outcome,
+                                           {player['userId']: player['username'] for player in players},
+                                           session=session)
+
+    ranked_splits_cache.invalidate(game_id)
+    analytics_service.leaderboard_cache.invalidate(finished_at)
+    timings.log()
+
+    return EmptyGame(game_id, game_data['started'], Queue(game_data['queue']), finished_at, GameStatus.FINISHED,
+                     game_data.get("maps"))
 
 
 def pick_player(drafting_user: User, user_ids: List[int]) -> Tuple[Game, DraftState]:
@@ -229,6 +312,7 @@ def cancel_game(user: User) -> bool:
     game_id = ingame_schema.get_game_id_from_user(user)
     ingame_schema.delete(game_id)
     draft_schema.remove_draft_state(game_id)
+    ranked_splits_cache.invalidate(game_id)
     return True
 
 
@@ -243,21 +327,37 @@ def is_captain(user):
 
 
 def get_history() -> List[FinishedGame]:
-    games = ingame_schema.get_recent_games(5)
-    player_game_results = member_schema.query_player_game_results([game.game_id for game in games])
+    """
+    Reads each game's results from its roster snapshot. Games finished before GameData carried one are read from
+    PlayerData, which is one more query for all of them together.
+    """
+    games = ingame_schema.get_recent_game_data(5)
+    legacy_game_ids = [game['gameId'] for game in games if 'players' not in game]
+    legacy_results: Dict[str, List[Tuple[str, Outcome]]] = {game_id: [] for game_id in legacy_game_ids}
+    if legacy_game_ids:
+        player_game_results = member_schema.query_player_game_results(legacy_game_ids)
+        profiles = member_schema.get_profiles_by_ids([result.user_id for result in player_game_results],
+                                                     fields=["username"])
+        for result in player_game_results:
+            legacy_results[result.game_id].append((profiles[result.user_id]['username'], result.outcome))
+
     finished_games = []
+    for game_data in games:
+        game = ingame_schema.to_empty_game(game_data)
+        if 'players' in game_data:
+            results = [(player['username'], Outcome(player['outcome'])) for player in game_data['players']
+                       if player.get('outcome') is not None]
+        else:
+            results = legacy_results[game.game_id]
 
-    for game in games:
-        results = [result for result in player_game_results if result.game_id == game.game_id]
         tie = False
         winners = []
         losers = []
-        for result in results:
-            username = member_schema.get_profile_by_id(result.user_id)['username']
-            if result.outcome == Outcome.TIE:
+        for username, outcome in results:
+            if outcome == Outcome.TIE:
                 tie = True
                 winners.append(username)
-            elif result.outcome == Outcome.WIN:
+            elif outcome == Outcome.WIN:
                 winners.append(username)
             else:
                 losers.append(username)
@@ -275,13 +375,42 @@ def flip_results(game_id: str) -> bool:
     winner_ids = [result.user_id for result in single_game_results if result.outcome == Outcome.WIN]
     loser_ids = [result.user_id for result in single_game_results if result.outcome == Outcome.LOSS]
 
-    member_schema.update_outcome_for_users(game_id, winner_ids, Outcome.LOSS)
-    member_schema.update_outcome_for_users(game_id, loser_ids, Outcome.WIN)
-    ingame_schema.update_rankings(loser_ids, winner_ids, False)
+    game_data = ingame_schema.get_game(game_id)
+    ended = game_data['ended']
+    with mongo.transaction() as session:
+        member_schema.flip_outcomes_for_users(game_id, winner_ids, loser_ids, session=session)
+        if 'players' in game_data:
+            flipped = {Outcome.WIN.value: Outcome.LOSS.value, Outcome.LOSS.value: Outcome.WIN.value}
+            ingame_schema.update_roster(game_id, [{**player, "outcome": flipped.get(player.get('outcome'))}
+                                                  for player in game_data['players']], session=session)
+        ingame_schema.update_rankings(game_id, loser_ids, winner_ids, False, session=session)
+        leaderboard_schema.record_flip(leaderboard_schema.periods_for_game(ended), winner_ids, loser_ids,
+                                       session=session)
+    analytics_service.leaderboard_cache.invalidate(ended)
 
     return True
 
 
+def override_timestamps(game_id: str, timestamp: datetime):
+    """
+    Moves a game to a different time, e.g. to backdate test games. A finished game's results move to the leaderboard
+    rollup for its new month, and the cached leaderboards for both months are dropped.
+    """
+    results = {result.user_id: result.outcome for result in member_schema.query_player_game_results([game_id])}
+    usernames = {profile['userId']: profile['username'] for profile in member_schema.query_profiles(list(results))}
+    with mongo.transaction() as session:
+        game_data = ingame_schema.override_timestamps(game_id, timestamp, session=session)
+        if game_data is None or game_data.get('ended') is None:
+            return
+        maps = game_data.get("maps", [])
+        leaderboard_schema.record_game([leaderboard_schema.month_period(game_data['ended'])], maps, results, usernames,
+                                       count=-1, session=session)
+        leaderboard_schema.record_game([leaderboard_schema.month_period(timestamp)], maps, results, usernames,
+                                       session=session)
+    analytics_service.leaderboard_cache.invalidate(game_data['ended'])
+    analytics_service.leaderboard_cache.invalidate(timestamp)
+
+
 def pick_suggested_server(players):
     regions = []
 
@@ -1,3 +1,6 @@
+from typing import Tuple
+
+from includes import mongo
 from models.profile import Profile
 from schemas import member_schema
 
@@ -5,7 +8,24 @@ from schemas import member_schema
 def get(user_id) -> Profile:
     profile_data = member_schema.get_profile_by_id(user_id)
     rank = member_schema.get_player_rank_by_id(user_id)
-    wins, losses, ties = member_schema.get_player_stats(user_id)
+    wins, losses, ties = member_schema.get_player_stats(user_id, profile_data)
     return Profile(user_id, profile_data["username"], profile_data["position"], profile_data["lastPlayed"],
                    profile_data["hideRank"], profile_data["gamesPlayed"], profile_data.get("bio"), rank["rank"],
                    rank["confidence"], wins, losses, ties)
+
+
+def recount_player_stats(fix: bool) -> Tuple[int, int]:
+    """
+    Checks every profile's W/L/T counters against PlayerData, optionally overwriting the ones that are wrong or not
+    tracked yet.
+    :return: Tuple of profiles checked and profiles whose counters were wrong or missing
+    """
+    with mongo.transaction() as session:
+        counted = member_schema.count_all_player_stats(session=session)
+        tracked = member_schema.get_all_tracked_player_stats(session=session)
+        mismatched = {user_id: counted.get(user_id, (0, 0, 0)) for user_id, stats in tracked.items()
+                      if stats != counted.get(user_id, (0, 0, 0))}
+        if fix:
+            member_schema.set_player_stats(mismatched, session=session)
+
+    return len(tracked), len(mismatched)
@@ -1,15 +1,17 @@
 from datetime import datetime
+from typing import Dict, List
 
 from discord import User
 
-from models.queue_models import Queue, AddResult, AddStatus
+from includes.queue_expiry import scheduler
+from includes.queue_manager import manager
+from models.queue_models import Queue, AddResult, AddStatus, QueueStatus, QueuedPlayer
 from schemas import member_schema, queue_schema, ingame_schema
 
 
 def add(user: User, queue: Queue, skip_delay=True) -> AddResult:
     member_schema.check_profile(user)
-    if queue_schema.check_if_in_queue(user, queue):
-        queue_schema.refresh_add(user, queue)
+    if manager.refresh(user.id, queue.value):
         return AddResult.status(AddStatus.ALREADY_IN_QUEUE, queue)
     if ingame_schema.is_ingame(user):
         return AddResult.status(AddStatus.ALREADY_IN_GAME, queue)
@@ -21,10 +23,47 @@ def add(user: User, queue: Queue, skip_delay=True) -> AddResult:
         if delay_target > now:
             return AddResult.status(AddStatus.DELAYED, queue, delay_seconds=(delay_target - now).seconds)
 
-    queue_schema.add_to_queue(user, queue)
-    queue_count = queue_schema.get_queue_count(queue)
+    if queue in AUTO_START_QUEUES:
+        queue_count, lobby = manager.add_and_claim(user.id, user.name, queue.value)
+        return AddResult.added(queue_count, queue, lobby)
 
-    return AddResult.added(queue_count, queue)
+    return AddResult.added(manager.add(user.id, user.name, queue.value), queue)
+
+
+def remove(user: User, queue: str):
+    """
+    :param queue: A queue's value, or "all"
+    """
+    manager.remove(user.id, None if queue == "all" else [queue])
+
+
+def get_queue_count(queue: Queue) -> int:
+    return manager.count(queue.value)
+
+
+def get_all_queue_counts() -> Dict[str, int]:
+    return manager.counts([queue.value for queue in STATUS_QUEUES])
+
+
+STATUS_QUEUES = [Queue.QUICKPLAY, Queue.NEWBLOODS, Queue.TEST]
+# Queues whose tenth add starts a game; the rest (e.g. competitive drafts) are started separately
+AUTO_START_QUEUES = [Queue.QUICKPLAY, Queue.NEWBLOODS, Queue.TEST]
+
+
+def get_status_snapshot(queues: List[Queue] = STATUS_QUEUES) -> List[QueueStatus]:
+    """
+    Everything /status shows for the given queues, in two round trips no matter how many players are queued.
+    """
+    queue_values = [queue.value for queue in queues]
+    entries_by_queue = {queue: manager.players(queue) for queue in queue_values}
+    profiles = member_schema.get_profiles_by_ids(
+        {entry['userId'] for entries in entries_by_queue.values() for entry in entries}, fields=["gamesPlayed"])
+    ingame_queues = set(queue_schema.get_ingame_queues(queue_values))
+
+    return [QueueStatus(queue, [QueuedPlayer(entry['userId'], entry['username'],
+                                             profiles.get(entry['userId'], {}).get('gamesPlayed') or 0, entry['added'])
+                                for entry in entries_by_queue[queue.value]], queue.value in ingame_queues)
+            for queue in queues]
 
 
 def valid_for_re_add(user: User):
@@ -36,3 +75,25 @@ def valid_for_re_add(user: User):
     user_ids = member_schema.query_user_ids_who_have_played_in_games([game.game_id])
 
     return user.id in user_ids
+
+
+def load_queues():
+    """
+    Rebuilds the in-memory queues, and their expiry schedule, from what was last persisted to Mongo. Anything not yet
+    persisted is flushed first so it isn't lost.
+    """
+    manager.flush()
+    manager.load(list(queue_schema.get_all_queue_players()))
+
+
+def auto_remove(user_id, queue: str):
+    """
+    Removes a queue entry that the expiry scheduler reported as due.
+    :return: The removed entry, or None if the entry was refreshed or is already gone
+    """
+    removed = manager.auto_remove(user_id, queue, datetime.now() - scheduler.timeout)
+    if removed is None:
+        current = manager.get(user_id, queue)
+        if current is not None:
+            scheduler.schedule(user_id, queue, current['added'])
+    return removed
@@ -1,8 +1,17 @@
 import pytest
 
+from includes import mongo
 from schemas import testing_schema
+from services import analytics_service
+
+
+@pytest.fixture(autouse=True, scope="session")
+def detect_transactions():
+    # Probe the server once up front; the game tests run inside transactions wherever it supports them
+    mongo.supports_transactions()
 
 
 @pytest.fixture(autouse=True)
 def clear_mongo_data():
     testing_schema.reset_everything()
+    analytics_service.leaderboard_cache.clear()
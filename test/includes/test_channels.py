@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from includes.channels import ChannelRegistry
+
+
+def guild(guild_id, *channel_names):
+    return SimpleNamespace(id=guild_id, text_channels=[SimpleNamespace(name=name) for name in channel_names])
+
+
+class TestChannelRegistry:
+    def test_resolves_queue_channel_once(self):
+        registry = ChannelRegistry("queue")
+        guild1 = guild(1, "general", "queue")
+
+        channel = registry.get(guild1)
+        assert channel.name == "queue"
+
+        guild1.text_channels = []
+        assert registry.get(guild1) is channel
+
+    def test_guild_without_queue_channel(self):
+        registry = ChannelRegistry("queue")
+        assert registry.get(guild(1, "general")) is None
+
+    def test_refresh_picks_up_channel_changes(self):
+        registry = ChannelRegistry("queue")
+        guild1 = guild(1, "general")
+        assert registry.get(guild1) is None
+
+        guild1.text_channels.append(SimpleNamespace(name="queue"))
+        registry.refresh_guild(guild1)
+        assert registry.get(guild1).name == "queue"
+
+    def test_rebuild_forgets_old_guilds(self):
+        registry = ChannelRegistry("queue")
+        guild1 = guild(1, "queue")
+        registry.get(guild1)
+
+        guild1.text_channels = []
+        registry.rebuild([guild(2, "queue")])
+        assert registry.get(guild1) is None
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from includes import metrics
+from includes.fanout import fan_out
+
+
+class TestFanOut:
+    def test_sends_concurrently_up_to_limit(self):
+        in_flight, peak = 0, 0
+
+        async def send(i):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+            return i
+
+        start = time.perf_counter()
+        results = asyncio.run(fan_out("test", [send(i) for i in range(10)], limit=5))
+
+        assert results == list(range(10))
+        assert peak == 5
+        assert time.perf_counter() - start < 0.25
+
+    def test_failures_are_isolated(self):
+        error = ValueError("Cannot send messages to this user")
+
+        async def send(i):
+            if i == 1:
+                raise error
+            return i
+
+        results = asyncio.run(fan_out("test_failures", [send(i) for i in range(3)]))
+
+        assert results == [0, error, 2]
+        assert 'chilla_fanout_failures_total{kind="test_failures"} 1' in metrics.fanout_failures.render()
+
+    def test_nothing_to_send(self):
+        assert asyncio.run(fan_out("test", [])) == []
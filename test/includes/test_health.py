@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+from includes import metrics
+from includes.health import HealthChecker
+
+
+class FakeBot:
+    def __init__(self, loop, ready=True, latency=0.05):
+        self.loop = loop
+        self.latency = latency
+        self.ready = ready
+
+    def is_ready(self):
+        return self.ready
+
+    def is_closed(self):
+        return False
+
+
+class FakeTaskLoop:
+    def __init__(self, running=True):
+        self.running = running
+
+    def is_running(self):
+        return self.running
+
+
+@pytest.fixture
+def running_loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def unreachable():
+    raise ServerSelectionTimeoutError("No servers found")
+
+
+class TestHealthChecker:
+    def test_ready_when_everything_is_up(self, running_loop):
+        metrics.task_last_success.set(time.time(), task="test_loop")
+        checker = HealthChecker(FakeBot(running_loop), {"test_loop": FakeTaskLoop()}, mongo_ping=lambda: None)
+        checker.gateway_connected()
+
+        ready, result = checker.readiness()
+        assert ready
+        assert result["gateway"] == {"ok": True, "connected": True, "ready": True, "closed": False, "latencyMs": 50}
+        assert result["eventLoop"]["ok"]
+        assert result["loops"]["test_loop"]["running"]
+        assert result["loops"]["test_loop"]["lastSuccess"] is not None
+
+    def test_not_ready_without_mongo_but_still_alive(self, running_loop):
+        checker = HealthChecker(FakeBot(running_loop), {}, mongo_ping=unreachable)
+
+        ready, result = checker.readiness()
+        assert not ready
+        assert result["mongo"] == {"ok": False, "error": "No servers found"}
+        assert checker.liveness()[0]
+
+    def test_not_ready_before_gateway_connects(self, running_loop):
+        checker = HealthChecker(FakeBot(running_loop, ready=False, latency=float("nan")), {}, mongo_ping=lambda: None)
+
+        ready, result = checker.readiness()
+        assert not ready
+        assert result["gateway"]["latencyMs"] is None
+
+    def test_not_ready_while_gateway_is_disconnected(self, running_loop):
+        checker = HealthChecker(FakeBot(running_loop), {}, mongo_ping=lambda: None, cache_seconds=60)
+        checker.gateway_connected()
+        assert checker.readiness()[0]
+
+        # is_ready() stays true across a reconnect
+        checker.gateway_disconnected()
+        ready, result = checker.readiness()
+        assert not ready
+        assert not result["gateway"]["connected"]
+
+        checker.gateway_connected()
+        assert checker.readiness()[0]
+
+    def test_not_ready_when_a_loop_stopped(self, running_loop):
+        checker = HealthChecker(FakeBot(running_loop), {"test_loop": FakeTaskLoop(running=False)},
+                                mongo_ping=lambda: None)
+        checker.gateway_connected()
+
+        assert not checker.readiness()[0]
+
+    def test_not_alive_without_running_event_loop(self):
+        loop = asyncio.new_event_loop()
+        checker = HealthChecker(FakeBot(loop), {}, mongo_ping=lambda: None)
+
+        alive, result = checker.liveness()
+        loop.close()
+        assert not alive
+        assert result["eventLoop"] == {"ok": False, "error": "Event loop isn't running"}
+
+    def test_liveness_does_not_ping_mongo(self, running_loop):
+        pings = []
+        checker = HealthChecker(FakeBot(running_loop), {}, mongo_ping=lambda: pings.append(1))
+
+        alive, result = checker.liveness()
+        assert alive
+        assert set(result) == {"eventLoop", "checkedAt"}
+        assert pings == []
+
+    def test_results_are_cached(self, running_loop):
+        pings = []
+        checker = HealthChecker(FakeBot(running_loop), {}, mongo_ping=lambda: pings.append(1), cache_seconds=60)
+
+        checker.readiness()
+        checker.liveness()
+        checker.readiness()
+        assert len(pings) == 1
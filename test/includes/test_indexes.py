@@ -0,0 +1,126 @@
+from datetime import datetime
+from typing import List
+
+import pytest
+
+import config
+from includes import indexes, mongo
+from includes.user_generators import generate_user, generate_users
+from models.profile import Outcome
+from models.queue_models import Queue
+from schemas import general_schema, ingame_schema, member_schema, queue_schema
+from services import analytics_service, game_service, profile_service, queue_service
+from test.mongo_ops import CapturedQuery, capture_mongo_queries
+from test.services.game_helpers import start_test_draft_game, start_test_game, transform_user
+
+
+def run_schema_queries() -> List[CapturedQuery]:
+    """
+    Drives the queue, game, leaderboard, profile and admin paths the cogs use and captures every query they make, so the
+    index checks follow the schemas instead of a hand-kept list of their filters.
+    """
+    indexes.ensure_indexes()
+    admin = generate_user(900, "Admin")
+    with capture_mongo_queries() as captured:
+        for user in generate_users(5, 20):
+            queue_service.add(user, Queue.QUICKPLAY, skip_delay=True)
+            queue_service.valid_for_re_add(user)
+        queue_service.get_status_snapshot()
+        queue_service.load_queues()
+
+        game = start_test_game(Queue.QUICKPLAY)
+        game_service.shuffle_teams(game.game_id)
+        game_service.get_ranked_splits(game.game_id, refresh=True)
+        game_service.swap(transform_user(game.team1_captain), transform_user(game.team2_others[0]))
+        game_service.get_games(Queue.QUICKPLAY)
+        game_service.get(game.game_id)
+        ingame_schema.get_game_with_ratings(game.team1_captain.user_id)
+        ingame_schema.is_captain(transform_user(game.team1_captain))
+        ingame_schema.get_captains(game.game_id)
+        list(ingame_schema.get_team(game.game_id, 1))
+        queue_schema.get_ingame_queues([queue.value for queue in Queue])
+        game_service.finish(transform_user(game.team1_captain), Outcome.WIN)
+        game_service.flip_results(game.game_id)
+        game_service.override_timestamps(game.game_id, datetime(2021, 9, 1))
+        start_test_draft_game(Queue.COMPETITIVE, num_games_so_far=1)
+        game_service.get_history()
+        list(ingame_schema.get_games_last_24_hours())
+
+        for backend in ("rollup", "aggregation", "history"):
+            config.variables["leaderboard_backend"] = backend
+            analytics_service.leaderboard_cache.clear()
+            analytics_service.get_leaderboard(2021, 9)
+            analytics_service.get_leaderboard()
+        profile_service.get(game.team1_captain.user_id)
+        member_schema.get_player_stats(game.team1_captain.user_id)
+        list(member_schema.get_top_players())
+
+        member_schema.already_admin(admin)
+        member_schema.is_banned(admin)
+        member_schema.get_number_of_warnings(admin)
+        general_schema.check_custom_id_exists("id")
+    return captured
+
+
+def indexed_fields(collection: str) -> set:
+    """
+    :return: The leading field of each of the collection's indexes, which a query has to use for the index to serve it
+    """
+    return {"_id"} | {next(iter(model.document['key'])) for model in indexes.INDEXES.get(collection, [])}
+
+
+def uses_an_index(query: CapturedQuery) -> bool:
+    fields = {field for field in query.query if not field.startswith("$")}
+    if "$or" in query.query and not fields:
+        return all(uses_an_index(CapturedQuery(query.collection, query.method, branch)) for branch in query.query["$or"])
+    if not fields:
+        # Reading the whole collection is a scan whatever the indexes; only an indexed sort helps
+        return query.sort is None or query.sort[0][0] in indexed_fields(query.collection)
+    return bool(fields & indexed_fields(query.collection))
+
+
+def find_stages(plan) -> set:
+    if isinstance(plan, dict):
+        stages = {plan["stage"]} if "stage" in plan else set()
+        return stages.union(*(find_stages(value) for value in plan.values()))
+    if isinstance(plan, list):
+        return set().union(*(find_stages(value) for value in plan))
+    return set()
+
+
+class TestEnsureIndexes:
+    def test_is_idempotent(self):
+        assert indexes.ensure_indexes() == []
+        assert indexes.ensure_indexes() == []
+
+        for collection, models in indexes.INDEXES.items():
+            existing = mongo.db[collection].index_information()
+            for model in models:
+                assert model.document['name'] in existing
+
+
+class TestSchemaQueriesUseIndexes:
+    @pytest.fixture
+    def captured(self, monkeypatch):
+        monkeypatch.setitem(config.variables, "leaderboard_backend", config.variables["leaderboard_backend"])
+        return run_schema_queries()
+
+    def test_every_filter_leads_with_an_indexed_field(self, captured):
+        assert {query.collection for query in captured} >= set(indexes.INDEXES) - {"RatingHistory"}
+        assert [query for query in captured if not uses_an_index(query)] == []
+
+    def test_no_collection_scan(self, captured):
+        if not hasattr(mongo.db['Queue'].find(), "explain"):
+            pytest.skip("explain() needs a real MongoDB server")
+
+        scans = []
+        for query in captured:
+            if not query.query and query.sort is None:
+                continue
+            cursor = mongo.db[query.collection].find(query.query)
+            if query.sort:
+                cursor = cursor.sort(query.sort)
+            if "COLLSCAN" in find_stages(cursor.explain()["queryPlanner"]):
+                scans.append(query)
+
+        assert scans == []
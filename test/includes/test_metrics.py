@@ -0,0 +1,60 @@
+import pytest
+
+from includes.metrics import Counter, Gauge, Histogram, Registry, task_duration, task_last_success, task_run
+
+
+class TestRender:
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("chilla_test_seconds", "Test", ["command"], buckets=(0.1, 1))
+        histogram.observe(0.05, command="/add")
+        histogram.observe(0.1, command="/add")
+        histogram.observe(0.5, command="/add")
+        histogram.observe(3, command="/add")
+
+        assert histogram.render().splitlines() == [
+            "# HELP chilla_test_seconds Test",
+            "# TYPE chilla_test_seconds histogram",
+            'chilla_test_seconds_bucket{command="/add",le="0.1"} 2',
+            'chilla_test_seconds_bucket{command="/add",le="1.0"} 3',
+            'chilla_test_seconds_bucket{command="/add",le="+Inf"} 4',
+            'chilla_test_seconds_sum{command="/add"} 3.65',
+            'chilla_test_seconds_count{command="/add"} 4',
+        ]
+
+    def test_registry_renders_every_metric(self):
+        registry = Registry()
+        gauge = registry.register(Gauge("chilla_test_queue", "Queue", ["queue"]))
+        counter = registry.register(Counter("chilla_test_total", "Total"))
+        gauge.set(3, queue='quick"play')
+        counter.inc()
+        counter.inc(2)
+
+        rendered = registry.render()
+        assert 'chilla_test_queue{queue="quick\\"play"} 3' in rendered
+        assert "chilla_test_total 3" in rendered
+        assert rendered.endswith("\n")
+
+    def test_labels_must_match(self):
+        gauge = Gauge("chilla_test_queue", "Queue", ["queue"])
+        with pytest.raises(ValueError):
+            gauge.set(1, game="quickplay")
+
+    def test_duplicate_names_are_rejected(self):
+        registry = Registry()
+        registry.register(Gauge("chilla_test_queue", "Queue"))
+        with pytest.raises(ValueError):
+            registry.register(Gauge("chilla_test_queue", "Queue"))
+
+
+class TestTaskRun:
+    def test_failed_run_is_timed_but_not_marked_successful(self):
+        with pytest.raises(RuntimeError):
+            with task_run("test_failing_task"):
+                raise RuntimeError()
+
+        assert task_last_success.get(task="test_failing_task") is None
+        assert 'chilla_task_duration_seconds_count{task="test_failing_task"} 1' in task_duration.render()
+
+        with task_run("test_failing_task"):
+            pass
+        assert task_last_success.get(task="test_failing_task") is not None
@@ -0,0 +1,68 @@
+import asyncio
+from types import SimpleNamespace
+
+from includes import custom_ids, mongo
+from includes.mongo_stats import MongoCommandProfiler, attribute, component_name, current_command
+
+
+def succeeded(command_name, ms=1.0, reply=None):
+    return SimpleNamespace(command_name=command_name, duration_micros=int(ms * 1000), reply=reply or {"ok": 1})
+
+
+class TestMongoCommandProfiler:
+    def test_attributes_commands_to_current_command(self):
+        profiler = MongoCommandProfiler(slow_ms=1000)
+        profiler.invoked("/add")
+        with attribute("/add"):
+            profiler.succeeded(succeeded("find", ms=2, reply={"cursor": {"firstBatch": [{}, {}, {}]}}))
+            profiler.succeeded(succeeded("insert", ms=3))
+        profiler.succeeded(succeeded("find"))
+
+        stats = profiler.snapshot()
+        assert stats["/add"]["invocations"] == 1
+        assert stats["/add"]["ops"] == 2
+        assert stats["/add"]["opsPerInvocation"] == 2
+        assert stats["/add"]["docs"] == 3
+        assert stats["/add"]["totalMs"] == 5
+        assert stats["/add"]["maxMs"] == 3
+        assert stats["/add"]["commands"] == {"find": 1, "insert": 1}
+        assert stats["other"]["ops"] == 1
+
+    def test_failures_are_counted(self):
+        profiler = MongoCommandProfiler(slow_ms=1000)
+        with attribute("/finish"):
+            profiler.failed(SimpleNamespace(command_name="update", duration_micros=500))
+
+        assert profiler.snapshot()["/finish"]["failed"] == 1
+
+    def test_logs_slow_commands(self, capsys):
+        profiler = MongoCommandProfiler(slow_ms=50)
+        with attribute("/leaderboard"):
+            profiler.succeeded(succeeded("aggregate", ms=10))
+            profiler.succeeded(succeeded("aggregate", ms=75))
+
+        assert capsys.readouterr().out == "Slow Mongo command: aggregate took 75.0ms for /leaderboard\n"
+
+    def test_counts_reported_collection_calls(self):
+        profiler = MongoCommandProfiler(slow_ms=1000)
+        with attribute("/status"):
+            profiler.called("Queue", "find_one")
+            profiler.called("Queue", "count_documents")
+        profiler.called("Queue", "find_one")
+
+        assert profiler.calls("/status") == {("Queue", "find_one"): 1, ("Queue", "count_documents"): 1}
+        assert profiler.calls("/nothing") == {}
+
+
+class TestAttribution:
+    def test_mongo_run_keeps_attribution_on_executor(self):
+        async def command():
+            with attribute("/status"):
+                return await mongo.run(current_command.get)
+
+        assert asyncio.run(command()) == "/status"
+        assert current_command.get() == "other"
+
+    def test_component_names(self):
+        assert component_name({"data": {"custom_id": custom_ids.shuffle_teams}}) == "component:shuffle_teams"
+        assert component_name({"data": {"custom_id": "a-one-off-setup-id"}}) == "component:other"
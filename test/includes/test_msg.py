@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from includes import channels, mongo, msg
+from models.queue_models import Queue
+from services import game_service
+from test.mongo_ops import count_mongo_ops
+from test.services.game_helpers import start_test_game
+
+
+class TestGetGamesPlayed:
+    def test_read_from_the_roster_snapshot(self):
+        game = start_test_game(Queue.QUICKPLAY)
+
+        with count_mongo_ops() as ops:
+            games_played = msg.get_games_played(game)
+
+        assert games_played == {player.user_id: 0 for player in game.get_all_players()}
+        assert ops == {}
+
+    def test_one_query_for_the_whole_lobby_without_a_snapshot(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        mongo.db['GameData'].update_one({"gameId": game.game_id}, {"$unset": {"players": ""}})
+        game = game_service.get(game.game_id)
+
+        with count_mongo_ops() as ops:
+            games_played = msg.get_games_played(game)
+
+        assert games_played == {player.user_id: 0 for player in game.get_all_players()}
+        assert ops == {("Profiles", "find"): 1}
+
+
+class FakeChannel:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    async def send(self, **kwargs):
+        if self.fail:
+            raise ConnectionError("Interaction expired")
+        self.sent.append(kwargs['content'])
+
+
+class TestSendInCorrectChannel:
+    @pytest.fixture
+    def guilds(self, monkeypatch):
+        guild_channels = {"Home": FakeChannel(), "Other": FakeChannel()}
+        monkeypatch.setattr(channels.registry, "get", lambda guild: guild_channels[guild.name])
+        return guild_channels
+
+    def test_replies_to_the_interaction_and_broadcasts_elsewhere(self, guilds):
+        ctx = FakeChannel()
+        ctx.guild = SimpleNamespace(name="Home")
+        bot = SimpleNamespace(guilds=[SimpleNamespace(name="Home"), SimpleNamespace(name="Other")])
+
+        asyncio.run(msg.send_in_correct_channel(ctx, bot, "hello"))
+
+        assert ctx.sent == ["hello"]
+        assert guilds["Other"].sent == ["hello"]
+        assert guilds["Home"].sent == []
+
+    def test_failed_reply_is_raised_after_the_broadcast(self, guilds):
+        ctx = FakeChannel(fail=True)
+        ctx.guild = SimpleNamespace(name="Home")
+        bot = SimpleNamespace(guilds=[SimpleNamespace(name="Home"), SimpleNamespace(name="Other")])
+
+        with pytest.raises(ConnectionError):
+            asyncio.run(msg.send_in_correct_channel(ctx, bot, "hello"))
+
+        assert guilds["Other"].sent == ["hello"]
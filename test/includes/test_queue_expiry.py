@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from includes.queue_expiry import QueueExpiryScheduler
+
+TIMEOUT = timedelta(minutes=45)
+START = datetime(2021, 9, 1, 12, 0, 0)
+
+
+class TestPopDue:
+    def test_nothing_scheduled(self):
+        scheduler = QueueExpiryScheduler(TIMEOUT)
+        assert scheduler.pop_due(START) == []
+        assert scheduler.next_deadline() is None
+
+    def test_only_returns_due_entries_in_deadline_order(self):
+        scheduler = QueueExpiryScheduler(TIMEOUT)
+        scheduler.schedule(2, "quickplay", START + timedelta(minutes=1))
+        scheduler.schedule(1, "quickplay", START)
+        scheduler.schedule(3, "quickplay", START + timedelta(minutes=10))
+
+        assert scheduler.next_deadline() == START + TIMEOUT
+        assert scheduler.pop_due(START + TIMEOUT + timedelta(minutes=1)) == [(1, "quickplay"), (2, "quickplay")]
+        assert len(scheduler) == 1
+
+    def test_refresh_pushes_deadline_back(self):
+        scheduler = QueueExpiryScheduler(TIMEOUT)
+        scheduler.schedule(1, "quickplay", START)
+        scheduler.schedule(1, "quickplay", START + timedelta(minutes=30))
+
+        assert scheduler.pop_due(START + TIMEOUT) == []
+        assert scheduler.next_deadline() == START + timedelta(minutes=30) + TIMEOUT
+        assert scheduler.pop_due(START + timedelta(minutes=30) + TIMEOUT) == [(1, "quickplay")]
+
+    def test_cancel_single_queue(self):
+        scheduler = QueueExpiryScheduler(TIMEOUT)
+        scheduler.schedule(1, "quickplay", START)
+        scheduler.schedule(1, "newbloods", START)
+
+        scheduler.cancel(1, ["quickplay"])
+
+        assert scheduler.pop_due(START + TIMEOUT) == [(1, "newbloods")]
+
+    def test_cancel_all_queues(self):
+        scheduler = QueueExpiryScheduler(TIMEOUT)
+        scheduler.schedule(1, "quickplay", START)
+        scheduler.schedule(1, "newbloods", START)
+        scheduler.schedule(2, "newbloods", START)
+
+        scheduler.cancel(1)
+
+        assert scheduler.pop_due(START + TIMEOUT) == [(2, "newbloods")]
+
+    def test_rebuild_replaces_schedule(self):
+        scheduler = QueueExpiryScheduler(TIMEOUT)
+        scheduler.schedule(1, "quickplay", START)
+
+        scheduler.rebuild([{"userId": 2, "queue": "test", "added": START}])
+
+        assert scheduler.pop_due(START + TIMEOUT) == [(2, "test")]
+
+
+class TestWaitForDue:
+    def test_wakes_up_when_entry_expires(self):
+        scheduler = QueueExpiryScheduler(timedelta(milliseconds=50))
+
+        async def wait():
+            waiter = asyncio.create_task(scheduler.wait_for_due())
+            await asyncio.sleep(0.01)
+            # Scheduled after the waiter went to sleep with an empty heap
+            scheduler.schedule(1, "quickplay", datetime.now())
+            return await asyncio.wait_for(waiter, 1)
+
+        assert asyncio.run(wait()) == [(1, "quickplay")]
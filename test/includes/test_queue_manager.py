@@ -0,0 +1,198 @@
+import threading
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from includes import mongo
+from includes.queue_expiry import scheduler
+from includes.queue_manager import manager
+from schemas import queue_schema
+from services import queue_service
+from test.mongo_ops import count_mongo_ops
+
+QUICKPLAY = "quickplay"
+NEWBLOODS = "newbloods"
+
+
+def persisted(queue):
+    return [(player['userId'], player['username']) for player in queue_schema.get_all_queue_players()
+            if player['queue'] == queue]
+
+
+class TestQueueManager:
+    def test_add_returns_count(self):
+        assert manager.add(1, "One", QUICKPLAY) == 1
+        assert manager.add(2, "Two", QUICKPLAY) == 2
+        assert manager.add(1, "One", QUICKPLAY) == 2
+        assert manager.count(QUICKPLAY) == 2
+        assert len(scheduler) == 2
+
+    def test_state_changes_issue_no_mongo_commands(self):
+        with count_mongo_ops() as ops:
+            manager.add(1, "One", QUICKPLAY)
+            manager.refresh(1, QUICKPLAY)
+            manager.count(QUICKPLAY)
+            manager.remove(1)
+
+        assert ops == {}
+
+    def test_refresh_keeps_position(self):
+        manager.add(1, "One", QUICKPLAY)
+        manager.add(2, "Two", QUICKPLAY)
+
+        assert manager.refresh(1, QUICKPLAY)
+        assert not manager.refresh(3, QUICKPLAY)
+        assert [entry['userId'] for entry in manager.players(QUICKPLAY)] == [1, 2]
+
+    def test_pop_takes_first_players_out_of_every_queue(self):
+        for user_id in range(12):
+            manager.add(user_id, f"Player {user_id}", QUICKPLAY)
+        manager.add(0, "Player 0", NEWBLOODS)
+
+        lobby = manager.pop(QUICKPLAY)
+
+        assert [entry['userId'] for entry in lobby] == list(range(10))
+        assert [entry['userId'] for entry in manager.players(QUICKPLAY)] == [10, 11]
+        assert manager.count(NEWBLOODS) == 0
+        assert len(scheduler) == 2
+
+    def test_restore_puts_players_back_in_front(self):
+        for user_id in range(12):
+            manager.add(user_id, f"Player {user_id}", QUICKPLAY)
+
+        manager.restore(manager.pop(QUICKPLAY))
+
+        assert [entry['userId'] for entry in manager.players(QUICKPLAY)] == list(range(12))
+        assert len(scheduler) == 12
+
+    def test_remove_by_username(self):
+        manager.add(1, "One", QUICKPLAY)
+
+        assert manager.remove_by_username("Nobody") is None
+        assert manager.remove_by_username("One")['userId'] == 1
+        assert manager.count(QUICKPLAY) == 0
+
+
+class TestPersistence:
+    def test_flush_writes_changes_in_one_bulk_write(self):
+        for user_id in range(3):
+            manager.add(user_id, f"Player {user_id}", QUICKPLAY)
+        manager.refresh(0, QUICKPLAY)
+        manager.remove(1)
+
+        with count_mongo_ops() as ops:
+            assert manager.flush() == 5
+
+        assert ops == {("Queue", "bulk_write"): 1}
+        assert persisted(QUICKPLAY) == [(0, "Player 0"), (2, "Player 2")]
+        assert manager.pending() == 0
+
+    def test_nothing_to_flush(self):
+        with count_mongo_ops() as ops:
+            assert manager.flush() == 0
+
+        assert ops == {}
+
+    def test_failed_flush_is_retried(self, monkeypatch):
+        manager.add(1, "One", QUICKPLAY)
+
+        def unavailable(writes):
+            raise AutoReconnect("Mongo is down")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(queue_schema, "write_entries", unavailable)
+            with pytest.raises(AutoReconnect):
+                manager.flush()
+
+        manager.add(2, "Two", QUICKPLAY)
+        assert manager.pending() == 2
+        manager.flush()
+        assert persisted(QUICKPLAY) == [(1, "One"), (2, "Two")]
+
+    def test_load_rebuilds_queues_in_order(self):
+        for user_id in range(3):
+            manager.add(user_id, f"Player {user_id}", QUICKPLAY)
+        manager.add(0, "Player 0", NEWBLOODS)
+        manager.refresh(0, QUICKPLAY)
+        manager.flush()
+
+        manager.clear()
+        assert manager.count(QUICKPLAY) == 0
+        assert len(scheduler) == 0
+
+        queue_service.load_queues()
+
+        assert [entry['userId'] for entry in manager.players(QUICKPLAY)] == [0, 1, 2]
+        assert manager.count(NEWBLOODS) == 1
+        assert len(scheduler) == 4
+        assert manager.pending() == 0
+        assert mongo.db['Queue'].count_documents({}) == 4
+
+    def test_restored_players_keep_their_place_after_a_reload(self):
+        for user_id in range(12):
+            manager.add(user_id, f"Player {user_id}", QUICKPLAY)
+        manager.flush()
+        manager.restore(manager.pop(QUICKPLAY))
+        manager.flush()
+
+        queue_service.load_queues()
+
+        assert [entry['userId'] for entry in manager.players(QUICKPLAY)] == list(range(12))
+
+    def test_reload_keeps_unflushed_changes(self):
+        manager.add(1, "One", QUICKPLAY)
+        manager.flush()
+        manager.add(2, "Two", QUICKPLAY)
+        manager.remove(1)
+
+        queue_service.load_queues()
+
+        assert [entry['userId'] for entry in manager.players(QUICKPLAY)] == [2]
+
+
+class TestConcurrentAdds:
+    def test_only_the_tenth_add_sees_a_full_queue(self):
+        counts = []
+        start = threading.Barrier(30)
+
+        def add(user_id):
+            start.wait()
+            counts.append(manager.add(user_id, f"Player {user_id}", QUICKPLAY))
+
+        threads = [threading.Thread(target=add, args=(user_id,)) for user_id in range(30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sorted(counts) == list(range(1, 31))
+        assert manager.count(QUICKPLAY) == 30
+
+    def test_each_lobby_is_claimed_once_in_join_order(self):
+        num_players = 400
+        counts = []
+        lobbies = []
+        start = threading.Barrier(num_players)
+
+        def add(user_id):
+            start.wait()
+            count, lobby = manager.add_and_claim(user_id, f"Player {user_id}", QUICKPLAY)
+            counts.append(count)
+            if lobby is not None:
+                lobbies.append(lobby)
+
+        threads = [threading.Thread(target=add, args=(user_id,)) for user_id in range(num_players)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert max(counts) == 10
+        assert len(lobbies) == num_players // 10
+        assert all(len({entry['userId'] for entry in lobby}) == 10 for lobby in lobbies)
+        assert {entry['userId'] for lobby in lobbies for entry in lobby} == set(range(num_players))
+        assert manager.count(QUICKPLAY) == 0
+        # Each lobby is the ten who'd waited longest when it was claimed
+        lobbies.sort(key=lambda lobby: lobby[0]['added'])
+        joined = [entry['added'] for lobby in lobbies for entry in lobby]
+        assert joined == sorted(joined)
@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from includes.users import UserCache
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.dm_channel = None
+        self.dms_opened = 0
+
+    async def create_dm(self):
+        self.dms_opened += 1
+        self.dm_channel = SimpleNamespace(recipient=self)
+        return self.dm_channel
+
+
+class FakeBot:
+    def __init__(self, cached_users=()):
+        self.cached_users = {user.id: user for user in cached_users}
+        self.fetches = []
+
+    def get_user(self, user_id):
+        return self.cached_users.get(user_id)
+
+    async def fetch_user(self, user_id):
+        self.fetches.append(user_id)
+        return FakeUser(user_id)
+
+
+class TestUserCache:
+    def test_gateway_cache_is_used_first(self):
+        user = FakeUser(1)
+        bot = FakeBot([user])
+
+        assert asyncio.run(UserCache().get_user(bot, 1)) is user
+        assert bot.fetches == []
+
+    def test_fetched_users_are_kept(self):
+        bot, cache = FakeBot(), UserCache()
+
+        async def lookups():
+            return [await cache.get_user(bot, 1) for _ in range(3)]
+
+        first, second, third = asyncio.run(lookups())
+        assert first is second is third
+        assert bot.fetches == [1]
+
+    def test_dm_channel_opened_once(self):
+        bot, cache = FakeBot(), UserCache()
+
+        async def lookups():
+            return [await cache.get_dm_channel(bot, 1) for _ in range(3)]
+
+        channels = asyncio.run(lookups())
+        assert channels[0] is channels[2]
+        assert channels[0].recipient.dms_opened == 1
+        assert bot.fetches == [1]
+
+    def test_entries_expire(self):
+        bot, cache = FakeBot(), UserCache(ttl_seconds=60)
+
+        with patch("includes.users.time.monotonic", return_value=0):
+            asyncio.run(cache.get_user(bot, 1))
+        with patch("includes.users.time.monotonic", return_value=61):
+            asyncio.run(cache.get_user(bot, 1))
+        assert bot.fetches == [1, 1]
+
+    def test_least_recently_used_is_evicted(self):
+        bot, cache = FakeBot(), UserCache(max_entries=2)
+
+        async def lookups():
+            for user_id in 1, 2, 1, 3, 1, 2:
+                await cache.get_user(bot, user_id)
+
+        asyncio.run(lookups())
+        assert bot.fetches == [1, 2, 3, 2]
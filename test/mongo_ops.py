@@ -0,0 +1,137 @@
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from includes import mongo
+from includes.mongo_stats import attribute, profiler
+
+COUNTED = "test:count_mongo_ops"
+COUNTED_METHODS = {
+    "find", "find_one", "find_one_and_update", "find_one_and_delete", "aggregate", "distinct", "count_documents",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one", "delete_many", "bulk_write",
+}
+
+
+class CapturedQuery:
+    """
+    A query a schema ran: its collection, method and filter, plus the sort for finds. Only queries with a filter or
+    sort are captured; inserts have neither.
+    """
+
+    def __init__(self, collection: str, method: str, query: dict, sort: List[Tuple[str, int]] = None):
+        self.collection = collection
+        self.method = method
+        self.query = query
+        self.sort = sort
+
+    def __repr__(self):
+        return f"{self.collection}.{self.method}({self.query}, sort={self.sort})"
+
+
+class _CapturingCursor:
+    def __init__(self, cursor, captured: CapturedQuery):
+        self._cursor = cursor
+        self._captured = captured
+
+    def sort(self, key_or_list, direction=1):
+        self._captured.sort = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        self._cursor = self._cursor.sort(key_or_list, direction)
+        return self
+
+    def limit(self, limit):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __next__(self):
+        return next(self._cursor)
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+
+def _queries(method: str, args, kwargs) -> List[dict]:
+    if method == "aggregate":
+        pipeline = args[0] if args else kwargs['pipeline']
+        return [pipeline[0]["$match"]] if pipeline and "$match" in pipeline[0] else []
+    if method == "bulk_write":
+        requests = args[0] if args else kwargs['requests']
+        return [request._filter for request in requests if hasattr(request, "_filter")]
+    if method in ("insert_one", "insert_many"):
+        return []
+    if method == "distinct":
+        return [(args[1] if len(args) > 1 else kwargs.get('filter')) or {}]
+    query = args[0] if args else kwargs.get('filter', {})
+    return [query or {}]
+
+
+class _CountingCollection:
+    def __init__(self, collection, name: str, captured: Optional[List[CapturedQuery]]):
+        self._collection = collection
+        self._name = name
+        self._captured = captured
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        if attr not in COUNTED_METHODS:
+            return value
+
+        def counted(*args, **kwargs):
+            profiler.called(self._name, attr)
+            result = value(*args, **kwargs)
+            if self._captured is None:
+                return result
+            queries = [CapturedQuery(self._name, attr, query) for query in _queries(attr, args, kwargs)]
+            self._captured.extend(queries)
+            if attr == "find":
+                return _CapturingCursor(result, queries[0])
+            return result
+        return counted
+
+
+class _CountingDatabase:
+    def __init__(self, db, captured: Optional[List[CapturedQuery]] = None):
+        self._db = db
+        self._captured = captured
+
+    def __getitem__(self, name):
+        return _CountingCollection(self._db[name], name, self._captured)
+
+    def __getattr__(self, attr):
+        return getattr(self._db, attr)
+
+
+@contextmanager
+def count_mongo_ops() -> Iterator[Counter]:
+    """
+    Counts the collection calls made through mongo.db inside the block, keyed by (collection, method). The calls are
+    reported to mongo_stats.profiler under an attribution of their own, so this works the same against a real server
+    and mongomock, unlike the profiler's command listener. The Counter is filled in when the block exits.
+    """
+    ops = Counter()
+    before = profiler.calls(COUNTED)
+    db = mongo.db
+    mongo.db = _CountingDatabase(db)
+    try:
+        with attribute(COUNTED):
+            yield ops
+    finally:
+        mongo.db = db
+    ops.update(profiler.calls(COUNTED) - before)
+
+
+@contextmanager
+def capture_mongo_queries() -> Iterator[List[CapturedQuery]]:
+    """
+    Records the filters (and sorts) of the queries made through mongo.db inside the block, so tests can check the
+    queries the schemas actually run rather than copies of them.
+    """
+    captured = []
+    db = mongo.db
+    mongo.db = _CountingDatabase(db, captured)
+    try:
+        yield captured
+    finally:
+        mongo.db = db
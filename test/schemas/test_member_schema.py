@@ -1,5 +1,5 @@
 from schemas import member_schema
-from test.user_generators import generate_user
+from includes.user_generators import generate_user
 
 
 class TestCheckProfile:
@@ -28,3 +28,18 @@ class TestCheckProfile:
 
         rank = member_schema.get_player_rank_by_id(1)
         assert rank['username'] == "bar"
+
+
+class TestGetProfilesByIds:
+    def test_returns_profiles_by_user_id(self):
+        for user_id, name in (1, "foo"), (2, "bar"), (3, "baz"):
+            member_schema.check_profile(generate_user(user_id, name))
+
+        profiles = member_schema.get_profiles_by_ids([1, 3, 3, 4])
+        assert set(profiles) == {1, 3}
+        assert profiles[3]['username'] == "baz"
+
+    def test_fields_limit_what_is_returned(self):
+        member_schema.check_profile(generate_user(1, "foo"))
+
+        assert member_schema.get_profiles_by_ids([1], fields=["gamesPlayed"]) == {1: {"userId": 1, "gamesPlayed": 0}}
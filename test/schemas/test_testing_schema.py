@@ -0,0 +1,16 @@
+from includes import mongo
+from includes.queue_manager import manager as queue_manager
+from schemas import testing_schema
+
+
+class TestAddTestPlayers:
+    def test_adding_players_again_reuses_them(self):
+        testing_schema.add_test_players("quickplay", 5)
+        mongo.db['Profiles'].update_one({"userId": 1}, {"$set": {"gamesPlayed": 3}})
+
+        testing_schema.add_test_players("quickplay", 8)
+
+        assert mongo.db['Profiles'].count_documents({}) == 8
+        assert mongo.db['Ranks'].count_documents({}) == 8
+        assert mongo.db['Profiles'].find_one({"userId": 1})['gamesPlayed'] == 3
+        assert queue_manager.count("quickplay") == 8
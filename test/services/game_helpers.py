@@ -1,13 +1,26 @@
-from typing import Tuple
+from typing import List, Tuple
 
 from discord import User
 
 from cogs.queue import Queue
+from includes.queue_manager import manager as queue_manager
+from includes.user_generators import generate_users, generate_user
 from models.draft_state import DraftState
 from models.game import Game
 from models.queue_models import UserInGame
 from services import queue_service, game_service
-from test.user_generators import generate_users, generate_user
+
+
+def fill_queue(users: List[User], queue: Queue) -> List[dict]:
+    """
+    Adds the users to the queue in order
+    :return: The lobby claimed by whichever add filled the queue, or claimed afterwards for queues that don't start games
+    on their own
+    """
+    lobby = None
+    for user in users:
+        lobby = queue_service.add(user, queue, skip_delay=True).lobby or lobby
+    return lobby if lobby is not None else queue_manager.pop(queue.value)
 
 
 def start_test_game(queue: Queue, num_games_so_far: int = 0) -> Game:
@@ -16,10 +29,7 @@ def start_test_game(queue: Queue, num_games_so_far: int = 0) -> Game:
     """
 
     users = generate_users(10, num_games_so_far * 10)
-    for user in users:
-        queue_service.add(user, queue, skip_delay=True)
-
-    return game_service.start_game(users[0], queue)
+    return game_service.start_game(users[0], queue, fill_queue(users, queue))
 
 
 def start_test_draft_game(queue: Queue, num_games_so_far: int = 0) -> Tuple[Game, DraftState]:
@@ -1,15 +1,21 @@
-from datetime import datetime, date
-from typing import List
+import collections
+import random
+from datetime import datetime, date, timedelta
+from typing import List, Tuple, Dict
 
 import pytest
 
+import config
+from includes import mongo
 from models.game import Game, EmptyGame
 from models.leaderboards import Leaderboard
 from models.profile import Outcome, PlayerGameResult
 from models.queue_models import Queue
-from schemas import ingame_schema
+from schemas import member_schema
 from services import analytics_service, game_service
-from test.services.game_helpers import start_test_game, transform_user
+from test.mongo_ops import count_mongo_ops
+from test.services.game_helpers import fill_queue, start_test_game, transform_user
+from includes.user_generators import generate_users
 
 
 class TestGetMonthlyLeaderboard:
@@ -56,6 +62,37 @@ class TestGetMonthlyLeaderboard:
         leaderboard = analytics_service.get_leaderboard(None, None)
         assert leaderboard.total_games == 1
 
+    def test_flip_is_reflected_in_leaderboard(self):
+        game = self.play_fake_game(datetime(2021, 9, 1), Outcome.WIN)
+        game_service.flip_results(game.game_id)
+
+        leaderboard = analytics_service.get_leaderboard(2021, 9)
+
+        assert dict(leaderboard.most_games_won)[game.team2_captain.name] == 1
+        assert dict(leaderboard.most_games_won)[game.team1_captain.name] == 0
+
+    def test_reads_one_rollup_per_month_regardless_of_history(self):
+        for _ in range(3):
+            self.play_fake_game(datetime(2021, 9, 1), Outcome.WIN)
+
+        with count_mongo_ops() as ops:
+            leaderboard = analytics_service.get_leaderboard(2021, None)
+
+        assert leaderboard.total_games == 3
+        assert ops == {("LeaderboardRollups", "find"): 1}
+
+    def test_rebuild_matches_incremental_rollups(self):
+        game = self.play_fake_game(datetime(2021, 9, 1), Outcome.WIN)
+        self.play_fake_game(datetime(2021, 10, 1), Outcome.TIE)
+        self.play_fake_game(datetime.now(), Outcome.LOSS)
+        game_service.flip_results(game.game_id)
+        incremental = [vars(analytics_service.get_leaderboard(2021, None)), vars(analytics_service.get_leaderboard())]
+
+        analytics_service.rebuild_leaderboard_rollups()
+
+        rebuilt = [vars(analytics_service.get_leaderboard(2021, None)), vars(analytics_service.get_leaderboard())]
+        assert rebuilt == incremental
+
     @staticmethod
     def assert_leaderboard_is_empty(leaderboard: Leaderboard):
         assert leaderboard.start_date == date(2021, 9, 1)
@@ -70,11 +107,139 @@ class TestGetMonthlyLeaderboard:
     def play_fake_game(timestamp: datetime, team_1_outcome: Outcome) -> Game:
         game = start_test_game(Queue.QUICKPLAY)
         game_service.finish(transform_user(game.team1_captain), team_1_outcome)
-        ingame_schema.override_timestamps(game.game_id, timestamp)
+        game_service.override_timestamps(game.game_id, timestamp)
 
         return game
 
 
+class TestLeaderboardCache:
+    def test_repeat_requests_are_served_from_cache(self):
+        cache = analytics_service.leaderboard_cache
+        analytics_service.get_leaderboard(2021, 9)
+        hits, misses = cache.hits, cache.misses
+
+        with count_mongo_ops() as ops:
+            analytics_service.get_leaderboard(2021, 9)
+
+        assert ops == {}
+        assert (cache.hits, cache.misses) == (hits + 1, misses)
+
+    def test_finish_invalidates_current_periods(self):
+        now = datetime.now()
+        assert analytics_service.get_leaderboard().total_games == 0
+        assert analytics_service.get_leaderboard(now.year, now.month).total_games == 0
+
+        game = start_test_game(Queue.QUICKPLAY)
+        game_service.finish(transform_user(game.team1_captain), Outcome.WIN)
+
+        assert analytics_service.get_leaderboard().total_games == 1
+        assert analytics_service.get_leaderboard(now.year, now.month).total_games == 1
+        assert analytics_service.get_leaderboard(now.year, None).total_games == 1
+
+    def test_flip_invalidates_closed_period(self):
+        game = TestGetMonthlyLeaderboard.play_fake_game(datetime(2021, 9, 1), Outcome.WIN)
+        assert dict(analytics_service.get_leaderboard(2021, 9).most_games_won)[game.team1_captain.name] == 1
+
+        game_service.flip_results(game.game_id)
+
+        assert dict(analytics_service.get_leaderboard(2021, 9).most_games_won)[game.team1_captain.name] == 0
+
+    def test_moving_a_game_invalidates_both_periods(self):
+        game = TestGetMonthlyLeaderboard.play_fake_game(datetime(2021, 9, 1), Outcome.WIN)
+        assert analytics_service.get_leaderboard(2021, 9).total_games == 1
+        assert analytics_service.get_leaderboard(2021, 10).total_games == 0
+
+        game_service.override_timestamps(game.game_id, datetime(2021, 10, 1))
+
+        assert analytics_service.get_leaderboard(2021, 9).total_games == 0
+        assert analytics_service.get_leaderboard(2021, 10).total_games == 1
+
+    def test_moving_a_game_without_maps(self):
+        game = TestGetMonthlyLeaderboard.play_fake_game(datetime(2021, 9, 1), Outcome.WIN)
+        mongo.db['GameData'].update_one({"gameId": game.game_id}, {"$unset": {"maps": ""}})
+
+        game_service.override_timestamps(game.game_id, datetime(2021, 10, 1))
+        game_service.override_timestamps("no-such-game", datetime(2021, 10, 1))
+
+        assert analytics_service.get_leaderboard(2021, 10).total_games == 1
+
+    def test_only_current_periods_expire(self):
+        cache = analytics_service.LeaderboardCache(current_period_ttl=timedelta(0))
+        closed = Leaderboard(date(2021, 9, 1), date(2021, 9, 30), 0, [], [], [], [], 0)
+        current = Leaderboard(None, None, 0, [], [], [], [], 0)
+        cache.put(("rollup", 2021, 9), closed)
+        cache.put(("rollup", None, None), current)
+
+        assert cache.get(("rollup", 2021, 9)) is closed
+        assert cache.get(("rollup", None, None)) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_put_after_invalidate_is_dropped(self):
+        cache = analytics_service.LeaderboardCache()
+        stale = Leaderboard(date(2021, 9, 1), date(2021, 9, 30), 0, [], [], [], [], 0)
+        generation = cache.generation(("rollup", 2021, 9))
+
+        cache.invalidate(datetime(2021, 9, 15))
+
+        assert not cache.put(("rollup", 2021, 9), stale, generation)
+        assert cache.get(("rollup", 2021, 9)) is None
+        assert cache.put(("rollup", 2021, 9), stale, cache.generation(("rollup", 2021, 9)))
+        assert cache.get(("rollup", 2021, 9)) is stale
+
+
+class TestLeaderboardBackendParity:
+    @pytest.fixture(autouse=True)
+    def generated_history(self):
+        rng = random.Random(12)
+        users = generate_users(16)
+        for _ in range(24):
+            players = rng.sample(users, 10)
+            game = game_service.start_game(players[0], Queue.QUICKPLAY, fill_queue(players, Queue.QUICKPLAY))
+            game_service.finish(transform_user(game.team1_captain), rng.choice(list(Outcome)))
+            game_service.override_timestamps(game.game_id, datetime(2021, rng.randint(8, 10), rng.randint(1, 28)))
+            if rng.random() < 0.2:
+                game_service.flip_results(game.game_id)
+
+    @pytest.mark.parametrize("backend", ["rollup", "aggregation"])
+    @pytest.mark.parametrize("year, month", [(None, None), (2021, None), (2021, 9)])
+    def test_matches_python_implementation(self, backend, year, month, monkeypatch):
+        monkeypatch.setitem(config.variables, "leaderboard_backend", "history")
+        expected = analytics_service.get_leaderboard(year, month)
+        monkeypatch.setitem(config.variables, "leaderboard_backend", backend)
+        actual = analytics_service.get_leaderboard(year, month)
+
+        assert (actual.start_date, actual.end_date) == (expected.start_date, expected.end_date)
+        assert actual.total_games == expected.total_games
+        assert actual.unique_players == expected.unique_players
+        for field in ("most_popular_maps", "most_games_played", "most_games_won", "highest_winrate"):
+            self.assert_same_ranking(getattr(actual, field), getattr(expected, field),
+                                     self.all_values(field, expected.start_date, expected.end_date))
+
+    @staticmethod
+    def assert_same_ranking(actual: List[Tuple[str, float]], expected: List[Tuple[str, float]],
+                            all_values: Dict[str, float]):
+        """
+        Equal values can come back in any order, so this only requires the same values in the same order, each paired
+        with a name that actually has that value.
+        """
+        assert [value for _, value in actual] == pytest.approx([value for _, value in expected])
+        for name, value in actual:
+            assert all_values[name] == pytest.approx(value)
+
+    @staticmethod
+    def all_values(field: str, start_date: date, end_date: date) -> Dict[str, float]:
+        games = game_service.query_empty(start_date, end_date)
+        if field == "most_popular_maps":
+            return dict(collections.Counter(m for game in games for m in game.maps))
+
+        player_stats = analytics_service.calculate_player_stats(
+            member_schema.query_player_game_results([game.game_id for game in games]))
+        value = {"most_games_played": lambda player: player.total_games,
+                 "most_games_won": lambda player: player.wins,
+                 "highest_winrate": lambda player: player.winrate}[field]
+        return {player.username: value(player) for player in player_stats}
+
+
 class TestCalculatePopularMaps:
     def test_no_games_returns_empty(self):
         assert analytics_service.calculate_popular_maps([]) == []
@@ -130,6 +295,14 @@ class TestFindPlayersWithHighestWinrates:
         result = analytics_service.find_players_with_highest_winrates(player_stats)
         assert result == [("User 0", 3 / 3), ("User 1", 2 / 3), ("User 2", 1 / 3), ("User 3", 0)]
 
+    def test_usernames_are_fetched_in_one_query(self, initialize_users):
+        with count_mongo_ops() as ops:
+            analytics_service.calculate_player_stats([
+                PlayerGameResult(user_id, game_id, Outcome.WIN) for user_id in range(4) for game_id in ("g1", "g2")
+            ])
+
+        assert ops == {("Profiles", "find"): 1}
+
 
 class TestFindPlayersWithMostGames:
     def test_no_games(self):
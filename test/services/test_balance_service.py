@@ -0,0 +1,57 @@
+import math
+import random
+
+import pytest
+from trueskill import Rating, quality
+
+from schemas.ingame_schema import Player
+from services import balance_service
+
+
+def generate_players(num_players: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [Player(i, f"Player {i}", Rating(rng.uniform(10, 40), rng.uniform(1, 8.333))) for i in range(num_players)]
+
+
+class TestGetTeam1Masks:
+    @pytest.mark.parametrize("num_players, num_splits", [(2, 1), (10, 126), (12, 462), (16, 6435)])
+    def test_counts_each_split_once(self, num_players, num_splits):
+        masks = balance_service.get_team1_masks(num_players)
+
+        assert masks.shape == (num_splits, num_players)
+        assert (masks.sum(axis=1) == num_players // 2).all()
+        assert masks[:, 0].all()
+        assert len({tuple(mask) for mask in masks}) == num_splits
+
+
+class TestRankSplits:
+    @pytest.mark.parametrize("num_players", [10, 12])
+    def test_qualities_match_trueskill(self, num_players):
+        ranked_splits = balance_service.rank_splits(generate_players(num_players))
+
+        for i in range(len(ranked_splits)):
+            team1, team2 = ranked_splits.get(i)
+            expected = quality([[player.rating for player in team1], [player.rating for player in team2]])
+            assert math.isclose(ranked_splits.quality(i), expected, rel_tol=1e-9)
+
+    def test_sorted_best_first(self):
+        ranked_splits = balance_service.rank_splits(generate_players(10))
+
+        qualities = [ranked_splits.quality(i) for i in range(len(ranked_splits))]
+        assert qualities == sorted(qualities, reverse=True)
+
+    def test_splits_are_even_and_unique(self):
+        players = generate_players(10)
+        ranked_splits = balance_service.rank_splits(players)
+
+        teams_seen = set()
+        for i in range(len(ranked_splits)):
+            team1, team2 = ranked_splits.get(i)
+            assert len(team1) == len(team2) == 5
+            assert set(team1).union(team2) == set(players)
+            assert frozenset(team1) not in teams_seen and frozenset(team2) not in teams_seen
+            teams_seen.update({frozenset(team1), frozenset(team2)})
+
+    def test_odd_number_of_players(self):
+        with pytest.raises(ValueError):
+            balance_service.rank_splits(generate_players(9))
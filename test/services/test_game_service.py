@@ -1,14 +1,18 @@
 import math
+from datetime import timedelta
 from typing import Set, Dict
 
 from models.game import Game, GameStatus
 from models.ingame_models import SwapError, SwapResult, ScrambleError
 from models.profile import Profile, Outcome
 from models.queue_models import Queue, UserInGame
+from includes import mongo
+from includes.user_generators import generate_user, generate_users
+from schemas import ingame_schema, member_schema
 from services import game_service, queue_service, profile_service
 from services.game_service import get_games
-from test.services.game_helpers import start_test_game, transform_user
-from test.user_generators import generate_user
+from test.services.game_helpers import fill_queue, start_test_game, transform_user
+from test.mongo_ops import count_mongo_ops
 
 
 class TestGetGames:
@@ -46,6 +50,30 @@ class TestGetGames:
         assert len(games) == 5
         for game in games:
             self.assert_game_looks_correct(game)
+        assert ingame_schema.count_unfinished_games() == {GameStatus.PENDING: 0, GameStatus.STARTED: 5}
+
+    def test_games_are_one_read(self):
+        for i in range(3):
+            start_test_game(Queue.QUICKPLAY, i)
+
+        with count_mongo_ops() as ops:
+            games = get_games()
+
+        assert len(games) == 3
+        assert ops == {("GameData", "find"): 1}
+
+    def test_games_without_a_snapshot_share_one_ingame_query(self):
+        for i in range(3):
+            start_test_game(Queue.QUICKPLAY, i)
+        mongo.db['GameData'].update_many({}, {"$unset": {"players": ""}})
+
+        with count_mongo_ops() as ops:
+            games = get_games()
+
+        assert len(games) == 3
+        for game in games:
+            self.assert_game_looks_correct(game)
+        assert ops == {("GameData", "find"): 1, ("Ingame", "find"): 1}
 
     @staticmethod
     def assert_game_looks_correct(game: Game):
@@ -64,6 +92,32 @@ class TestGetGames:
         assert set(game.get_team1_others_names()).isdisjoint(set(game.get_team2_others_names()))
 
 
+class TestStartGame:
+    def test_start_is_batched(self):
+        lobby = fill_queue(generate_users(10), Queue.QUICKPLAY)
+
+        with count_mongo_ops() as ops:
+            game_service.start_game(generate_user(0, "User 0"), Queue.QUICKPLAY, lobby)
+
+        assert ops == {
+            ("Ranks", "find"): 1,
+            ("Profiles", "find"): 1,
+            ("GameData", "insert_one"): 1,
+            ("Ingame", "insert_many"): 1,
+        }
+
+    def test_players_leave_every_queue(self):
+        users = generate_users(10)
+        queue_service.add(users[0], Queue.NEWBLOODS, skip_delay=True)
+
+        game = game_service.start_game(users[-1], Queue.QUICKPLAY, fill_queue(users, Queue.QUICKPLAY))
+
+        assert len(game.team1_players) == 5
+        assert len(game.team2_players) == 5
+        assert queue_service.get_queue_count(Queue.NEWBLOODS) == 0
+        assert queue_service.get_queue_count(Queue.QUICKPLAY) == 0
+
+
 class TestShuffle:
     def test_shuffled_teams_have_no_repeats(self):
         teams_seen = set()
@@ -84,6 +138,96 @@ class TestShuffle:
             teams_seen.add(team1)
             teams_seen.add(team2)
 
+    def test_shuffle_without_cached_splits(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        game_service.ranked_splits_cache.clear()
+
+        game = game_service.shuffle_teams(game.game_id)
+
+        assert len(game.team1_players) == 5
+        assert len(game.team2_players) == 5
+
+    def test_ranked_splits_read_ratings_in_one_query(self):
+        game = start_test_game(Queue.QUICKPLAY)
+
+        with count_mongo_ops() as ops:
+            ranked_splits = game_service.get_ranked_splits(game.game_id, refresh=True)
+
+        assert ops == {("Ingame", "find"): 1, ("Ranks", "find"): 1, ("Profiles", "find"): 1}
+        assert len(ranked_splits.players) == 10
+
+    def test_shuffle_after_sub_uses_new_roster(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        sub = generate_user(9999, "Sub")
+        queue_service.add(sub, Queue.QUICKPLAY, skip_delay=True)
+        subbed_out = transform_user(game.team1_players[0])
+        ingame_schema.sub_player(sub, subbed_out)
+
+        game = game_service.shuffle_teams(game.game_id)
+
+        user_ids = {player.user_id for player in game.team1_players + game.team2_players}
+        assert len(user_ids) == 10
+        assert sub.id in user_ids
+        assert subbed_out.id not in user_ids
+
+
+class TestRosterSnapshot:
+    @staticmethod
+    def assert_snapshot_matches_ingame(game_id):
+        snapshot = {player['userId']: (player['username'], player['team'], player['isCaptain'])
+                    for player in ingame_schema.get_game(game_id)['players']}
+        ingame = {player['userId']: (player['username'], player['team'], player['isCaptain'])
+                  for player in ingame_schema.get_all_ingame_players(game_id)}
+        assert snapshot == ingame
+
+    def test_get_is_one_read(self):
+        game = start_test_game(Queue.QUICKPLAY)
+
+        with count_mongo_ops() as ops:
+            read = game_service.get(game.game_id)
+
+        assert read.team1_players == game.team1_players
+        assert read.team2_players == game.team2_players
+        assert ops == {("GameData", "find_one"): 1}
+
+    def test_kept_in_sync_by_swap(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        user = transform_user(game.team1_captain)
+        target = transform_user(game.team2_others[0])
+
+        game_service.swap(user, target)
+
+        self.assert_snapshot_matches_ingame(game.game_id)
+
+    def test_kept_in_sync_by_sub(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        sub = generate_user(9999, "Sub")
+        queue_service.add(sub, Queue.QUICKPLAY, skip_delay=True)
+        ingame_schema.sub_player(sub, transform_user(game.team1_captain))
+
+        self.assert_snapshot_matches_ingame(game.game_id)
+        snapshot = {player['userId']: player for player in ingame_schema.get_game(game.game_id)['players']}
+        assert snapshot[sub.id]['gamesPlayed'] == 0
+
+    def test_kept_in_sync_by_shuffle(self):
+        game = start_test_game(Queue.QUICKPLAY)
+
+        shuffled = game_service.shuffle_teams(game.game_id)
+
+        self.assert_snapshot_matches_ingame(game.game_id)
+        read = game_service.get(game.game_id)
+        assert shuffled.team1_players == read.team1_players
+        assert shuffled.team2_players == read.team2_players
+        assert shuffled.reshuffles == read.reshuffles
+
+    def test_shuffle_backfills_games_without_a_snapshot(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        mongo.db['GameData'].update_one({"gameId": game.game_id}, {"$unset": {"players": ""}})
+
+        game_service.shuffle_teams(game.game_id)
+
+        self.assert_snapshot_matches_ingame(game.game_id)
+
 
 class TestSwap:
     def test_user_not_in_game(self):
@@ -221,6 +365,23 @@ class TestFinish:
 
         assert finished_game is None
 
+    def test_finish_is_batched(self):
+        game = start_test_game(Queue.QUICKPLAY)
+
+        with count_mongo_ops() as ops:
+            game_service.finish(transform_user(game.team1_players[0]), Outcome.WIN)
+
+        assert ops == {
+            ("Ingame", "aggregate"): 1,
+            ("Ingame", "delete_many"): 1,
+            ("GameData", "update_one"): 1,
+            ("Profiles", "bulk_write"): 1,
+            ("PlayerData", "insert_many"): 1,
+            ("Ranks", "bulk_write"): 1,
+            ("RatingHistory", "insert_many"): 1,
+            ("LeaderboardRollups", "bulk_write"): 1,
+        }
+
     def test_finishing_updates_game_state(self):
         game = start_test_game(Queue.QUICKPLAY)
         user = transform_user(game.team1_captain)
@@ -229,6 +390,16 @@ class TestFinish:
 
         assert finished_game.status == GameStatus.FINISHED
 
+    def test_finishing_delays_players_from_re_adding(self):
+        game = start_test_game(Queue.QUICKPLAY)
+
+        finished_game = game_service.finish(transform_user(game.team1_captain), Outcome.WIN)
+
+        for user in game.team1_players + game.team2_players:
+            profile = member_schema.get_profile_by_id(user.user_id)
+            assert profile['lastPlayed'] == finished_game.ended_at
+            assert profile['delayTarget'] == finished_game.ended_at + timedelta(seconds=15)
+
     def test_finishing_updates_profiles_for_win(self):
         game = start_test_game(Queue.QUICKPLAY)
         user = transform_user(game.team1_captain)
@@ -346,6 +517,31 @@ class TestGetHistory:
         assert history[3].game.game_id == game3.game_id
         assert history[4].game.game_id == game2.game_id
 
+    def test_history_is_batched(self):
+        for i in range(5):
+            game = start_test_game(Queue.QUICKPLAY, i)
+            game_service.finish(transform_user(game.team1_captain), Outcome.WIN)
+
+        with count_mongo_ops() as ops:
+            history = game_service.get_history()
+
+        assert len(history) == 5
+        assert all(len(game.winners) == 5 and len(game.losers) == 5 for game in history)
+        assert ops == {("GameData", "find"): 1}
+
+    def test_games_without_a_snapshot_are_read_from_player_data(self):
+        for i in range(2):
+            game = start_test_game(Queue.QUICKPLAY, i)
+            game_service.finish(transform_user(game.team1_captain), Outcome.WIN)
+        mongo.db['GameData'].update_one({"gameId": game.game_id}, {"$unset": {"players": ""}})
+
+        with count_mongo_ops() as ops:
+            history = game_service.get_history()
+
+        assert len(history) == 2
+        assert all(len(game.winners) == 5 and len(game.losers) == 5 for game in history)
+        assert ops == {("GameData", "find"): 1, ("PlayerData", "find"): 1, ("Profiles", "find"): 1}
+
 
 class TestFlipResults:
     def test_can_flip_wins_or_losses(self):
@@ -364,3 +560,18 @@ class TestFlipResults:
         game_service.finish(winner1, Outcome.TIE)
 
         assert not game_service.flip_results(game.game_id)
+
+    def test_flip_records_rating_history(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        winner1 = transform_user(game.team1_captain)
+        game_service.finish(winner1, Outcome.WIN)
+
+        game_service.flip_results(game.game_id)
+
+        history = list(mongo.db['RatingHistory'].find({"userId": winner1.id}).sort("_id"))
+        rank = member_schema.get_player_rank(winner1)
+        assert [entry['gameId'] for entry in history] == [game.game_id, game.game_id]
+        assert history[0]['rank'] > history[0]['previousRank']
+        assert history[1]['previousRank'] == history[0]['rank']
+        assert history[1]['rank'] == rank['rank']
+        assert history[1]['confidence'] == rank['confidence']
@@ -0,0 +1,38 @@
+from includes import mongo
+from models.profile import Outcome
+from models.queue_models import Queue
+from services import game_service, profile_service
+from test.services.game_helpers import start_test_game, transform_user
+
+
+class TestRecountPlayerStats:
+    def test_counters_match_after_finish_and_flip(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        game_service.finish(transform_user(game.team1_captain), Outcome.WIN)
+        game_service.flip_results(game.game_id)
+
+        assert profile_service.recount_player_stats(fix=False) == (10, 0)
+        assert profile_service.get(game.team1_captain.user_id).losses == 1
+        assert profile_service.get(game.team2_captain.user_id).wins == 1
+
+    def test_backfills_untracked_profiles(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        game_service.finish(transform_user(game.team1_captain), Outcome.WIN)
+        legacy_ids = [player.user_id for player in game.team1_players]
+        mongo.db['Profiles'].update_many({"userId": {"$in": legacy_ids}},
+                                         {"$unset": {"wins": "", "losses": "", "ties": "", "statsTracked": ""}})
+
+        assert profile_service.get(legacy_ids[0]).wins == 1
+        assert profile_service.recount_player_stats(fix=False) == (10, 5)
+        assert profile_service.recount_player_stats(fix=True) == (10, 5)
+        assert profile_service.recount_player_stats(fix=False) == (10, 0)
+        assert mongo.db['Profiles'].find_one({"userId": legacy_ids[0]})['wins'] == 1
+
+    def test_fixes_drifted_counters(self):
+        game = start_test_game(Queue.QUICKPLAY)
+        game_service.finish(transform_user(game.team1_captain), Outcome.TIE)
+        user_id = game.team1_captain.user_id
+        mongo.db['Profiles'].update_one({"userId": user_id}, {"$set": {"ties": 7}})
+
+        assert profile_service.recount_player_stats(fix=True) == (10, 1)
+        assert profile_service.get(user_id).ties == 1
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from includes import mongo
+from includes.queue_expiry import scheduler
+from includes.queue_manager import manager
+from includes.user_generators import generate_user, generate_users
+from models.queue_models import Queue
+from schemas import member_schema
+from services import game_service, queue_service
+from test.services.game_helpers import start_test_game
+
+
+class TestAutoRemove:
+    def test_adding_schedules_expiry(self):
+        user = generate_user(1, "Bob")
+        queue_service.add(user, Queue.QUICKPLAY)
+
+        assert scheduler.next_deadline() > datetime.now()
+        assert len(scheduler) == 1
+
+    def test_removes_expired_entry(self):
+        user = generate_user(1, "Bob")
+        queue_service.add(user, Queue.QUICKPLAY)
+        self.expire(user.id, Queue.QUICKPLAY)
+
+        removed = queue_service.auto_remove(user.id, Queue.QUICKPLAY.value)
+
+        assert removed['username'] == "Bob"
+        assert not manager.contains(user.id, Queue.QUICKPLAY.value)
+
+    def test_does_not_remove_refreshed_entry(self):
+        user = generate_user(1, "Bob")
+        queue_service.add(user, Queue.QUICKPLAY)
+
+        removed = queue_service.auto_remove(user.id, Queue.QUICKPLAY.value)
+
+        assert removed is None
+        assert manager.contains(user.id, Queue.QUICKPLAY.value)
+        assert len(scheduler) == 1
+
+    def test_leaving_queue_cancels_expiry(self):
+        user = generate_user(1, "Bob")
+        queue_service.add(user, Queue.QUICKPLAY)
+
+        queue_service.remove(user, Queue.QUICKPLAY.value)
+
+        assert len(scheduler) == 0
+
+    @staticmethod
+    def expire(user_id, queue: Queue):
+        manager.refresh(user_id, queue.value, datetime.now() - scheduler.timeout)
+
+
+class TestGetStatusSnapshot:
+    def test_empty_queues(self):
+        snapshot = queue_service.get_status_snapshot()
+
+        assert [status.queue for status in snapshot] == [Queue.QUICKPLAY, Queue.NEWBLOODS, Queue.TEST]
+        for status in snapshot:
+            assert status.count == 0
+            assert not status.is_ingame
+
+    def test_players_listed_in_order_added_with_games_played(self):
+        users = generate_users(3)
+        for user in users:
+            queue_service.add(user, Queue.QUICKPLAY)
+        mongo.db['Profiles'].update_one({"userId": users[1].id}, {"$set": {"gamesPlayed": 7}})
+        queue_service.add(generate_user(100, "Newblood"), Queue.NEWBLOODS)
+
+        quickplay, newbloods, test = queue_service.get_status_snapshot()
+
+        assert quickplay.count == 3
+        assert [player.username for player in quickplay.players] == [user.name for user in users]
+        assert [player.games_played for player in quickplay.players] == [0, 7, 0]
+        assert [player.username for player in newbloods.players] == ["Newblood"]
+        assert test.count == 0
+
+    def test_marks_queues_with_games_in_progress(self):
+        start_test_game(Queue.QUICKPLAY)
+
+        quickplay, newbloods, test = queue_service.get_status_snapshot()
+
+        assert quickplay.is_ingame
+        assert quickplay.count == 0
+        assert not newbloods.is_ingame
+        assert not test.is_ingame
+
+
+class TestConcurrentAdds:
+    def test_parallel_adds_start_each_lobby_once(self):
+        users = generate_users(300)
+        for user in users:
+            member_schema.check_profile(user)
+
+        def add(user):
+            add_result = queue_service.add(user, Queue.QUICKPLAY, skip_delay=True)
+            if add_result.should_start():
+                return game_service.start_game(user, Queue.QUICKPLAY, add_result.lobby)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            games = [game for game in executor.map(add, users) if game is not None]
+
+        assert len(games) == 30
+        players = [player.user_id for game in games for player in game.get_all_players()]
+        assert sorted(players) == sorted(user.id for user in users)
+        assert mongo.db['Ingame'].count_documents({}) == 300
+        assert queue_service.get_queue_count(Queue.QUICKPLAY) == 0